@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import sqlite3
+from datetime import datetime
+import aiohttp
+from scrapy.utils.project import get_project_settings
+from yoga_scraper.pipelines import image_file_path, content_file_path
+from yoga_scraper.content_index import ContentIndex
+from yoga_scraper.imageproc import convert_image_bytes
+from yoga_scraper.frontier import UrlFrontier, frontier_path
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("async_downloader.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+# HTTP status codes worth retrying
+RETRY_HTTP_CODES = {408, 429, 500, 502, 503, 504}
+
+# Size of the chunks streamed to disk
+CHUNK_SIZE = 64 * 1024
+
+
+class RetryableStatus(Exception):
+    """Raised for HTTP responses that should be retried."""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Asynchronous bulk image downloader")
+
+    parser.add_argument("records_file", nargs="?", default=None, help="JSONL file of image URL records or exported spider items")
+    parser.add_argument("--frontier", nargs="?", const="", default=None, help="Drain the URL frontier written by the harvest phase (default path: FRONTIER_PATH, or frontier.sqlite in IMAGES_STORE)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Number of frontier rows claimed at a time")
+    parser.add_argument("--output-dir", default=None, help="Image store directory (default: IMAGES_STORE)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum number of parallel downloads")
+    parser.add_argument("--per-host", type=int, default=4, help="Maximum number of parallel downloads per host")
+    parser.add_argument("--retries", type=int, default=3, help="Number of retries per image")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Base delay in seconds between retries")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout in seconds per download")
+    parser.add_argument("--max-failure-rate", type=float, default=None, help="Fraction of failed downloads above which the run fails (default: DOWNLOAD_MAX_FAILURE_RATE)")
+    parser.add_argument("--scrapy-stats", default=None, help="Crawl stats JSON to compare download rates with (default: SCRAPY_STATS_FILE)")
+
+    return parser.parse_args(argv)
+
+
+def load_records(records_file):
+    """Yield image URL records from a JSONL file.
+
+    Accepts records with `pose_name_hindi`, `url` and `image_id` keys as well
+    as items exported by the spiders, which carry an `image_urls` list.
+    """
+    with open(records_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            pose_name_hindi = record.get('pose_name_hindi') or record.get('pose') or 'unknown'
+            image_id = record.get('image_id', '')
+            urls = record.get('image_urls') or [record['url']]
+            for url in urls:
+                yield {'pose_name_hindi': pose_name_hindi, 'url': url, 'image_id': image_id}
+
+
+def frontier_records(frontier, batch_size):
+    """Yield pending frontier rows, claiming them a batch at a time."""
+    while True:
+        rows = frontier.claim(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+async def fetch_to_file(session, url, part_path, timeout):
+    """Stream a URL to a temporary file and return (size, sha1)."""
+    sha1 = hashlib.sha1()
+    size = 0
+
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if response.status in RETRY_HTTP_CODES:
+            retry_after = response.headers.get('Retry-After')
+            raise RetryableStatus(response.status, float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.status != 200:
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=response.status, message="Unexpected status"
+            )
+
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        with open(part_path, 'wb') as f:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                f.write(chunk)
+                sha1.update(chunk)
+                size += len(chunk)
+
+    return size, sha1.hexdigest()
+
+
+def convert_downloaded_image(part_path, image_limits):
+    """Validate a downloaded image and rewrite it the way the image pipeline stores it."""
+    with open(part_path, 'rb') as f:
+        body = f.read()
+    result = convert_image_bytes(body, **image_limits)
+    if result['ok'] and result['image'] is not body:
+        with open(part_path, 'wb') as f:
+            f.write(result['image'])
+    return result
+
+
+async def download_image(session, record, output_dir, args, stats, content_index, image_limits):
+    """Download one image with retries, storing it like YogaImagesPipeline.
+
+    Images are decoded and checked against `image_limits` (the
+    IMAGES_MIN/MAX_WIDTH/HEIGHT settings), and images that are not JPEG are
+    re-encoded, so both backends store the same files. Returns
+    (status, error) where status is one of "downloaded", "skipped",
+    "duplicate", "rejected" or "failed".
+    """
+    pose_name_hindi, url, image_id = record['pose_name_hindi'], record['url'], record.get('image_id', '')
+
+    # Skip images that are already on disk
+    if content_index is not None:
+        known_path = content_index.path_for_source(pose_name_hindi, url)
+        if known_path and os.path.exists(os.path.join(output_dir, known_path)):
+            stats['skipped'] += 1
+            return 'skipped', None
+        url_path = image_file_path(url, pose_name_hindi, image_id)
+    else:
+        url_path = image_file_path(url, pose_name_hindi, image_id)
+        if os.path.exists(os.path.join(output_dir, url_path)):
+            stats['skipped'] += 1
+            return 'skipped', None
+
+    part_path = os.path.join(output_dir, url_path + '.part')
+    for attempt in range(args.retries + 1):
+        try:
+            size, digest = await fetch_to_file(session, url, part_path, args.timeout)
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError, RetryableStatus) as e:
+            if isinstance(e, aiohttp.ClientResponseError) or attempt == args.retries:
+                logging.warning(f"Failed to download {url}: {e}")
+                stats['failed'] += 1
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                return 'failed', e
+
+            # Back off exponentially with jitter, honouring Retry-After
+            delay = args.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if isinstance(e, RetryableStatus) and e.retry_after:
+                delay = max(delay, e.retry_after)
+            stats['retries'] += 1
+            await asyncio.sleep(delay)
+
+    stats['bytes'] += size
+
+    # Bodies that are already stored are only mapped to the existing file
+    if content_index is not None:
+        existing = content_index.get_blob(digest)
+        if existing:
+            os.remove(part_path)
+            content_index.add_source(pose_name_hindi, url, digest)
+            stats['duplicates'] += 1
+            stats['bytes_saved'] += size
+            return 'duplicate', None
+
+    # Decode and convert off the event loop, so downloads keep flowing
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, convert_downloaded_image, part_path, image_limits
+    )
+    if not result['ok']:
+        os.remove(part_path)
+        logging.debug(f"Rejected {url}: {result['reason']}")
+        stats['rejected'] += 1
+        return 'rejected', result['reason']
+    checksum = result['checksum']
+
+    # Name the file by its content when the pipeline does
+    if content_index is not None:
+        path = content_file_path(url, pose_name_hindi, digest)
+        os.replace(part_path, os.path.join(output_dir, path))
+        content_index.add_blob(digest, path, size, checksum)
+        content_index.add_source(pose_name_hindi, url, digest)
+    else:
+        os.replace(part_path, os.path.join(output_dir, url_path))
+
+    stats['downloaded'] += 1
+    return 'downloaded', None
+
+
+async def download_images(records, output_dir, args, content_index=None, on_result=None):
+    """Download all records with pooled keep-alive connections.
+
+    `on_result(record, status, error)` is called after each record is handled.
+    """
+    stats = {'downloaded': 0, 'skipped': 0, 'failed': 0, 'rejected': 0, 'retries': 0,
+             'duplicates': 0, 'bytes': 0, 'bytes_saved': 0}
+
+    # The checks of the image pipeline
+    settings = get_project_settings()
+    image_limits = {
+        'min_width': settings.getint('IMAGES_MIN_WIDTH', 0),
+        'min_height': settings.getint('IMAGES_MIN_HEIGHT', 0),
+        'max_width': settings.getint('IMAGES_MAX_WIDTH', 4000),
+        'max_height': settings.getint('IMAGES_MAX_HEIGHT', 4000),
+    }
+
+    # The connector keeps connections alive and caps parallel requests per host
+    connector = aiohttp.TCPConnector(limit=args.concurrency, limit_per_host=args.per_host, ttl_dns_cache=300)
+    headers = {'User-Agent': settings.get('USER_AGENT')}
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+
+    async def worker(session):
+        while True:
+            record = await queue.get()
+            try:
+                status, error = await download_image(session, record, output_dir, args, stats, content_index, image_limits)
+            except Exception as e:
+                logging.error(f"Error downloading {record['url']}: {e}")
+                stats['failed'] += 1
+                status, error = 'failed', e
+            try:
+                if on_result is not None:
+                    on_result(record, status, error)
+            finally:
+                queue.task_done()
+
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        workers = [asyncio.create_task(worker(session)) for _ in range(args.concurrency)]
+
+        # Feed the bounded queue so large record files are never held in memory
+        for record in records:
+            await queue.put(record)
+        await queue.join()
+
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    return stats
+
+
+def scrapy_download_rate(stats_file):
+    """Return the images/sec of a Scrapy crawl from its saved stats, or None."""
+    if not stats_file or not os.path.exists(stats_file):
+        return None
+    with open(stats_file, 'r', encoding='utf-8') as f:
+        stats = json.load(f)
+    try:
+        start_time = datetime.fromisoformat(stats['start_time'])
+        finish_time = datetime.fromisoformat(stats['finish_time'])
+    except (KeyError, ValueError):
+        return None
+    elapsed = (finish_time - start_time).total_seconds()
+    downloaded = stats.get('file_status_count/downloaded', stats.get('file_count', 0))
+    return downloaded / elapsed if elapsed > 0 else None
+
+
+def failure_reason(stats, max_failure_rate):
+    """Return why a download run failed as a whole, or None.
+
+    Single URLs failing is normal, they are recorded in the frontier. A run
+    fails when nothing could be downloaded or when more than
+    `max_failure_rate` of the attempted downloads failed.
+    """
+    if not stats['failed']:
+        return None
+    fetched = stats['downloaded'] + stats['duplicates'] + stats['rejected']
+    if not stats['downloaded'] and not stats['duplicates']:
+        return f"none of {stats['failed'] + fetched} images could be downloaded"
+    failure_rate = stats['failed'] / (stats['failed'] + fetched)
+    if failure_rate > max_failure_rate:
+        return f"{failure_rate:.0%} of the downloads failed (limit {max_failure_rate:.0%})"
+    return None
+
+
+def run_downloader(args):
+    """Download images listed in a records file or the URL frontier.
+
+    Returns 0 on success, 1 when the run failed as a whole (see
+    failure_reason()) or its stores could not be opened, and 2 on usage
+    errors.
+    """
+    settings = get_project_settings()
+    output_dir = args.output_dir or settings.get('IMAGES_STORE', 'yoga_dataset')
+    max_failure_rate = args.max_failure_rate
+    if max_failure_rate is None:
+        max_failure_rate = settings.getfloat('DOWNLOAD_MAX_FAILURE_RATE', 0.5)
+
+    content_index = None
+    if settings.getbool('IMAGES_CONTENT_ADDRESSED', True):
+        index_path = os.path.join(output_dir, 'content_index.sqlite')
+        if not args.output_dir and settings.get('IMAGES_CONTENT_INDEX'):
+            index_path = settings.get('IMAGES_CONTENT_INDEX')
+        try:
+            content_index = ContentIndex(index_path)
+        except (sqlite3.Error, OSError) as e:
+            logging.error(f"Could not open the content index {index_path}: {e}")
+            return 1
+
+    # Read records from a file or drain the URL frontier
+    frontier = None
+    if args.frontier is not None:
+        path = args.frontier or frontier_path(settings)
+        try:
+            frontier = UrlFrontier(path)
+        except (sqlite3.Error, OSError) as e:
+            logging.error(f"Could not open the URL frontier {path}: {e}")
+            if content_index is not None:
+                content_index.close()
+            return 1
+        resumed = frontier.reset_in_progress()
+        if resumed:
+            logging.info(f"Resuming {resumed} downloads interrupted in a previous run")
+        records = frontier_records(frontier, args.batch_size)
+    elif args.records_file:
+        records = load_records(args.records_file)
+    else:
+        logging.error("Either a records file or --frontier is required")
+        return 2
+
+    max_attempts = settings.getint('FRONTIER_MAX_ATTEMPTS', 3)
+
+    def mark_in_frontier(record, status, error):
+        """Mark a frontier row done, or failed until it runs out of attempts."""
+        if status == 'failed':
+            frontier.mark_failed(record['id'], error, max_attempts=max_attempts)
+        else:
+            frontier.mark_done(record['id'])
+
+    start_time = time.time()
+    try:
+        on_result = mark_in_frontier if frontier is not None else None
+        stats = asyncio.run(download_images(records, output_dir, args, content_index, on_result=on_result))
+    finally:
+        if content_index is not None:
+            content_index.close()
+        if frontier is not None:
+            logging.info(f"URL frontier: {frontier.counts()}")
+            frontier.close()
+    elapsed_time = time.time() - start_time
+
+    # Report the download rate
+    rate = stats['downloaded'] / elapsed_time if elapsed_time > 0 else 0.0
+    logging.info(
+        f"Downloaded {stats['downloaded']} images ({stats['bytes'] / (1024 * 1024):.1f} MB) in {elapsed_time:.2f} seconds: "
+        f"{rate:.2f} downloads/sec, {stats['skipped']} skipped, {stats['duplicates']} duplicates, "
+        f"{stats['rejected']} rejected, {stats['failed']} failed, {stats['retries']} retries"
+    )
+
+    # Compare with the Scrapy image pipeline
+    scrapy_rate = scrapy_download_rate(args.scrapy_stats or settings.get('SCRAPY_STATS_FILE'))
+    if scrapy_rate:
+        logging.info(f"Scrapy pipeline: {scrapy_rate:.2f} downloads/sec ({rate / scrapy_rate:.1f}x speedup)")
+
+    reason = failure_reason(stats, max_failure_rate)
+    if reason:
+        logging.error(f"Download run failed: {reason}")
+        return 1
+    return 0
+
+
+def main():
+    """Download images listed in a records file or the URL frontier."""
+    return run_downloader(parse_arguments())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import random
+import logging
+import sqlite3
+import zlib
+import argparse
+from scrapy.selector import Selector
+from yoga_scraper.extractors import extract_image_candidates
+import mock_server
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Time image URL extraction on saved Google Images result pages")
+
+    parser.add_argument("pages", nargs="*", help="Saved result pages (.html files or directories of them)")
+    parser.add_argument("--cache", default=None, help="SQLite HTTP cache (.scrapy/httpcache/<spider>.sqlite) to read result pages from")
+    parser.add_argument("--generate", type=int, default=20, help="Result pages to generate with mock_server.py when no pages are given")
+    parser.add_argument("--images-per-page", type=int, default=100, help="Full-size images per generated page")
+    parser.add_argument("--filler-kb", type=int, default=300, help="Size of the unrelated data callbacks added to each generated page")
+    parser.add_argument("--repeat", type=int, default=5, help="Times each page is parsed; the fastest run counts")
+    parser.add_argument("--report", default=None, help="Optional JSON file the results are written to")
+
+    return parser.parse_args(argv)
+
+
+def legacy_extract(page_source):
+    """Image URL extraction as YogaPoseSpider.parse_results used to do it."""
+    image_urls = []
+    script_data = Selector(text=page_source).xpath('//script[contains(text(), "AF_initDataCallback")]/text()').getall()
+    for script in script_data:
+        for url, _ in re.findall(r'\"(https?://[^\"]+\.(jpg|jpeg|png))\"', script):
+            if url not in image_urls:
+                image_urls.append(url)
+    return image_urls
+
+
+def engine_extract(page_source):
+    """Image URL extraction with the structural extraction engine."""
+    return [candidate.url for candidate in extract_image_candidates(page_source)]
+
+
+def load_saved_pages(paths):
+    """Read result pages from .html files and directories."""
+    pages = []
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, '*.htm*'))) if os.path.isdir(path) else [path]
+        for file_path in files:
+            with open(file_path, encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+    return pages
+
+
+def load_cached_pages(cache_path):
+    """Read the cached result pages of a SQLite HTTP cache."""
+    conn = sqlite3.connect(cache_path)
+    try:
+        rows = conn.execute("SELECT body FROM responses").fetchall()
+    finally:
+        conn.close()
+    return [zlib.decompress(body).decode('utf-8', errors='replace') for body, in rows]
+
+
+def filler_callback(rng, size_kb):
+    """Return a data callback of about `size_kb` KB without full-size images, like the other callbacks of a real page."""
+    rows = []
+    size = 0
+    while size < size_kb * 1024:
+        row = [rng.randrange(10 ** 6), f"token{rng.randrange(10 ** 9)}", None, [rng.random(), "https://www.google.com/"], True]
+        rows.append(row)
+        size += len(json.dumps(row))
+    data = json.dumps([None, rows], separators=(',', ':'))
+    return f"<script nonce=\"mock\">AF_initDataCallback({{key: 'ds:0', hash: '1', data:{data}, sideChannel: {{}}}});</script>"
+
+
+def generate_pages(count, images_per_page, filler_kb):
+    """Render result pages with mock_server.py, padded with unrelated data callbacks."""
+    server = mock_server.MockServer(mock_server.parse_arguments(["--images-per-page", str(images_per_page)]))
+    rng = random.Random(0)
+    pages = []
+    for index in range(count):
+        page = server.render_page(f"benchmark query {index % 5}", images_per_page * (index // 5))
+        if filler_kb:
+            page = page.replace('</body>', filler_callback(rng, filler_kb) + '\n</body>')
+        pages.append(page)
+    return pages
+
+
+def time_extractor(extract, pages, repeat):
+    """Return the best parse time per page in milliseconds and the URLs found."""
+    timings = []
+    found = 0
+    for page in pages:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            urls = extract(page)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best * 1000)
+        found += len(urls)
+    timings.sort()
+    return {
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'median_ms': round(timings[len(timings) // 2], 3),
+        'max_ms': round(timings[-1], 3),
+        'urls_found': found,
+    }
+
+
+def main():
+    """Run the benchmark and print the parse time per page."""
+    args = parse_arguments()
+
+    if args.pages:
+        pages = load_saved_pages(args.pages)
+    elif args.cache:
+        pages = load_cached_pages(args.cache)
+    else:
+        pages = generate_pages(args.generate, args.images_per_page, args.filler_kb)
+    if not pages:
+        logging.error("No result pages to benchmark")
+        return 1
+
+    average_kb = sum(len(page) for page in pages) / len(pages) / 1024
+    logging.info(f"Benchmarking {len(pages)} result pages ({average_kb:.0f} KB on average)")
+
+    results = {}
+    for name, extract in (('legacy', legacy_extract), ('engine', engine_extract)):
+        results[name] = time_extractor(extract, pages, args.repeat)
+        logging.info(
+            f"{name}: {results[name]['mean_ms']} ms/page mean, {results[name]['median_ms']} ms median, "
+            f"{results[name]['max_ms']} ms max, {results[name]['urls_found']} URLs"
+        )
+    logging.info(f"Speedup: {results['legacy']['mean_ms'] / max(results['engine']['mean_ms'], 1e-9):.1f}x")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'pages': len(pages), 'average_kb': round(average_kb, 1), **results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,19 @@
-import os
 import sys
-import zipfile
+import argparse
 import platform
 import requests
 import subprocess
-from io import BytesIO
+from yoga_scraper.driver_cache import DriverCache
 
-def get_chrome_version():
+def get_chrome_version(cache=None):
     """Get the installed Chrome version."""
     system = platform.system()
     
+    # The cache remembers the version of each Chrome executable until it is updated
+    version = (cache or DriverCache()).chrome_version()
+    if version:
+        return version
+    
     try:
         if system == "Windows":
             # Try using the registry
@@ -77,52 +81,58 @@ def get_chromedriver_url(chrome_version):
         # Construct the download URL
         url = f"https://chromedriver.storage.googleapis.com/{chromedriver_version}/chromedriver_{platform_name}.zip"
     
-    return url
+    return url, chromedriver_version
 
-def download_chromedriver(url):
-    """Download ChromeDriver from the given URL."""
+def download_chromedriver(url, chrome_version, chromedriver_version, cache):
+    """Download ChromeDriver from the given URL into the driver cache."""
     print(f"Downloading ChromeDriver from: {url}")
     
     response = requests.get(url)
     if response.status_code != 200:
         raise Exception(f"Failed to download ChromeDriver: {response.status_code}")
     
-    # Extract the ZIP file
-    with zipfile.ZipFile(BytesIO(response.content)) as zip_file:
-        # Extract all files
-        zip_file.extractall()
-    
-    # Make the ChromeDriver executable on Unix-like systems
-    system = platform.system()
-    if system != "Windows":
-        os.chmod("chromedriver", 0o755)
+    # Extract the executable into <cache>/<version>/ and record it for this Chrome version
+    chromedriver_path = cache.add_zip(chrome_version, chromedriver_version, response.content)
     
     print("ChromeDriver downloaded successfully.")
-    
-    # Get the full path to the ChromeDriver executable
-    chromedriver_path = os.path.abspath("chromedriver.exe" if system == "Windows" else "chromedriver")
     print(f"ChromeDriver path: {chromedriver_path}")
     
     return chromedriver_path
 
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Download the ChromeDriver matching the installed Chrome into the driver cache")
+    
+    parser.add_argument("--cache-dir", default=None, help="Driver cache directory (default: CHROMEDRIVER_CACHE_DIR or ~/.cache/yoga_scraper/chromedriver)")
+    parser.add_argument("--force", action="store_true", help="Download even if a matching driver is cached")
+    
+    return parser.parse_args()
+
 def main():
     """Main function."""
+    args = parse_arguments()
+    cache = DriverCache(args.cache_dir)
+    
     try:
         # Get the installed Chrome version
-        chrome_version = get_chrome_version()
+        chrome_version = get_chrome_version(cache)
         print(f"Detected Chrome version: {chrome_version}")
         
-        # Get the ChromeDriver download URL
-        url = get_chromedriver_url(chrome_version)
-        
-        # Download ChromeDriver
-        chromedriver_path = download_chromedriver(url)
+        # Reuse a cached driver for this Chrome version
+        chromedriver_path = None if args.force else cache.lookup(chrome_version)
+        if chromedriver_path:
+            print(f"Using cached ChromeDriver: {chromedriver_path}")
+        else:
+            # Get the ChromeDriver download URL
+            url, chromedriver_version = get_chromedriver_url(chrome_version)
+            
+            # Download ChromeDriver
+            chromedriver_path = download_chromedriver(url, chrome_version, chromedriver_version, cache)
         
-        print("\nTo use this ChromeDriver with the yoga pose scraper:")
-        print(f"1. Set the CHROMEDRIVER_PATH environment variable to: {chromedriver_path}")
+        print("\nThe scraper finds drivers in the cache by itself. To use this ChromeDriver elsewhere:")
+        print(f"  Set the CHROMEDRIVER_PATH environment variable to: {chromedriver_path}")
         print("   - Windows: set CHROMEDRIVER_PATH=" + chromedriver_path)
         print("   - macOS/Linux: export CHROMEDRIVER_PATH=" + chromedriver_path)
-        print("2. Or move the ChromeDriver executable to the yoga_scraper directory")
         
     except Exception as e:
         print(f"Error: {e}")
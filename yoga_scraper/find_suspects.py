@@ -0,0 +1,65 @@
+import os
+import sys
+import csv
+import logging
+import argparse
+from yoga_scraper.embeddings import EmbeddingIndex
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+REPORT_FIELDS = ['path', 'pose', 'likely_pose', 'score', 'centroid_distance', 'reference_distance', 'neighbor_agreement']
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Rank processed images by how likely they are off-topic or from the wrong pose")
+
+    parser.add_argument("--dataset-dir", default="processed_images", help="Directory containing the processed images")
+    parser.add_argument("--reference-dir", default="yoga_dataset", help="Dataset holding the reference images in <pose>/Original/")
+    parser.add_argument("--index", default="embeddings.npz", help="Embedding index file, reused if it exists")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the embeddings even if the index file exists")
+    parser.add_argument("--num-workers", type=int, default=None, help="Number of worker processes for embedding")
+    parser.add_argument("--neighbors", type=int, default=10, help="Nearest neighbors checked for each image")
+    parser.add_argument("--output", default="suspects.csv", help="CSV file the ranking is written to")
+    parser.add_argument("--top", type=int, default=20, help="Number of most suspect images to log")
+
+    return parser.parse_args(argv)
+
+
+def main():
+    """Build or load the embedding index and write the suspect ranking."""
+    args = parse_arguments()
+
+    if os.path.exists(args.index) and not args.rebuild:
+        logging.info(f"Loading embedding index from {args.index}")
+        index = EmbeddingIndex.load(args.index)
+    else:
+        index = EmbeddingIndex.build(args.dataset_dir, args.reference_dir, num_workers=args.num_workers)
+        index.save(args.index)
+        logging.info(f"Embedding index saved to {args.index}")
+
+    suspects = index.rank_suspects(k=args.neighbors)
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(suspects)
+
+    mislabeled = sum(1 for suspect in suspects if suspect['likely_pose'] != suspect['pose'])
+    logging.info(f"Ranked {len(suspects)} images, {mislabeled} look closer to another pose (saved to {args.output})")
+    for suspect in suspects[:args.top]:
+        logging.info(
+            f"  {suspect['score']:.3f} {suspect['path']} ({suspect['pose']}, looks like {suspect['likely_pose']}, "
+            f"{suspect['neighbor_agreement']:.0%} of neighbors agree)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
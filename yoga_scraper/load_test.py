@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from twisted.internet import task
+from yoga_scraper.spiders.yoga_pose_spider import YogaPoseSpider
+from yoga_scraper.spiders.selenium_yoga_spider import SeleniumYogaPoseSpider
+
+# Try to import psutil for memory sampling
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+SPIDERS = {
+    YogaPoseSpider.name: YogaPoseSpider,
+    SeleniumYogaPoseSpider.name: SeleniumYogaPoseSpider,
+}
+
+# Options forwarded to mock_server.py
+SERVER_OPTIONS = ('seed', 'images_per_page', 'lazy_images', 'pages', 'page_latency', 'latency',
+                  'error_rate', 'duplicate_urls', 'duplicate_content', 'oversized_rate')
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Load test the spiders and image pipeline against mock_server.py")
+
+    parser.add_argument("--spider", choices=sorted(SPIDERS), default=YogaPoseSpider.name, help="Spider to run")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the mock server")
+    parser.add_argument("--min-images", type=int, default=50, help="Minimum images per pose the spider aims for")
+    parser.add_argument("--max-images", type=int, default=100, help="Maximum images per pose")
+    parser.add_argument("--download-delay", type=float, default=0.0, help="DOWNLOAD_DELAY for the search pages")
+    parser.add_argument("--browsers", type=int, default=None, help="SELENIUM_POOL_SIZE for the Selenium spider")
+    parser.add_argument("--inline-preprocess", action="store_true", help="Enable IMAGES_INLINE_PREPROCESS")
+    parser.add_argument("--workdir", default=None, help="Directory for the image store and state files (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary work directory")
+    parser.add_argument("--report", default="load_test_report.json", help="File the report is written to")
+    parser.add_argument("--log-level", default="WARNING", help="Scrapy log level during the run")
+
+    # Mock server behaviour
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated results and images")
+    parser.add_argument("--images-per-page", type=int, default=40, help="Full-size images per result page")
+    parser.add_argument("--lazy-images", type=int, default=10, help="Thumbnails loaded by scrolling")
+    parser.add_argument("--pages", type=int, default=5, help="Result pages per query")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="Mean result page latency in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean image latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of failing image requests")
+    parser.add_argument("--duplicate-urls", type=float, default=0.0, help="Fraction of results with shared URLs")
+    parser.add_argument("--duplicate-content", type=float, default=0.0, help="Fraction of URLs with duplicated bytes")
+    parser.add_argument("--oversized-rate", type=float, default=0.0, help="Fraction of oversized images")
+
+    return parser.parse_args(argv)
+
+
+def start_mock_server(args):
+    """Start mock_server.py in a subprocess and wait until it answers."""
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+               "--port", str(args.port)]
+    for option in SERVER_OPTIONS:
+        command += ["--" + option.replace('_', '-'), str(getattr(args, option))]
+    server = subprocess.Popen(command)
+
+    stats_url = f"http://127.0.0.1:{args.port}/stats"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(stats_url, timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError(f"Mock server exited with code {server.returncode}")
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Mock server did not start")
+
+
+def mock_server_stats(port):
+    """Return the request counters of the mock server."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+        return json.load(response)
+
+
+def load_test_settings(args, workdir):
+    """Return the project settings pointed at the mock server and a scratch store."""
+    settings = get_project_settings()
+    settings.set('GOOGLE_SEARCH_URL', f"http://127.0.0.1:{args.port}/search")
+    settings.set('DOMAIN_THROTTLE_SEARCH_DOMAINS', ["127.0.0.1"])
+    settings.set('DOWNLOAD_DELAY', args.download_delay)
+    settings.set('HTTPCACHE_ENABLED', False)
+    settings.set('LOG_LEVEL', args.log_level)
+
+    # Keep all state of the run out of the real dataset
+    settings.set('IMAGES_STORE', os.path.join(workdir, 'images'))
+    settings.set('IMAGES_CONTENT_INDEX', os.path.join(workdir, 'content_index.sqlite'))
+    settings.set('IMAGES_PROCESSED_STORE', os.path.join(workdir, 'processed'))
+    settings.set('SEEN_URLS_PATH', os.path.join(workdir, 'seen_urls.sqlite'))
+    settings.set('POSE_QUOTA_PATH', os.path.join(workdir, 'pose_quota.sqlite'))
+    settings.set('FRONTIER_PATH', os.path.join(workdir, 'frontier.sqlite'))
+
+    if args.inline_preprocess:
+        settings.set('IMAGES_INLINE_PREPROCESS', True)
+    if args.browsers:
+        settings.set('SELENIUM_POOL_SIZE', args.browsers)
+    return settings
+
+
+class MemorySampler:
+    """Track the peak resident memory of this process and its browsers."""
+
+    def __init__(self, exclude_pid=None, interval=1.0):
+        self.exclude_pid = exclude_pid
+        self.peak_rss = 0
+        self.loop = task.LoopingCall(self.sample)
+        self.interval = interval
+
+    def start(self):
+        if PSUTIL_AVAILABLE:
+            self.loop.start(self.interval)
+
+    def stop(self):
+        if self.loop.running:
+            self.loop.stop()
+
+    def sample(self):
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            if child.pid == self.exclude_pid:
+                continue
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+
+def run_load_test(args):
+    """Crawl the mock server once and return the performance report."""
+    workdir = args.workdir or tempfile.mkdtemp(prefix="yoga_load_test_")
+    server = start_mock_server(args)
+    try:
+        settings = load_test_settings(args, workdir)
+        process = CrawlerProcess(settings)
+        crawler = process.create_crawler(SPIDERS[args.spider])
+        process.crawl(crawler, min_images_per_pose=args.min_images, max_images_per_pose=args.max_images)
+
+        sampler = MemorySampler(exclude_pid=server.pid)
+        sampler.start()
+        start_time = time.time()
+        process.start()
+        elapsed_time = time.time() - start_time
+        sampler.stop()
+
+        server_stats = mock_server_stats(args.port)
+    finally:
+        server.terminate()
+        server.wait()
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = crawler.stats.get_stats()
+    images = stats.get('file_status_count/downloaded', 0)
+    report = {
+        'spider': args.spider,
+        'elapsed_seconds': round(elapsed_time, 2),
+        'pages': server_stats['pages'],
+        'pages_per_sec': round(server_stats['pages'] / elapsed_time, 2),
+        'images_downloaded': images,
+        'images_per_sec': round(images / elapsed_time, 2),
+        'images_served': server_stats['images'],
+        'image_errors_served': server_stats['image_errors'],
+        'megabytes_served': round(server_stats['image_bytes'] / (1024 * 1024), 1),
+        'items_scraped': stats.get('item_scraped_count', 0),
+        'items_dropped': stats.get('item_dropped_count', 0),
+        'duplicate_urls_skipped': stats.get('seen_urls/duplicates', 0),
+        'duplicate_contents_skipped': stats.get('content_index/duplicates', 0),
+        'peak_memory_mb': round(sampler.peak_rss / (1024 * 1024), 1) if sampler.peak_rss else None,
+        'scrapy_peak_memory_mb': round(stats['memusage/max'] / (1024 * 1024), 1) if 'memusage/max' in stats else None,
+        'mock_server': {option: getattr(args, option) for option in SERVER_OPTIONS},
+    }
+    return report
+
+
+def main():
+    """Run a load test and write its report."""
+    args = parse_arguments()
+    report = run_load_test(args)
+
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    logging.info(
+        f"{report['spider']}: {report['pages_per_sec']} pages/sec, {report['images_per_sec']} images/sec, "
+        f"peak memory {report['peak_memory_mb'] or report['scrapy_peak_memory_mb']} MB "
+        f"({report['elapsed_seconds']}s, report saved to {args.report})"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,12 @@ import sys
 import time
 import logging
 import argparse
+from scrapy.utils.project import get_project_settings
 from run_scraper import run_scraper, check_chromedriver
-from preprocess_images import preprocess_images
-from verify_dataset import verify_dataset, count_images_by_pose, visualize_dataset
+from parallel_scraper import run_parallel_scraper
+from async_downloader import run_downloader, parse_arguments as parse_downloader_arguments
+from preprocess_images import preprocess_images, merge_manifests
+from verify_dataset import VERIFY_LEVELS, verify_dataset, count_images_by_pose, visualize_dataset
 
 # Configure logging
 logging.basicConfig(
@@ -22,55 +25,102 @@ def parse_arguments():
     parser = argparse.ArgumentParser(description="Yoga Pose Image Dataset Pipeline")
     
     parser.add_argument("--scrape", action="store_true", help="Run the scraper")
+    parser.add_argument("--harvest", action="store_true", help="Run the scraper, only queueing image URLs in the URL frontier")
+    parser.add_argument("--download", action="store_true", help="Download the images queued in the URL frontier")
     parser.add_argument("--preprocess", action="store_true", help="Preprocess the images")
+    parser.add_argument("--merge-shards", action="store_true", help="Merge the manifests and stats of the preprocessing shards")
     parser.add_argument("--verify", action="store_true", help="Verify the dataset")
     parser.add_argument("--visualize", action="store_true", help="Visualize the dataset")
     parser.add_argument("--check-chromedriver", action="store_true", help="Check if ChromeDriver is available")
     
-    parser.add_argument("--input-dir", default="yoga_dataset", help="Input directory for preprocessing")
+    parser.add_argument("--input-dir", default="yoga_dataset", help="Input directory, zip or tar archive for preprocessing")
     parser.add_argument("--output-dir", default="processed_images", help="Output directory for preprocessing")
+    parser.add_argument("--archive-root", default=None, help="Directory inside an archive input the image paths are relative to (default: the top-level directory shared by all images, '' for none)")
     
     parser.add_argument("--target-width", type=int, default=224, help="Target image width")
     parser.add_argument("--target-height", type=int, default=224, help="Target image height")
     parser.add_argument("--quality", type=int, default=90, help="JPEG quality (0-100)")
+    parser.add_argument("--shard-index", type=int, default=0, help="Preprocessing shard of this node, from 0 to --shard-count - 1")
+    parser.add_argument("--shard-count", type=int, default=1, help="Number of nodes splitting the preprocessing")
+    parser.add_argument("--manifest-dir", default="preprocess_manifests", help="Directory for the manifest and stats of each preprocessing shard")
+    
+    parser.add_argument("--verify-level", choices=VERIFY_LEVELS, default="header", help="Most thorough verification check (decode catches truncated images)")
+    parser.add_argument("--verify-structure", action="store_true", help="Also walk the container structure of every image before the Pillow checks")
+    parser.add_argument("--verify-report", default="verification_report.jsonl", help="JSON lines file the verification results are written to")
+    parser.add_argument("--quarantine-dir", default=None, help="Move images that fail verification into this directory")
     
     parser.add_argument("--num-workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--crawl-workers", type=int, default=1, help="Number of crawler processes, each scraping a shard of the poses")
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    return args
 
 def main():
     """Run the yoga pose image dataset pipeline."""
     args = parse_arguments()
     
     # If no actions are specified, run the entire pipeline
-    if not (args.scrape or args.preprocess or args.verify or args.visualize or args.check_chromedriver):
+    if not (args.scrape or args.harvest or args.download or args.preprocess or args.merge_shards
+            or args.verify or args.visualize or args.check_chromedriver):
         args.scrape = True
-        args.preprocess = True
+        # The image pipeline already preprocesses images when inline preprocessing is on
+        args.preprocess = not get_project_settings().getbool('IMAGES_INLINE_PREPROCESS')
         args.verify = True
         args.visualize = True
     
     # Check if ChromeDriver is available
-    if args.check_chromedriver or args.scrape:
+    if args.check_chromedriver or args.scrape or args.harvest:
         if check_chromedriver():
             logging.info("ChromeDriver is available.")
         else:
             logging.warning("ChromeDriver is not available.")
-            if args.scrape:
+            if args.scrape or args.harvest:
                 logging.error("Cannot run the scraper without ChromeDriver.")
                 logging.info("Please run download_chromedriver.py to download ChromeDriver.")
-                return
+                return 1
     
     # Run the scraper
     if args.scrape:
         logging.info("Starting the scraper...")
         start_time = time.time()
-        success = run_scraper()
+        if args.crawl_workers > 1:
+            success = run_parallel_scraper(workers=args.crawl_workers)
+        else:
+            success = run_scraper()
         if not success:
             logging.error("Scraper failed. Exiting.")
-            return
+            return 1
         elapsed_time = time.time() - start_time
         logging.info(f"Scraping completed in {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
     
+    # Harvest image URLs into the URL frontier
+    if args.harvest:
+        logging.info("Starting the harvest phase...")
+        start_time = time.time()
+        if args.crawl_workers > 1:
+            success = run_parallel_scraper(workers=args.crawl_workers, phase="harvest")
+        else:
+            success = run_scraper(phase="harvest")
+        if not success:
+            logging.error("Harvest failed. Exiting.")
+            return 1
+        elapsed_time = time.time() - start_time
+        logging.info(f"Harvest completed in {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
+    
+    # Download the images queued in the URL frontier
+    if args.download:
+        logging.info("Starting the download phase...")
+        start_time = time.time()
+        exit_code = run_downloader(parse_downloader_arguments(["--frontier"]))
+        elapsed_time = time.time() - start_time
+        if exit_code != 0:
+            # Failed URLs stay in the frontier until FRONTIER_MAX_ATTEMPTS, so --download can be rerun
+            logging.error(f"Download phase failed after {elapsed_time:.2f} seconds. Exiting.")
+            return exit_code
+        logging.info(f"Download completed in {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
+    
     # Preprocess the images
     if args.preprocess:
         logging.info("Starting image preprocessing...")
@@ -80,16 +130,27 @@ def main():
             output_dir=args.output_dir,
             target_size=(args.target_width, args.target_height),
             quality=args.quality,
-            num_workers=args.num_workers
+            num_workers=args.num_workers,
+            shard_index=args.shard_index,
+            shard_count=args.shard_count,
+            manifest_dir=args.manifest_dir,
+            archive_root=args.archive_root
         )
         elapsed_time = time.time() - start_time
         logging.info(f"Preprocessing completed in {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
     
+    # Combine the manifests written by the preprocessing shards
+    if args.merge_shards:
+        logging.info("Merging the preprocessing shards...")
+        merge_manifests(args.manifest_dir, args.shard_count if args.shard_count > 1 else None)
+    
     # Verify the dataset
     if args.verify:
         logging.info("Verifying the dataset...")
         start_time = time.time()
-        valid_images, invalid_images = verify_dataset(args.output_dir, num_workers=args.num_workers)
+        verify_dataset(args.output_dir, num_workers=args.num_workers, level=args.verify_level,
+                       report_path=args.verify_report, quarantine_dir=args.quarantine_dir,
+                       structure=args.verify_structure)
         elapsed_time = time.time() - start_time
         logging.info(f"Verification completed in {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
         
@@ -110,6 +171,7 @@ def main():
         logging.info(f"Visualization completed in {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
     
     logging.info("Pipeline completed successfully!")
+    return 0
 
 if __name__ == "__main__":
-    main() 
+    sys.exit(main())
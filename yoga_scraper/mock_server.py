@@ -0,0 +1,256 @@
+import sys
+import html
+import json
+import base64
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+from io import BytesIO
+from functools import lru_cache
+from urllib.parse import urlencode
+from PIL import Image, ImageDraw
+from aiohttp import web
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+# Status codes returned for simulated image host errors
+ERROR_STATUSES = (500, 503, 429)
+
+# Number of canonical images that content duplicates are drawn from
+CANONICAL_IMAGES = 50
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><title>{query} - Google Search</title></head>
+<body>
+<div id="islrg">
+{thumbnails}
+</div>
+<div id="islsp"><img class="r48jcc" src="" alt=""></div>
+{more}
+<script nonce="mock">AF_initDataCallback({{key: 'ds:1', hash: '2', data:{data}, sideChannel: {{}}}});</script>
+<script nonce="mock">
+// Clicking a thumbnail opens its full-size preview
+function openPreview(event) {{
+    var target = event.target;
+    if (target.classList && target.classList.contains('rg_i')) {{
+        document.querySelector('img.r48jcc').src = atob(target.dataset.b);
+    }}
+}}
+document.getElementById('islrg').addEventListener('click', openPreview);
+
+// Scrolling to the bottom loads thumbnails that are not in the page data
+var lazy = {lazy};
+window.addEventListener('scroll', function() {{
+    if (!lazy.length || window.innerHeight + window.scrollY < document.body.scrollHeight - 10) {{
+        return;
+    }}
+    var batch = lazy.splice(0, {lazy_batch});
+    setTimeout(function() {{
+        var container = document.getElementById('islrg');
+        batch.forEach(function(result) {{
+            var holder = document.createElement('div');
+            holder.dataset.id = result[0];
+            var img = document.createElement('img');
+            img.className = 'rg_i';
+            img.dataset.b = result[1];
+            img.width = 180;
+            img.height = 180;
+            holder.appendChild(img);
+            container.appendChild(holder);
+        }});
+    }}, {lazy_delay_ms});
+}});
+</script>
+</body>
+</html>
+"""
+
+THUMBNAIL_TEMPLATE = '<div data-id="{image_id}"><img class="rg_i" data-b="{encoded}" width="180" height="180" alt=""></div>'
+
+MORE_TEMPLATE = (
+    '<input class="mye4qd" type="button" value="Show more results" '
+    'onclick="window.location.href=\'{next_url}\'">\n'
+    '<a class="frGj1b" href="{next_url}">Next</a>'
+)
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Local stand-in for Google Images result pages and image hosts")
+
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--image-host", default=None, help="Host name used in image URLs, so images count as another domain (default: localhost)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated results and images")
+
+    parser.add_argument("--images-per-page", type=int, default=40, help="Full-size images embedded in each result page")
+    parser.add_argument("--lazy-images", type=int, default=10, help="Extra thumbnails loaded by scrolling, only resolvable by clicking")
+    parser.add_argument("--pages", type=int, default=5, help="Result pages per query before 'show more' disappears")
+
+    parser.add_argument("--page-latency", type=float, default=0.0, help="Mean delay in seconds before serving a result page")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean delay in seconds before serving an image")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of image requests answered with 500, 503 or 429")
+    parser.add_argument("--duplicate-urls", type=float, default=0.0, help="Fraction of results pointing at URLs shared by many queries")
+    parser.add_argument("--duplicate-content", type=float, default=0.0, help="Fraction of image URLs serving the same bytes as other URLs")
+    parser.add_argument("--oversized-rate", type=float, default=0.0, help="Fraction of images larger than IMAGES_MAX_WIDTH/HEIGHT")
+
+    return parser.parse_args(argv)
+
+
+@lru_cache(maxsize=512)
+def render_image(seed, width, height):
+    """Render a deterministic, non-uniform JPEG for an image seed."""
+    rng = random.Random(seed)
+    img = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 2 + 1), y0 + rng.randrange(height // 2 + 1)
+        draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buf = BytesIO()
+    img.save(buf, 'JPEG', quality=85)
+    return buf.getvalue()
+
+
+class MockServer:
+    """Google-Images-shaped result pages and a configurable image host."""
+
+    def __init__(self, args):
+        self.args = args
+        self.image_host = args.image_host or 'localhost'
+        self.stats = {'pages': 0, 'images': 0, 'image_errors': 0, 'image_bytes': 0, 'robots': 0}
+
+    def image_url(self, image_id):
+        """Return the full-size URL of an image on the image host."""
+        return f"http://{self.image_host}:{self.args.port}/images/{image_id}.jpg"
+
+    def image_id(self, query, start, index):
+        """Return the id of the index-th result of a page, possibly a shared one."""
+        key = f"{self.args.seed}|{query}|{start}|{index}"
+        rng = random.Random(key)
+        if rng.random() < self.args.duplicate_urls:
+            # Popular images show up for many queries
+            return f"shared{rng.randrange(CANONICAL_IMAGES):04d}"
+        return hashlib.md5(key.encode()).hexdigest()[:16]
+
+    def image_spec(self, image_id):
+        """Return (seed, width, height) of the image behind an id."""
+        rng = random.Random(f"{self.args.seed}|{image_id}")
+        seed = rng.randrange(2 ** 32)
+        if rng.random() < self.args.duplicate_content:
+            # Same bytes behind different URLs
+            seed = rng.randrange(CANONICAL_IMAGES)
+            rng = random.Random(seed)
+        if rng.random() < self.args.oversized_rate:
+            return seed, 4800, 3200
+        width = rng.randrange(300, 1200)
+        height = int(width * rng.uniform(0.6, 1.6))
+        return seed, width, height
+
+    def render_page(self, query, start, params=None):
+        """Render the result page of a query starting at result `start`."""
+        per_page = self.args.images_per_page
+        entries = []
+        thumbnails = []
+        for index in range(per_page):
+            image_id = self.image_id(query, start, index)
+            _, width, height = self.image_spec(image_id)
+            url = self.image_url(image_id)
+            thumb = f"https://encrypted-tbn0.gstatic.com/images?q=tbn:{image_id}"
+            entries.append([1, [0, image_id, [thumb, 180, 180], [url, height, width], None, 0, "rgb(120,120,120)"]])
+            thumbnails.append(THUMBNAIL_TEMPLATE.format(image_id=image_id, encoded=base64.b64encode(url.encode()).decode()))
+
+        # Thumbnails loaded by scrolling are not in the page data
+        lazy = []
+        for i in range(self.args.lazy_images):
+            image_id = self.image_id(query, start, per_page + i)
+            lazy.append([image_id, base64.b64encode(self.image_url(image_id).encode()).decode()])
+
+        more = ''
+        next_start = start + per_page
+        if next_start < per_page * self.args.pages:
+            params = dict(params or {'q': query})
+            params['start'] = str(next_start)
+            more = MORE_TEMPLATE.format(next_url=f"/search?{urlencode(params)}")
+
+        return PAGE_TEMPLATE.format(
+            query=html.escape(query),
+            thumbnails='\n'.join(thumbnails),
+            more=more,
+            data=json.dumps([None, [entries]], separators=(',', ':')),
+            lazy=json.dumps(lazy),
+            lazy_batch=max(1, self.args.lazy_images // 2),
+            lazy_delay_ms=100,
+        )
+
+    async def search(self, request):
+        """Serve a result page for ?q=...&start=..."""
+        query = request.query.get('q', '')
+        start = int(request.query.get('start', '0') or 0)
+        if self.args.page_latency:
+            await asyncio.sleep(random.expovariate(1 / self.args.page_latency))
+        self.stats['pages'] += 1
+
+        page = self.render_page(query, start, request.query)
+        return web.Response(text=page, content_type='text/html')
+
+    async def image(self, request):
+        """Serve an image, honouring the configured latency and error rate."""
+        image_id = request.match_info['image_id']
+        if self.args.latency:
+            await asyncio.sleep(random.expovariate(1 / self.args.latency))
+
+        if random.random() < self.args.error_rate:
+            self.stats['image_errors'] += 1
+            status = random.choice(ERROR_STATUSES)
+            headers = {'Retry-After': '1'} if status == 429 else None
+            return web.Response(status=status, headers=headers)
+
+        seed, width, height = self.image_spec(image_id)
+        body = await asyncio.get_running_loop().run_in_executor(None, render_image, seed, width, height)
+        self.stats['images'] += 1
+        self.stats['image_bytes'] += len(body)
+        return web.Response(body=body, content_type='image/jpeg')
+
+    async def robots(self, request):
+        """Allow everything."""
+        self.stats['robots'] += 1
+        return web.Response(text="User-agent: *\nAllow: /\n")
+
+    async def report(self, request):
+        """Return the request counters as JSON."""
+        return web.json_response(self.stats)
+
+    def build_app(self):
+        """Create the aiohttp application."""
+        app = web.Application()
+        app.router.add_get('/search', self.search)
+        app.router.add_get('/images/{image_id}.jpg', self.image)
+        app.router.add_get('/robots.txt', self.robots)
+        app.router.add_get('/stats', self.report)
+        return app
+
+
+def main():
+    """Run the mock server until interrupted."""
+    args = parse_arguments()
+    server = MockServer(args)
+    logging.info(
+        f"Serving mock result pages at http://{args.host}:{args.port}/search "
+        f"and images at http://{server.image_host}:{args.port}/images/"
+    )
+    web.run_app(server.build_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
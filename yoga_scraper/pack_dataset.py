@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from yoga_scraper.batch_loader import BatchLoader, pack_dataset
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Pack the processed images into an .npz file and measure batch loading throughput")
+
+    parser.add_argument("--dataset-dir", default="processed_images", help="Directory containing the processed images")
+    parser.add_argument("--output", default="processed_images.npz", help="Packed dataset file to write")
+    parser.add_argument("--target-width", type=int, default=224, help="Width of the packed images")
+    parser.add_argument("--target-height", type=int, default=224, help="Height of the packed images")
+    parser.add_argument("--num-workers", type=int, default=4, help="Decode workers")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread", help="Pool the decode workers run in")
+    parser.add_argument("--no-pack", action="store_true", help="Do not write the packed file")
+    parser.add_argument("--benchmark", action="store_true", help="Measure images/sec of the loader on the directory and the packed file")
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size for the benchmark")
+    parser.add_argument("--epochs", type=int, default=2, help="Epochs read by the benchmark")
+
+    return parser.parse_args(argv)
+
+
+def measure_throughput(source, args):
+    """Return the images/sec a BatchLoader sustains over a source."""
+    with BatchLoader(source, batch_size=args.batch_size, num_workers=args.num_workers, executor=args.executor,
+                     image_size=(args.target_width, args.target_height)) as loader:
+        images = 0
+        started = time.perf_counter()
+        for _ in range(args.epochs):
+            for batch, _ in loader:
+                images += len(batch)
+        elapsed = time.perf_counter() - started
+    return images / elapsed if elapsed else 0.0
+
+
+def main():
+    """Pack the dataset and optionally benchmark the loader."""
+    args = parse_arguments()
+
+    if not args.no_pack:
+        pack_dataset(args.dataset_dir, args.output, image_size=(args.target_width, args.target_height),
+                     num_workers=args.num_workers)
+
+    if args.benchmark:
+        sources = [args.dataset_dir]
+        if os.path.exists(args.output):
+            sources.append(args.output)
+        for source in sources:
+            logging.info(f"{source}: {measure_throughput(source, args):.0f} images/sec")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
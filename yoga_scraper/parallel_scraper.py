@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from datetime import datetime
+from scrapy.crawler import CrawlerProcess
+from run_scraper import scraper_settings, save_crawl_stats, check_chromedriver
+from yoga_scraper.spiders.selenium_yoga_spider import SeleniumYogaPoseSpider
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("parallel_scraper.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+# Stats that describe a peak or a duration rather than a count
+MAX_STATS_SUFFIXES = ('/max', 'elapsed_time_seconds', 'memusage/startup')
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Crawl yoga pose images with several spiders in parallel processes")
+
+    parser.add_argument("--workers", type=int, default=None, help="Number of crawler processes (default: number of CPU cores, at most one per pose)")
+    parser.add_argument("--shard-by", choices=["pose", "query"], default=None, help="Split poses or individual search queries across workers (default: poses, or queries when there are more workers than poses)")
+    parser.add_argument("--browsers-per-worker", type=int, default=None, help="Headless browsers per worker (default: SELENIUM_POOL_SIZE divided among the workers)")
+    parser.add_argument("--harvest", action="store_true", help="Only queue image URLs in the URL frontier")
+    parser.add_argument("--stats-dir", default="shard_stats", help="Directory for the stats of each worker")
+
+    return parser.parse_args(argv)
+
+
+def crawl_shard(shard_index, shard_count, shard_by, phase, pool_size, stats_file):
+    """Crawl one shard of the poses or queries; runs in a worker process."""
+    settings = scraper_settings(phase)
+    settings.set('SELENIUM_POOL_SIZE', pool_size)
+
+    # Workers share the seen-URL filter, so new URLs are written through at once
+    settings.set('SEEN_URLS_SHARED', True)
+    settings.set('LOG_FORMAT', f"%(asctime)s [shard {shard_index}] [%(name)s] %(levelname)s: %(message)s")
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(SeleniumYogaPoseSpider)
+    process.crawl(crawler, shard_index=shard_index, shard_count=shard_count, shard_by=shard_by)
+    process.start()
+
+    save_crawl_stats(crawler.stats.get_stats(), stats_file)
+
+
+def merge_stats(stats_list):
+    """Merge the crawl stats of several workers into one dict.
+
+    Counts are summed, peaks and durations take the maximum, and the merged
+    run spans from the earliest start to the latest finish.
+    """
+    merged = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if key in ('start_time', 'finish_time'):
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key.endswith(MAX_STATS_SUFFIXES):
+                    merged[key] = max(merged.get(key, value), value)
+                else:
+                    merged[key] = merged.get(key, 0) + value
+            else:
+                merged.setdefault(key, value)
+
+    start_times = [datetime.fromisoformat(s['start_time']) for s in stats_list if 'start_time' in s]
+    finish_times = [datetime.fromisoformat(s['finish_time']) for s in stats_list if 'finish_time' in s]
+    if start_times:
+        merged['start_time'] = min(start_times)
+    if finish_times:
+        merged['finish_time'] = max(finish_times)
+    if start_times and finish_times:
+        merged['elapsed_time_seconds'] = (merged['finish_time'] - merged['start_time']).total_seconds()
+
+    merged['finish_reason'] = ','.join(sorted({str(s.get('finish_reason')) for s in stats_list}))
+    merged['shard_count'] = len(stats_list)
+    return merged
+
+
+def run_parallel_scraper(workers=None, shard_by=None, browsers_per_worker=None, phase="all", stats_dir="shard_stats"):
+    """Run one spider per worker process, each crawling a shard of the poses or queries.
+
+    The workers share the image store, the seen-URL filter and the per-pose
+    quota (all safe for concurrent processes), and their stats are merged
+    into SCRAPY_STATS_FILE at the end.
+    """
+    settings = scraper_settings(phase)
+    pose_count = len(SeleniumYogaPoseSpider.yoga_poses)
+    workers = workers or min(multiprocessing.cpu_count(), pose_count)
+    shard_by = shard_by or ('pose' if workers <= pose_count else 'query')
+    pool_size = browsers_per_worker or max(1, settings.getint('SELENIUM_POOL_SIZE', 4) // workers)
+
+    os.makedirs("yoga_dataset", exist_ok=True)
+    os.makedirs(stats_dir, exist_ok=True)
+    logging.info(f"Starting {workers} crawler processes sharded by {shard_by}, {pool_size} browsers each")
+
+    # Spawn fresh interpreters so every worker gets its own Twisted reactor
+    context = multiprocessing.get_context('spawn')
+    stats_files = [os.path.join(stats_dir, f"shard_{i}.json") for i in range(workers)]
+    processes = []
+    for shard_index, stats_file in enumerate(stats_files):
+        if os.path.exists(stats_file):
+            os.remove(stats_file)
+        process = context.Process(
+            target=crawl_shard,
+            args=(shard_index, workers, shard_by, phase, pool_size, stats_file),
+            name=f"crawler-shard-{shard_index}",
+        )
+        process.start()
+        processes.append(process)
+
+    failed = 0
+    for shard_index, process in enumerate(processes):
+        process.join()
+        if process.exitcode != 0:
+            logging.error(f"Shard {shard_index} exited with code {process.exitcode}")
+            failed += 1
+
+    # Merge the stats of the workers that finished
+    stats_list = []
+    for stats_file in stats_files:
+        if os.path.exists(stats_file):
+            with open(stats_file, 'r', encoding='utf-8') as f:
+                stats_list.append(json.load(f))
+    if stats_list:
+        merged = merge_stats(stats_list)
+        save_crawl_stats(merged, settings.get('SCRAPY_STATS_FILE', 'scrapy_stats.json'))
+        logging.info(
+            f"Merged stats of {len(stats_list)} shards: {merged.get('item_scraped_count', 0)} items, "
+            f"{merged.get('file_status_count/downloaded', 0)} images downloaded"
+        )
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    start_time = time.time()
+    logging.info("Starting the parallel yoga pose image scraper...")
+
+    if not check_chromedriver():
+        logging.warning("ChromeDriver not found; workers will try webdriver_manager.")
+
+    success = run_parallel_scraper(
+        workers=args.workers,
+        shard_by=args.shard_by,
+        browsers_per_worker=args.browsers_per_worker,
+        phase="harvest" if args.harvest else "all",
+        stats_dir=args.stats_dir,
+    )
+    if success:
+        logging.info("Scraping completed successfully.")
+    else:
+        logging.error("Some crawler processes failed. Please check the error messages above.")
+
+    elapsed_time = time.time() - start_time
+    logging.info(f"Total time elapsed: {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
@@ -1,10 +1,17 @@
 import os
+import io
 import sys
+import json
+import time
+import socket
+import hashlib
 import logging
+import argparse
 import multiprocessing
-from PIL import Image, ImageOps
-import numpy as np
-from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from yoga_scraper.imageproc import check_image, letterbox
+from yoga_scraper.sources import iter_batches, read_batch
 
 # Configure logging
 logging.basicConfig(
@@ -16,123 +23,292 @@ logging.basicConfig(
     ]
 )
 
-def is_valid_image(image_path):
-    """Check if an image is valid and meets quality criteria."""
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+def is_valid_image(image_path, label=None):
+    """Check if an image (a path or file object) is valid and meets quality criteria."""
     try:
         with Image.open(image_path) as img:
-            # Check if the image is too small
-            if img.width < 100 or img.height < 100:
-                return False
-            
-            # Check if the image is too large
-            if img.width > 4000 or img.height > 4000:
-                return False
-            
-            # Check if the aspect ratio is too extreme
-            aspect_ratio = img.width / img.height
-            if aspect_ratio < 0.5 or aspect_ratio > 2.0:
-                return False
-            
-            # Check if the image is mostly a single color (likely a placeholder)
-            if img.mode == 'RGB':
-                img_array = np.array(img)
-                std_r = np.std(img_array[:, :, 0])
-                std_g = np.std(img_array[:, :, 1])
-                std_b = np.std(img_array[:, :, 2])
-                if std_r < 10 and std_g < 10 and std_b < 10:
-                    return False
-            
-            return True
+            # Size, aspect ratio and placeholder rules shared with the image pipeline
+            return check_image(img) is None
     except Exception as e:
-        logging.warning(f"Error validating image {image_path}: {e}")
+        logging.warning(f"Error validating image {label or image_path}: {e}")
         return False
 
-def process_image(args):
-    """Process a single image."""
-    input_path, output_dir, target_size, quality = args
+def shard_of(rel_path, shard_count):
+    """Return the shard of an image, from a stable hash of its relative path.
+    
+    The extension is left out of the hash, so inputs that are written to the
+    same output file (pose/a.png and pose/a.jpg) always land in the same shard.
+    """
+    key = os.path.splitext(rel_path.replace(os.sep, '/'))[0]
+    digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return int(digest, 16) % shard_count
+
+def find_images(input_dir, shard_index=0, shard_count=1):
+    """Return the sorted relative paths of the images in a shard of the input directory."""
+    rel_paths = []
+    for root, _, files in os.walk(input_dir):
+        for filename in files:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                rel_path = os.path.relpath(os.path.join(root, filename), input_dir)
+                if shard_count == 1 or shard_of(rel_path, shard_count) == shard_index:
+                    rel_paths.append(rel_path)
+    return sorted(rel_paths)
+
+def shard_name(shard_index, shard_count):
+    """Name of the manifest and stats files of a shard."""
+    return f"shard_{shard_index}_of_{shard_count}"
+
+def write_atomic(path, text):
+    """Write a file under a temporary name and rename it, so readers never see half of it."""
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def convert_image(image, rel_path, output_dir, target_size, quality, label=None):
+    """Letterbox one image (a path or file object) into output_dir and return its manifest record."""
+    label = label or image
+    record = {'source': rel_path.replace(os.sep, '/'), 'output': None}
     
     # Skip if the image is not valid
-    if not is_valid_image(input_path):
-        logging.info(f"Skipping invalid image: {input_path}")
-        return False
+    if not is_valid_image(image, label):
+        logging.info(f"Skipping invalid image: {label}")
+        record['status'] = 'invalid'
+        return record
     
     try:
         # Get the relative path components
-        rel_path = os.path.relpath(input_path, "yoga_dataset")
         pose_dir = os.path.dirname(rel_path)
-        filename = os.path.basename(input_path)
+        filename = os.path.basename(rel_path)
         
         # Create the output directory
         output_pose_dir = os.path.join(output_dir, pose_dir)
         os.makedirs(output_pose_dir, exist_ok=True)
         
         # Create the output path
-        output_path = os.path.join(output_pose_dir, os.path.splitext(filename)[0] + '.jpg')
+        output_name = os.path.splitext(filename)[0] + '.jpg'
+        output_path = os.path.join(output_pose_dir, output_name)
         
         # Open and process the image
-        with Image.open(input_path) as img:
+        with Image.open(image) as img:
             # Convert to RGB mode (in case it's RGBA or other mode)
             img = img.convert('RGB')
             
-            # Resize the image while maintaining aspect ratio
-            img = ImageOps.contain(img, target_size)
-            
-            # Create a new image with the target size and paste the resized image in the center
-            new_img = Image.new('RGB', target_size, (255, 255, 255))
-            paste_x = (target_size[0] - img.width) // 2
-            paste_y = (target_size[1] - img.height) // 2
-            new_img.paste(img, (paste_x, paste_y))
+            # Resize the image and center it on a white canvas of the target size
+            new_img = letterbox(img, target_size)
             
             # Save the processed image
             new_img.save(output_path, 'JPEG', quality=quality)
             
-            logging.info(f"Processed: {input_path} -> {output_path}")
-            return True
+            logging.info(f"Processed: {label} -> {output_path}")
+            record['status'] = 'processed'
+            record['output'] = os.path.join(pose_dir, output_name).replace(os.sep, '/')
+            return record
     
     except Exception as e:
-        logging.error(f"Error processing image {input_path}: {e}")
-        return False
+        logging.error(f"Error processing image {label}: {e}")
+        record['status'] = 'failed'
+        record['error'] = str(e)
+        return record
+
+def process_image(args):
+    """Process a single image file and return its manifest record."""
+    input_dir, rel_path, output_dir, target_size, quality = args
+    return convert_image(os.path.join(input_dir, rel_path), rel_path, output_dir, target_size, quality)
+
+def process_batch(args):
+    """Process a batch of archive members, read from the archive in one sequential pass."""
+    archive, batch, output_dir, target_size, quality = args
+    records = []
+    for member, data, error in read_batch(archive, batch):
+        label = os.path.join(archive, member.path)
+        if error:
+            logging.error(f"Error reading image {label}: {error}")
+            records.append({'source': member.path, 'output': None, 'status': 'failed', 'error': error})
+            continue
+        records.append(convert_image(io.BytesIO(data), member.path, output_dir, target_size, quality, label))
+    return records
+
+def process_archive(archive, output_dir, target_size, quality, num_workers, shard_index=0, shard_count=1,
+                    archive_root=None):
+    """Process the images of a zip or tar archive without extracting it.
+    
+    Batches of member offsets (or, for compressed tarballs, member bytes)
+    go to the workers, with a few batches per worker in flight. Member paths
+    are relative to `archive_root`, by default the top-level directory
+    shared by all images.
+    """
+    def in_shard(member):
+        return shard_count == 1 or shard_of(member.path, shard_count) == shard_index
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        in_flight = set()
+        for batch in iter_batches(archive, 64, select=in_shard, root=archive_root):
+            if len(in_flight) >= num_workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.extend(future.result())
+            in_flight.add(executor.submit(process_batch, (archive, batch, output_dir, target_size, quality)))
+        for future in in_flight:
+            results.extend(future.result())
+    results.sort(key=lambda record: record['source'])
+    return results
 
 def preprocess_images(input_dir="yoga_dataset", output_dir="processed_images", 
-                     target_size=(224, 224), quality=90, num_workers=None):
-    """Preprocess all images in the input directory."""
+                     target_size=(224, 224), quality=90, num_workers=None,
+                     shard_index=0, shard_count=1, manifest_dir="preprocess_manifests",
+                     archive_root=None):
+    """Preprocess the images of one shard of the input directory.
+    
+    `input_dir` may also be a zip or tar archive, which is read in place
+    instead of being extracted first. The top-level directory of an archive
+    made with `tar czf scrape.tgz yoga_dataset` is left out of the output
+    paths; `archive_root` names the directory to strip instead ('' for none).
+    
+    Every shard writes its outputs and shard_<i>_of_<n>.jsonl/.json, the
+    manifest and stats of the shard, to `manifest_dir`. Nodes sharing
+    storage can each run one shard, and merge_manifests() combines them.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is not in 0..{shard_count - 1}")
+    
     # Create the output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(manifest_dir, exist_ok=True)
     
     # Get the number of workers
     if num_workers is None:
         num_workers = max(1, multiprocessing.cpu_count() - 1)
     
-    # Find all image files
-    image_paths = []
-    for root, _, files in os.walk(input_dir):
-        for filename in files:
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')):
-                image_paths.append(os.path.join(root, filename))
+    start_time = time.time()
+    if os.path.isdir(input_dir):
+        # Find the image files of this shard
+        image_paths = find_images(input_dir, shard_index, shard_count)
+        
+        logging.info(f"Found {len(image_paths)} images to process in shard {shard_index + 1} of {shard_count}")
+        
+        # Process images in parallel
+        args_list = [(input_dir, path, output_dir, target_size, quality) for path in image_paths]
+        
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(process_image, args_list, chunksize=16))
+    else:
+        logging.info(f"Processing shard {shard_index + 1} of {shard_count} straight from the archive {input_dir}")
+        results = process_archive(input_dir, output_dir, target_size, quality, num_workers, shard_index, shard_count,
+                                  archive_root)
     
-    logging.info(f"Found {len(image_paths)} images to process")
+    # Count successful and failed processing
+    stats = {
+        'shard_index': shard_index,
+        'shard_count': shard_count,
+        'host': socket.gethostname(),
+        'images': len(results),
+        'processed': sum(1 for r in results if r['status'] == 'processed'),
+        'invalid': sum(1 for r in results if r['status'] == 'invalid'),
+        'failed': sum(1 for r in results if r['status'] == 'failed'),
+        'start_time': start_time,
+        'finish_time': time.time(),
+    }
+    stats['elapsed_seconds'] = stats['finish_time'] - start_time
     
-    # Process images in parallel
-    args_list = [(path, output_dir, target_size, quality) for path in image_paths]
+    # The stats file is written last: it marks the shard as complete
+    name = shard_name(shard_index, shard_count)
+    write_atomic(os.path.join(manifest_dir, f"{name}.jsonl"), ''.join(json.dumps(r) + '\n' for r in results))
+    write_atomic(os.path.join(manifest_dir, f"{name}.json"), json.dumps(stats, indent=2))
     
-    with ProcessPoolExecutor(max_workers=num_workers) as executor:
-        results = list(executor.map(process_image, args_list))
+    logging.info(
+        f"Preprocessing completed: {stats['processed']} images processed successfully, "
+        f"{stats['invalid']} invalid, {stats['failed']} failed"
+    )
+    return stats
+
+def merge_manifests(manifest_dir="preprocess_manifests", shard_count=None):
+    """Combine the manifests and stats of all shards into manifest.jsonl and preprocess_stats.json.
     
-    # Count successful and failed processing
-    successful = results.count(True)
-    failed = results.count(False)
+    Uses the shards of `shard_count`, or of the only shard count found in
+    `manifest_dir`. Returns the merged stats, which list any missing shards,
+    or None if there is nothing to merge.
+    """
+    if not os.path.isdir(manifest_dir):
+        logging.error(f"Manifest directory {manifest_dir} does not exist")
+        return None
+    
+    # Only shards whose stats file exists have completed
+    shard_stats = {}
+    for filename in sorted(os.listdir(manifest_dir)):
+        if filename.startswith('shard_') and filename.endswith('.json'):
+            with open(os.path.join(manifest_dir, filename), encoding='utf-8') as f:
+                stats = json.load(f)
+            shard_stats.setdefault(stats['shard_count'], {})[stats['shard_index']] = stats
+    
+    if shard_count is None:
+        if len(shard_stats) != 1:
+            logging.error(f"Found shards of {len(shard_stats)} different shard counts in {manifest_dir}, pass the shard count to merge")
+            return None
+        shard_count = next(iter(shard_stats))
+    shards = shard_stats.get(shard_count, {})
+    if not shards:
+        logging.error(f"No completed shards of {shard_count} found in {manifest_dir}")
+        return None
+    
+    # Concatenate the manifests of the completed shards
+    with open(os.path.join(manifest_dir, "manifest.jsonl"), 'w', encoding='utf-8') as out:
+        for shard_index in sorted(shards):
+            with open(os.path.join(manifest_dir, f"{shard_name(shard_index, shard_count)}.jsonl"), encoding='utf-8') as f:
+                for line in f:
+                    out.write(line)
     
-    logging.info(f"Preprocessing completed: {successful} images processed successfully, {failed} failed")
+    merged = {
+        'shard_count': shard_count,
+        'shards_completed': sorted(shards),
+        'shards_missing': [i for i in range(shard_count) if i not in shards],
+        'hosts': sorted({stats['host'] for stats in shards.values()}),
+    }
+    for key in ('images', 'processed', 'invalid', 'failed'):
+        merged[key] = sum(stats[key] for stats in shards.values())
+    merged['slowest_shard_seconds'] = max(stats['elapsed_seconds'] for stats in shards.values())
+    merged['elapsed_seconds'] = (max(stats['finish_time'] for stats in shards.values())
+                                 - min(stats['start_time'] for stats in shards.values()))
+    write_atomic(os.path.join(manifest_dir, "preprocess_stats.json"), json.dumps(merged, indent=2))
+    
+    logging.info(
+        f"Merged {len(shards)} of {shard_count} shards from {len(merged['hosts'])} hosts: "
+        f"{merged['processed']} of {merged['images']} images processed, {merged['invalid']} invalid, "
+        f"{merged['failed']} failed in {merged['elapsed_seconds']:.1f}s"
+    )
+    if merged['shards_missing']:
+        logging.warning(f"Shards not completed yet: {merged['shards_missing']}")
+    return merged
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Preprocess the downloaded images, optionally one shard per node")
+    
+    parser.add_argument("input_dir", nargs="?", default="yoga_dataset", help="Directory, zip or tar archive containing the downloaded images")
+    parser.add_argument("output_dir", nargs="?", default="processed_images", help="Directory the processed images are written to")
+    parser.add_argument("--shard-index", type=int, default=0, help="Shard processed by this node, from 0 to --shard-count - 1")
+    parser.add_argument("--shard-count", type=int, default=1, help="Number of nodes splitting the images")
+    parser.add_argument("--manifest-dir", default="preprocess_manifests", help="Directory for the manifest and stats of each shard")
+    parser.add_argument("--archive-root", default=None, help="Directory inside an archive input the image paths are relative to (default: the top-level directory shared by all images, '' for none)")
+    parser.add_argument("--merge", action="store_true", help="Merge the manifests and stats of the shards instead of preprocessing")
+    parser.add_argument("--num-workers", type=int, default=None, help="Number of worker processes")
+    
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    return args
 
 if __name__ == "__main__":
     # Parse command-line arguments
-    input_dir = "yoga_dataset"
-    output_dir = "processed_images"
-    
-    if len(sys.argv) > 1:
-        input_dir = sys.argv[1]
-    if len(sys.argv) > 2:
-        output_dir = sys.argv[2]
+    args = parse_arguments()
     
-    # Preprocess images
-    preprocess_images(input_dir, output_dir) 
+    if args.merge:
+        merge_manifests(args.manifest_dir, args.shard_count if args.shard_count > 1 else None)
+    else:
+        # Preprocess images
+        preprocess_images(args.input_dir, args.output_dir, num_workers=args.num_workers,
+                          shard_index=args.shard_index, shard_count=args.shard_count,
+                          manifest_dir=args.manifest_dir, archive_root=args.archive_root)
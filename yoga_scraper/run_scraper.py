@@ -1,11 +1,13 @@
 import os
 import sys
+import json
 import time
 import logging
 import platform
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 from yoga_scraper.spiders.selenium_yoga_spider import SeleniumYogaPoseSpider
+from yoga_scraper.driver_cache import DriverCache
 
 # Configure logging
 logging.basicConfig(
@@ -39,12 +41,33 @@ def check_chromedriver():
             logging.info(f"Found ChromeDriver at: {path}")
             return True
     
+    # Check the versioned driver cache
+    cache = DriverCache.from_settings(get_project_settings())
+    path = cache.lookup(cache.chrome_version())
+    if path:
+        logging.info(f"Found cached ChromeDriver at: {path}")
+        return True
+    
     logging.warning("ChromeDriver not found in common locations.")
     logging.info("Please run download_chromedriver.py to download ChromeDriver.")
     return False
 
-def run_scraper():
-    """Run the Scrapy spider to scrape yoga pose images."""
+def scraper_settings(phase="all"):
+    """Return the Scrapy project settings for a crawl phase."""
+    settings = get_project_settings()
+    
+    # In the harvest phase, queue image URLs instead of downloading them
+    if phase == "harvest":
+        settings.set('ITEM_PIPELINES', {"yoga_scraper.pipelines.FrontierPipeline": 1})
+    
+    return settings
+
+def run_scraper(phase="all"):
+    """Run the Scrapy spider to scrape yoga pose images.
+    
+    With phase="harvest" the spider only writes candidate image URLs to the
+    URL frontier; they are downloaded later with async_downloader.py --frontier.
+    """
     # Check if ChromeDriver is available
     if not check_chromedriver():
         try:
@@ -60,19 +83,31 @@ def run_scraper():
     os.makedirs("yoga_dataset", exist_ok=True)
     
     # Get the Scrapy project settings
-    settings = get_project_settings()
+    settings = scraper_settings(phase)
     
     # Create a CrawlerProcess with the project settings
     process = CrawlerProcess(settings)
     
     # Start the spider
-    process.crawl(SeleniumYogaPoseSpider)
+    crawler = process.create_crawler(SeleniumYogaPoseSpider)
+    process.crawl(crawler)
     
     # Start the crawling process
     process.start()
     
+    # Save the crawl stats so other tools can compare against this run
+    save_crawl_stats(crawler.stats.get_stats(), settings.get('SCRAPY_STATS_FILE', 'scrapy_stats.json'))
+    
     return True
 
+def save_crawl_stats(stats, stats_file):
+    """Write crawl stats to a JSON file."""
+    if not stats_file:
+        return
+    with open(stats_file, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2, default=str, ensure_ascii=False)
+    logging.info(f"Crawl stats saved to {stats_file}")
+
 if __name__ == "__main__":
     start_time = time.time()
     logging.info("Starting the yoga pose image scraper...")
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+from yoga_scraper.driver_cache import DriverCache, version_key
+
+
+class DriverCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DriverCache(os.path.join(self.tmp.name, 'cache'))
+        self.binary = os.path.join(self.tmp.name, 'chromedriver')
+        with open(self.binary, 'wb') as f:
+            f.write(b'#!/bin/sh\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_version_key_compares_numerically(self):
+        self.assertGreater(version_key('114.0.5735.198'), version_key('114.0.5735.90'))
+        self.assertGreater(version_key('115.0.1.0'), version_key('114.9.9999.999'))
+
+    def test_exact_version_first(self):
+        exact = self.cache.add('114.0.5735.90', '114.0.5735.90', self.binary)
+        self.cache.add('114.0.5735.198', '114.0.5735.198', self.binary)
+        self.assertEqual(self.cache.lookup('114.0.5735.90'), exact)
+
+    def test_newest_driver_of_the_same_major_version(self):
+        self.cache.add('114.0.5735.90', '114.0.5735.90', self.binary)
+        newest = self.cache.add('114.0.5735.198', '114.0.5735.198', self.binary)
+        self.cache.add('115.0.5790.102', '115.0.5790.102', self.binary)
+        self.assertEqual(self.cache.lookup('114.0.5735.200'), newest)
+        self.assertIsNone(self.cache.lookup('116.0.5845.96'))
+        self.assertIsNone(self.cache.lookup(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import unittest
+
+from yoga_scraper.extractors import (
+    ImageCandidate, extract_full_size_urls, extract_image_candidates, extract_thumbnail_keys,
+)
+
+THUMBNAIL = 'https://encrypted-tbn0.gstatic.com/images?q=tbn:{}'
+
+
+def result(doc_id, url, thumbnail_id, *fields):
+    return [0, doc_id, [THUMBNAIL.format(thumbnail_id), 180, 180], [url, 1200, 800], *fields]
+
+
+def page(data):
+    payload = data if isinstance(data, str) else json.dumps(data, separators=(',', ':'))
+    return (
+        "<html><body>"
+        "<script>AF_initDataCallback({key: 'ds:0', hash: '1', data:[1,2,3], sideChannel: {}});</script>"
+        f"<script>AF_initDataCallback({{key: 'ds:1', hash: '2', data:{payload}, sideChannel: {{}}}});</script>"
+        "</body></html>"
+    )
+
+
+class ExtractImageCandidatesTest(unittest.TestCase):
+
+    def test_full_size_urls_in_page_order(self):
+        source = page([[result('a', 'https://example.com/tree.jpg', 1),
+                         result('b', 'https://example.com/warrior.jpg', 2),
+                         result('c', 'https://example.com/tree.jpg', 3)]])
+        self.assertEqual(extract_image_candidates(source), [
+            ImageCandidate('https://example.com/tree.jpg', 800, 1200),
+            ImageCandidate('https://example.com/warrior.jpg', 800, 1200),
+        ])
+
+    def test_escaped_urls_outside_json(self):
+        # Not strict JSON: the precompiled pattern is used instead
+        source = page("[[0,'a',[\"https://example.com/a.jpg?w\\u003d800\",1200,800]]]")
+        self.assertEqual(extract_full_size_urls(source), ['https://example.com/a.jpg?w=800'])
+
+    def test_page_without_data(self):
+        self.assertEqual(extract_full_size_urls('<html><body>No results</body></html>'), [])
+
+
+class ExtractThumbnailKeysTest(unittest.TestCase):
+
+    def test_thumbnail_urls_and_result_ids(self):
+        source = page([[result('a', 'https://example.com/tree.jpg', 1, 'tree pose'),
+                        result('b', 'https://example.com/warrior.jpg', 2)]])
+        self.assertEqual(extract_thumbnail_keys(source), {
+            THUMBNAIL.format(1), 'a', 'tree pose', THUMBNAIL.format(2), 'b',
+        })
+
+    def test_empty_strings_are_not_keys(self):
+        source = page([[result('', 'https://example.com/tree.jpg', 1, ''),
+                        result('b', 'https://example.com/warrior.jpg', 2, '')]])
+        keys = extract_thumbnail_keys(source)
+        self.assertNotIn('', keys)
+        self.assertEqual(keys, {THUMBNAIL.format(1), THUMBNAIL.format(2), 'b'})
+
+    def test_thumbnail_urls_outside_json(self):
+        source = page("[[0,'a',[\"%s\",180,180],[\"https://example.com/a.jpg\",1200,800]]]" % THUMBNAIL.format(1))
+        self.assertEqual(extract_thumbnail_keys(source), {THUMBNAIL.format(1)})
+
+
+if __name__ == '__main__':
+    unittest.main()
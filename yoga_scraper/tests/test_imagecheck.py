@@ -0,0 +1,108 @@
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+from PIL import Image
+
+from yoga_scraper.imagecheck import CorruptImage, check_image_data, check_image_structure
+
+
+def encode(fmt, size=(64, 48), **params):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+SVG = b'<?xml version="1.0"?><svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"></svg>'
+
+
+class CheckImageDataTest(unittest.TestCase):
+
+    def test_valid_images(self):
+        for fmt, params in [('JPEG', {}), ('JPEG', {'progressive': True}), ('PNG', {}),
+                            ('WEBP', {}), ('WEBP', {'lossless': True}), ('GIF', {}), ('BMP', {})]:
+            with self.subTest(fmt=fmt, **params):
+                data = encode(fmt, **params)
+                self.assertEqual(check_image_data(data), len(data))
+
+    def test_jpeg_with_restart_markers(self):
+        data = encode('JPEG', size=(256, 256), restart_marker_blocks=1)
+        self.assertEqual(check_image_data(data), len(data))
+
+    def test_truncated_images(self):
+        for fmt in ('JPEG', 'PNG', 'WEBP', 'GIF'):
+            with self.subTest(fmt=fmt):
+                data = encode(fmt)
+                with self.assertRaises(CorruptImage):
+                    check_image_data(data[:len(data) * 2 // 3])
+
+    def test_jpeg_without_frame_header(self):
+        with self.assertRaisesRegex(CorruptImage, 'frame header'):
+            check_image_data(b'\xff\xd8\xff\xfe\x00\x0dcomment....\xff\xd9')
+
+    def test_png_with_bad_crc(self):
+        data = bytearray(encode('PNG'))
+        # Flip a bit of the image width in IHDR
+        data[19] ^= 0x01
+        with self.assertRaisesRegex(CorruptImage, 'bad CRC'):
+            check_image_data(bytes(data))
+
+    def test_png_with_wrong_first_chunk(self):
+        data = encode('PNG')
+        ihdr_end = 8 + 12 + struct.unpack_from('>I', data, 8)[0]
+        with self.assertRaisesRegex(CorruptImage, 'IHDR'):
+            check_image_data(data[:8] + data[ihdr_end:])
+
+    def test_webp_with_wrong_riff_size(self):
+        data = bytearray(encode('WEBP'))
+        struct.pack_into('<I', data, 4, len(data))
+        with self.assertRaisesRegex(CorruptImage, 'RIFF size'):
+            check_image_data(bytes(data))
+
+    def test_bmp_smaller_than_declared(self):
+        with self.assertRaises(CorruptImage):
+            check_image_data(encode('BMP')[:-10])
+
+    def test_not_an_image(self):
+        for data in (SVG, b'<!DOCTYPE html><html><body>Not found</body></html>', b'\xff\xd8\xff'):
+            with self.subTest(data=data[:20]):
+                with self.assertRaises(CorruptImage):
+                    check_image_data(data)
+
+
+class CheckImageStructureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_valid_file(self):
+        data = encode('JPEG')
+        self.assertEqual(check_image_structure(self.write('a.jpg', data)), len(data))
+
+    def test_svg_saved_as_jpeg(self):
+        with self.assertRaisesRegex(CorruptImage, 'unknown image signature'):
+            check_image_structure(self.write('a.jpg', SVG))
+
+    def test_truncated_file(self):
+        data = encode('JPEG')
+        with self.assertRaisesRegex(CorruptImage, 'truncated'):
+            check_image_structure(self.write('a.jpg', data[:-2]))
+
+    def test_empty_file(self):
+        with self.assertRaisesRegex(CorruptImage, 'too small'):
+            check_image_structure(self.write('a.jpg', b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
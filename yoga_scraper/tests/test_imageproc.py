@@ -0,0 +1,73 @@
+import io
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from preprocess_images import is_valid_image
+from yoga_scraper.imageproc import convert_image_bytes, preprocess_image_bytes
+
+
+def encode(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, fmt)
+    return buf.getvalue()
+
+
+def noise(mode, size=(300, 200)):
+    pixels = np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    return Image.fromarray(pixels).convert(mode)
+
+
+IMAGES = {
+    'rgb': encode(noise('RGB'), 'JPEG'),
+    'rgb flat': encode(Image.new('RGB', (300, 200), (30, 90, 200)), 'JPEG'),
+    'palette flat': encode(Image.new('P', (300, 200), 3), 'PNG'),
+    'rgba flat': encode(Image.new('RGBA', (300, 200), (30, 90, 200, 128)), 'PNG'),
+    'grey flat': encode(Image.new('L', (300, 200), 90), 'PNG'),
+    'rgba': encode(noise('RGBA'), 'PNG'),
+    'too small': encode(noise('RGB', (80, 200)), 'JPEG'),
+    'too wide': encode(noise('RGB', (500, 200)), 'PNG'),
+}
+
+
+class PreprocessImageBytesTest(unittest.TestCase):
+
+    def test_same_images_as_offline_preprocessing(self):
+        for name, body in IMAGES.items():
+            with self.subTest(name=name):
+                self.assertEqual(preprocess_image_bytes(body)['ok'], is_valid_image(io.BytesIO(body)))
+
+    def test_outputs(self):
+        result = preprocess_image_bytes(IMAGES['rgb'], target_size=(64, 64))
+        self.assertIs(result['original'], IMAGES['rgb'])
+        self.assertEqual((result['width'], result['height']), (300, 200))
+        with Image.open(io.BytesIO(result['processed'])) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (64, 64)))
+
+        # Other formats are stored as JPEG
+        result = preprocess_image_bytes(IMAGES['rgba'])
+        with Image.open(io.BytesIO(result['original'])) as img:
+            self.assertEqual((img.format, img.mode), ('JPEG', 'RGB'))
+
+    def test_rejections(self):
+        self.assertEqual(preprocess_image_bytes(IMAGES['rgb flat'])['reason'], 'single-color')
+        self.assertEqual(preprocess_image_bytes(IMAGES['too small'])['reason'], 'too-small')
+        self.assertTrue(preprocess_image_bytes(b'<html></html>')['reason'].startswith('decode-error'))
+
+
+class ConvertImageBytesTest(unittest.TestCase):
+
+    def test_jpeg_kept_and_others_converted(self):
+        self.assertIs(convert_image_bytes(IMAGES['rgb'])['image'], IMAGES['rgb'])
+        with Image.open(io.BytesIO(convert_image_bytes(IMAGES['rgba'])['image'])) as img:
+            self.assertEqual(img.format, 'JPEG')
+
+    def test_size_limits(self):
+        self.assertEqual(convert_image_bytes(IMAGES['rgb'], min_width=400)['reason'], 'too-small')
+        self.assertEqual(convert_image_bytes(IMAGES['rgb'], max_height=100)['reason'], 'too-large')
+        self.assertFalse(convert_image_bytes(b'<html></html>')['ok'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import io
+import unittest
+
+from PIL import Image
+
+from yoga_scraper.imagesniff import UnknownImageFormat, sniff_image_size
+
+
+def encode(fmt, size=(640, 427), mode='RGB', **params):
+    buf = io.BytesIO()
+    Image.new(mode, size, 128).save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+class SniffImageSizeTest(unittest.TestCase):
+
+    def test_formats(self):
+        cases = [
+            ('JPEG', 'RGB', {}),
+            ('JPEG', 'RGB', {'progressive': True}),
+            ('JPEG', 'RGB', {'exif': Image.Exif().tobytes() + b'\0' * 4000}),
+            ('PNG', 'RGB', {}),
+            ('WEBP', 'RGB', {}),
+            ('WEBP', 'RGB', {'lossless': True}),
+            ('WEBP', 'RGBA', {}),
+            ('GIF', 'RGB', {}),
+        ]
+        for fmt, mode, params in cases:
+            with self.subTest(fmt=fmt, mode=mode, params=list(params)):
+                data = encode(fmt, mode=mode, **params)
+                self.assertEqual(sniff_image_size(data), (fmt, 640, 427))
+
+    def test_sizes_are_read_from_the_head(self):
+        for fmt in ('JPEG', 'PNG', 'WEBP', 'GIF'):
+            with self.subTest(fmt=fmt):
+                self.assertEqual(sniff_image_size(encode(fmt, size=(3000, 17))[:1024]), (fmt, 3000, 17))
+
+    def test_short_head(self):
+        for fmt in ('JPEG', 'PNG', 'WEBP'):
+            with self.subTest(fmt=fmt):
+                self.assertIsNone(sniff_image_size(encode(fmt)[:11]))
+        # The SOF segment comes after a large EXIF segment
+        jpeg = encode('JPEG', exif=Image.Exif().tobytes() + b'\0' * 4000)
+        self.assertIsNone(sniff_image_size(jpeg[:2048]))
+        self.assertIsNone(sniff_image_size(encode('PNG')[:20]))
+
+    def test_unknown_formats(self):
+        for data in (b'<!DOCTYPE html><html><body></body></html>', b'<?xml version="1.0"?><svg/>', b'\0' * 64):
+            with self.subTest(data=data[:20]):
+                with self.assertRaises(UnknownImageFormat):
+                    sniff_image_size(data)
+
+    def test_jpeg_without_frame_header(self):
+        with self.assertRaises(UnknownImageFormat):
+            sniff_image_size(b'\xff\xd8\xff\xfe\x00\x0dcomment....\xff\xd9\x00\x00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import unittest
+
+from preprocess_images import merge_manifests, shard_name, shard_of
+
+
+class MergeManifestsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manifest_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_shard(self, shard_index, shard_count, records, host='node-a', start_time=100.0, elapsed=10.0,
+                    complete=True):
+        name = shard_name(shard_index, shard_count)
+        with open(os.path.join(self.manifest_dir, f"{name}.jsonl"), 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(record) + '\n' for record in records)
+        if not complete:
+            return
+        stats = {
+            'shard_index': shard_index,
+            'shard_count': shard_count,
+            'host': host,
+            'images': len(records),
+            'processed': sum(1 for r in records if r['status'] == 'processed'),
+            'invalid': sum(1 for r in records if r['status'] == 'invalid'),
+            'failed': sum(1 for r in records if r['status'] == 'failed'),
+            'start_time': start_time,
+            'finish_time': start_time + elapsed,
+            'elapsed_seconds': elapsed,
+        }
+        with open(os.path.join(self.manifest_dir, f"{name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+
+    def read_manifest(self):
+        with open(os.path.join(self.manifest_dir, 'manifest.jsonl'), encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_merges_completed_shards(self):
+        shard_0 = [{'source': 'tree/a.jpg', 'output': 'tree/a.jpg', 'status': 'processed'},
+                   {'source': 'tree/b.png', 'output': None, 'status': 'invalid'}]
+        shard_1 = [{'source': 'warrior/c.jpg', 'output': 'warrior/c.jpg', 'status': 'processed'},
+                   {'source': 'warrior/d.jpg', 'output': None, 'status': 'failed'}]
+        self.write_shard(1, 2, shard_1, host='node-b', start_time=105.0, elapsed=20.0)
+        self.write_shard(0, 2, shard_0, host='node-a', start_time=100.0, elapsed=10.0)
+
+        merged = merge_manifests(self.manifest_dir)
+
+        self.assertEqual(self.read_manifest(), shard_0 + shard_1)
+        self.assertEqual(merged['shards_completed'], [0, 1])
+        self.assertEqual(merged['shards_missing'], [])
+        self.assertEqual(merged['hosts'], ['node-a', 'node-b'])
+        self.assertEqual((merged['images'], merged['processed'], merged['invalid'], merged['failed']), (4, 2, 1, 1))
+        self.assertEqual(merged['slowest_shard_seconds'], 20.0)
+        self.assertEqual(merged['elapsed_seconds'], 25.0)
+        with open(os.path.join(self.manifest_dir, 'preprocess_stats.json'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f), merged)
+
+    def test_incomplete_shards_are_missing(self):
+        self.write_shard(0, 3, [{'source': 'tree/a.jpg', 'output': 'tree/a.jpg', 'status': 'processed'}])
+        # A shard without its stats file is still running
+        self.write_shard(2, 3, [{'source': 'tree/b.jpg', 'output': 'tree/b.jpg', 'status': 'processed'}],
+                         complete=False)
+
+        with self.assertLogs(level='WARNING'):
+            merged = merge_manifests(self.manifest_dir)
+
+        self.assertEqual(merged['shards_completed'], [0])
+        self.assertEqual(merged['shards_missing'], [1, 2])
+        self.assertEqual([record['source'] for record in self.read_manifest()], ['tree/a.jpg'])
+
+    def test_shard_count_is_needed_for_mixed_runs(self):
+        record = {'source': 'tree/a.jpg', 'output': 'tree/a.jpg', 'status': 'processed'}
+        self.write_shard(0, 1, [record])
+        self.write_shard(0, 2, [record])
+
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(merge_manifests(self.manifest_dir))
+        self.assertEqual(merge_manifests(self.manifest_dir, shard_count=2)['shards_missing'], [1])
+
+    def test_nothing_to_merge(self):
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(merge_manifests(os.path.join(self.manifest_dir, 'missing')))
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(merge_manifests(self.manifest_dir))
+
+
+class ShardOfTest(unittest.TestCase):
+
+    def test_stable_and_independent_of_the_extension(self):
+        self.assertEqual(shard_of('tree/a.png', 7), shard_of('tree/a.jpg', 7))
+        self.assertEqual(shard_of(os.path.join('tree', 'a.jpg'), 7), shard_of('tree/a.jpg', 7))
+        shards = {shard_of(f'tree/{i}.jpg', 4) for i in range(200)}
+        self.assertEqual(shards, {0, 1, 2, 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+
+from yoga_scraper.seen_urls import BloomFilter, ScalableBloomFilter, SeenUrlStore, normalize_url, url_key
+
+
+class NormalizeUrlTest(unittest.TestCase):
+
+    def test_equivalent_urls(self):
+        canonical = normalize_url('https://images.example.com/poses/tree.jpg?w=800&h=600')
+        for url in [
+            'HTTPS://Images.Example.COM/poses/tree.jpg?w=800&h=600',
+            'https://images.example.com:443/poses/tree.jpg?w=800&h=600',
+            'https://images.example.com/poses/tree.jpg?h=600&w=800',
+            'https://images.example.com/poses/tree.jpg?w=800&utm_source=x&h=600&fbclid=abc',
+            'https://images.example.com/poses/tree.jpg?w=800&h=600#gallery',
+            '  https://images.example.com/poses/tree.jpg?w=800&h=600\n',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(normalize_url(url), canonical)
+                self.assertEqual(url_key(url), url_key(canonical))
+
+    def test_distinct_urls(self):
+        base = 'https://images.example.com/poses/tree.jpg?w=800'
+        for url in [
+            'http://images.example.com/poses/tree.jpg?w=800',
+            'https://images.example.com:8443/poses/tree.jpg?w=800',
+            'https://images.example.com/poses/Tree.jpg?w=800',
+            'https://images.example.com/poses/tree.jpg?w=400',
+            'https://images.example.com/poses/tree.jpg?w=800&id=2',
+        ]:
+            with self.subTest(url=url):
+                self.assertNotEqual(normalize_url(url), normalize_url(base))
+                self.assertNotEqual(url_key(url), url_key(base))
+
+    def test_empty_path(self):
+        self.assertEqual(normalize_url('https://example.com'), 'https://example.com/')
+
+    def test_blank_query_values_are_kept(self):
+        self.assertEqual(normalize_url('https://example.com/a.jpg?raw'), 'https://example.com/a.jpg?raw=')
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        keys = [url_key(f'https://example.com/{i}.jpg') for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertEqual(bloom.count, 1000)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(2000, 0.01)
+        for i in range(2000):
+            bloom.add(url_key(f'https://example.com/{i}.jpg'))
+        false_positives = sum(url_key(f'https://example.org/{i}.jpg') in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+
+    def test_scalable_filter_grows(self):
+        bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01)
+        keys = [url_key(f'https://example.com/{i}.jpg') for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertEqual(len(bloom), 1000)
+        # 100 + 200 + 400 + 800 keys
+        self.assertEqual(len(bloom.filters), 4)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(url_key(f'https://example.org/{i}.jpg') in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+
+
+class SeenUrlStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'seen_urls.sqlite')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_claims_and_stored_urls(self):
+        store = SeenUrlStore(self.path, flush_every=2)
+        self.assertTrue(store.claim('https://example.com/a.jpg'))
+        self.assertFalse(store.claim('https://example.com/a.jpg?utm_medium=x'))
+        store.release('https://example.com/a.jpg')
+        self.assertTrue(store.claim('https://example.com/a.jpg'))
+        store.add('https://example.com/a.jpg')
+        self.assertTrue(store.claim('https://example.com/b.jpg'))
+        self.assertEqual((store.checked, store.duplicates), (4, 1))
+        store.close()
+
+        # Only the downloaded URL is seen by the next run
+        store = SeenUrlStore(self.path)
+        self.assertFalse(store.claim('https://example.com/a.jpg'))
+        self.assertTrue(store.claim('https://example.com/b.jpg'))
+        store.close()
+
+    def test_shared_stores_see_each_other(self):
+        first = SeenUrlStore(self.path, shared=True)
+        second = SeenUrlStore(self.path, shared=True)
+        first.add('https://example.com/a.jpg')
+        self.assertFalse(second.claim('https://example.com/a.jpg'))
+        first.close()
+        second.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from yoga_scraper.sources import archive_root, iter_batches, iter_images, list_members, read_batch, source_kind
+
+# Members of a scrape, as stored under the dataset directory
+FILES = {
+    'original/tree/tree_0.jpg': b'\xff\xd8tree 0' * 40,
+    'original/tree/tree_1.png': b'\x89PNGtree 1' * 3,
+    'original/warrior/warrior_0.jpg': b'\xff\xd8warrior 0' * 500,
+    'original/warrior/notes.txt': b'not an image',
+}
+
+IMAGES = sorted((path.split('/')[1], os.path.basename(path), data)
+                for path, data in FILES.items() if not path.endswith('.txt'))
+
+
+def add_tar_member(tar_file, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar_file.addfile(info, io.BytesIO(data))
+
+
+class SourcesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dataset_dir = os.path.join(self.tmp, 'yoga_dataset')
+        for path, data in FILES.items():
+            os.makedirs(os.path.dirname(os.path.join(self.dataset_dir, path)), exist_ok=True)
+            with open(os.path.join(self.dataset_dir, path), 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def make_zip(self, name, prefix='', compression=zipfile.ZIP_DEFLATED, extra=()):
+        path = os.path.join(self.tmp, name)
+        with zipfile.ZipFile(path, 'w', compression) as zip_file:
+            for member, data in list(FILES.items()) + list(extra):
+                zip_file.writestr(prefix + member, data)
+        return path
+
+    def make_tar(self, name, prefix='', mode='w', extra=()):
+        path = os.path.join(self.tmp, name)
+        with tarfile.open(path, mode) as tar_file:
+            for member, data in list(FILES.items()) + list(extra):
+                add_tar_member(tar_file, prefix + member, data)
+        return path
+
+    def sources(self, prefix=''):
+        return {
+            'zip': self.make_zip('scrape.zip', prefix),
+            'stored zip': self.make_zip('stored.zip', prefix, zipfile.ZIP_STORED),
+            'tar': self.make_tar('scrape.tar', prefix),
+            'tgz': self.make_tar('scrape.tgz', prefix, 'w:gz'),
+        }
+
+    def test_source_kind(self):
+        sources = self.sources()
+        self.assertEqual(source_kind(self.dataset_dir), 'dir')
+        self.assertEqual(source_kind(sources['zip']), 'zip')
+        self.assertEqual(source_kind(sources['tar']), 'tar')
+        self.assertEqual(source_kind(sources['tgz']), 'tar-stream')
+        with self.assertRaises(ValueError):
+            source_kind(os.path.join(self.dataset_dir, 'original/warrior/notes.txt'))
+
+    def test_readers_match_the_directory(self):
+        self.assertEqual(sorted(iter_images(self.dataset_dir)), IMAGES)
+        for kind, source in self.sources().items():
+            with self.subTest(kind=kind):
+                self.assertEqual(sorted(iter_images(source, batch_size=2)), IMAGES)
+
+    def test_members_are_listed_in_storage_order(self):
+        for kind in ('zip', 'tar'):
+            with self.subTest(kind=kind):
+                members = list(list_members(self.sources()[kind]))
+                offsets = [member.offset for member in members]
+                self.assertEqual(offsets, sorted(offsets))
+                self.assertTrue(all(member.end > member.offset for member in members))
+
+    def test_read_batch_reads_members_at_their_offsets(self):
+        for kind, source in self.sources().items():
+            with self.subTest(kind=kind):
+                for batch in iter_batches(source, batch_size=64):
+                    for member, data, error in read_batch(source, batch):
+                        self.assertIsNone(error)
+                        self.assertEqual(data, FILES[member.path])
+
+    def test_truncated_member_is_reported(self):
+        source = self.sources()['tar']
+        members = list(list_members(source))
+        with open(source, 'r+b') as f:
+            f.truncate(members[-1].offset + 10)
+        results = read_batch(source, [(member, None) for member in members])
+        self.assertEqual([error is None for _, _, error in results], [True] * (len(members) - 1) + [False])
+
+    def test_select_filters_members(self):
+        for kind, source in self.sources().items():
+            with self.subTest(kind=kind):
+                batches = iter_batches(source, select=lambda member: member.pose == 'tree')
+                self.assertEqual({member.pose for batch in batches for member, _ in batch}, {'tree'})
+
+    def test_top_level_directory_is_stripped(self):
+        for kind, source in self.sources('yoga_dataset/').items():
+            with self.subTest(kind=kind):
+                self.assertEqual(archive_root(source), 'yoga_dataset/')
+                self.assertEqual(sorted(member.path for member in list_members(source)),
+                                 sorted(path for path in FILES if not path.endswith('.txt')))
+                self.assertEqual(sorted(iter_images(source)), IMAGES)
+
+    def test_archive_of_the_directory_contents_is_kept(self):
+        for prefix in ('', './'):
+            for kind, source in self.sources(prefix).items():
+                with self.subTest(prefix=prefix, kind=kind):
+                    self.assertEqual(archive_root(source), '')
+                    self.assertTrue(all(member.path.startswith('original/') for member in list_members(source)))
+
+    def test_explicit_archive_root(self):
+        source = self.sources('yoga_dataset/')['zip']
+        self.assertTrue(all(member.path.startswith('yoga_dataset/original/')
+                            for member in list_members(source, root='')))
+        self.assertEqual(sorted(member.path for member in list_members(source, root='yoga_dataset/original')),
+                         ['tree/tree_0.jpg', 'tree/tree_1.png', 'warrior/warrior_0.jpg'])
+        with self.assertRaises(ValueError):
+            list(list_members(source, root='../yoga_dataset'))
+
+    def test_unsafe_member_paths_are_skipped(self):
+        unsafe = [
+            ('../evil/d.jpg', b'escape'),
+            ('/tmp/abs_pose/e.jpg', b'absolute'),
+            ('original/../../f.jpg', b'escape'),
+            ('C:/poses/g.jpg', b'drive'),
+        ]
+        sources = {
+            'zip': self.make_zip('unsafe.zip', extra=unsafe),
+            'tar': self.make_tar('unsafe.tar', extra=unsafe),
+            'tgz': self.make_tar('unsafe.tgz', mode='w:gz', extra=unsafe),
+        }
+        for kind, source in sources.items():
+            with self.subTest(kind=kind), self.assertLogs('yoga_scraper.sources', 'WARNING'):
+                self.assertEqual(sorted(iter_images(source)), IMAGES)
+
+
+if __name__ == '__main__':
+    unittest.main()
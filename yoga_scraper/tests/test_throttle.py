@@ -0,0 +1,59 @@
+import unittest
+from types import SimpleNamespace
+
+from scrapy import Request, Spider
+from scrapy.core.downloader.middleware import DownloaderMiddlewareManager
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+from twisted.internet.defer import succeed
+
+from yoga_scraper import settings as project_settings
+
+
+class DomainThrottleChainTest(unittest.TestCase):
+    """Requests go through the project's downloader middleware chain, with Scrapy's own middlewares."""
+
+    def setUp(self):
+        settings = {name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()}
+        settings.update(ROBOTSTXT_OBEY=False, HTTPCACHE_ENABLED=False)
+        self.crawler = get_crawler(Spider, settings)
+        self.crawler.engine = SimpleNamespace(downloader=SimpleNamespace(per_slot_settings={}, slots={}))
+        self.spider = self.crawler._create_spider('test')
+        self.manager = DownloaderMiddlewareManager.from_crawler(self.crawler)
+        self.downloaded = []
+
+    def download(self, request, status=200):
+        def download_func(request, spider):
+            self.downloaded.append(request)
+            return succeed(Response(request.url, status=status, request=request))
+
+        results = []
+        self.manager.download(download_func, request, self.spider).addBoth(results.append)
+        return results[0]
+
+    def test_image_hosts_get_the_short_timeout(self):
+        self.download(Request('https://images.example.com/tree.jpg'))
+        self.download(Request('https://www.google.com/search?q=tree'))
+        image, search = self.downloaded
+        self.assertEqual(image.meta['download_timeout'], project_settings.DOMAIN_THROTTLE_IMAGE_TIMEOUT)
+        self.assertEqual(search.meta['download_timeout'], self.crawler.settings.getfloat('DOWNLOAD_TIMEOUT'))
+        self.assertEqual(image.meta['download_slot'], 'images.example.com')
+
+    def test_explicit_timeout_is_kept(self):
+        self.download(Request('https://images.example.com/tree.jpg', meta={'download_timeout': 60}))
+        self.assertEqual(self.downloaded[0].meta['download_timeout'], 60)
+
+    def test_throttled_attempts_are_seen_before_retries(self):
+        result = self.download(Request('https://images.example.com/tree.jpg'), status=429)
+        # RetryMiddleware turned the 429 into a new attempt, after the throttle backed off
+        self.assertIsInstance(result, Request)
+        self.assertEqual(result.meta['retry_times'], 1)
+        stats = self.crawler.stats
+        self.assertEqual(stats.get_value('domain_throttle/throttled_responses'), 1)
+        slot = self.crawler.engine.downloader.per_slot_settings['images.example.com']
+        self.assertEqual(slot['concurrency'], 1)
+        self.assertGreaterEqual(slot['delay'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,16 @@
 import os
+import io
 import sys
+import json
+import time
+import shutil
 import logging
+import argparse
 import multiprocessing
 from PIL import Image
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from yoga_scraper.imagecheck import check_image_structure, check_image_data
+from yoga_scraper.sources import iter_batches, list_members, read_batch
 import matplotlib.pyplot as plt
 import numpy as np
 import random
@@ -18,52 +25,246 @@ logging.basicConfig(
     ]
 )
 
-def verify_image(image_path):
-    """Verify that an image is valid and can be opened."""
-    try:
-        with Image.open(image_path) as img:
-            img.verify()  # Verify that the image is valid
-            return True, image_path
-    except Exception as e:
-        return False, image_path
-
-def verify_dataset(dataset_dir, num_workers=None):
-    """Verify all images in the dataset."""
+# Verification levels from cheapest to most thorough; each only runs on files that passed the previous one.
+# 'structure' is stricter than Pillow (it rejects e.g. JPEGs without EOI), so it only runs
+# when asked for: alone as a fast sweep, or in front of the Pillow levels with `structure`.
+VERIFY_LEVELS = ('structure', 'header', 'decode')
+PILLOW_LEVELS = ('header', 'decode')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+def check_structure(image_path, data=None):
+    """Walk the container structure of an image file, or of its bytes when given."""
+    if data is not None:
+        check_image_data(data)
+    else:
+        check_image_structure(image_path)
+
+def check_header(image_path, data=None):
+    """Check that the image header and structure parse, without decoding the pixels."""
+    with Image.open(io.BytesIO(data) if data is not None else image_path) as img:
+        img.verify()
+
+def check_decode(image_path, data=None):
+    """Decode every pixel, which catches truncated or corrupt image bodies."""
+    with Image.open(io.BytesIO(data) if data is not None else image_path) as img:
+        img.load()
+
+LEVEL_CHECKS = {
+    'structure': check_structure,
+    'header': check_header,
+    'decode': check_decode,
+}
+
+def level_checks(level, structure=False):
+    """Return the checks run for `level`, with the structure check first when `structure` is set."""
+    if level == 'structure':
+        return ('structure',)
+    checks = PILLOW_LEVELS[:PILLOW_LEVELS.index(level) + 1]
+    return ('structure',) + checks if structure else checks
+
+def verify_image(image_path, level='header', data=None, structure=False):
+    """Verify an image up to `level`, escalating only while the checks pass.
+
+    With `data`, the bytes of an archive member are checked and `image_path`
+    only names it. Returns (valid, image_path, failed_level, reason,
+    seconds per level, file size).
+    """
+    timings = {}
+    if data is not None:
+        size = len(data)
+    else:
+        try:
+            size = os.path.getsize(image_path)
+        except OSError:
+            size = 0
+    for name in level_checks(level, structure):
+        start_time = time.perf_counter()
+        try:
+            LEVEL_CHECKS[name](image_path, data)
+        except Exception as e:
+            timings[name] = time.perf_counter() - start_time
+            return False, image_path, name, f"{type(e).__name__}: {e}", timings, size
+        timings[name] = time.perf_counter() - start_time
+    return True, image_path, None, None, timings, size
+
+def verify_images(image_paths, level='header', structure=False):
+    """Verify a chunk of images in one worker task."""
+    return [verify_image(path, level, structure=structure) for path in image_paths]
+
+def verify_members(source, batch, level='header', structure=False):
+    """Verify a batch of archive members in one worker task, reading them in one sequential pass."""
+    results = []
+    for member, data, error in read_batch(source, batch):
+        image_path = os.path.join(source, member.path)
+        if error:
+            results.append((False, image_path, 'read', error, {}, 0))
+        else:
+            results.append(verify_image(image_path, level, data=data, structure=structure))
+    return results
+
+def iter_image_paths(dataset_dir, exclude_dir=None):
+    """Yield the image files of a dataset directory one at a time."""
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for root, dirs, files in os.walk(dataset_dir):
+        if exclude_dir:
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude_dir]
+        for filename in files:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, filename)
+
+def iter_chunks(iterable, size):
+    """Group an iterable into lists of up to `size` items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def quarantine_image(image_path, dataset_dir, quarantine_dir):
+    """Move an invalid image into the same relative place under the quarantine directory."""
+    target = os.path.join(quarantine_dir, os.path.relpath(image_path, dataset_dir))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.move(image_path, target)
+    return target
+
+def verify_dataset(dataset_dir, num_workers=None, level='header', report_path='verification_report.jsonl',
+                   quarantine_dir=None, chunk_size=64, archive_root=None, structure=False):
+    """Verify all images in the dataset, streaming results to a report file.
+
+    Paths are discovered lazily and verified in chunks by a process pool,
+    with at most a few chunks per worker in flight, so memory stays constant
+    whatever the size of the dataset. Every result is appended to the JSON
+    lines report as it arrives. Invalid images are moved under
+    `quarantine_dir` when it is given.
+
+    `dataset_dir` may also be a zip or tar archive. Workers then get batches
+    of member offsets and read them straight from the archive, without
+    extracting it; invalid members cannot be quarantined. Member paths are
+    relative to `archive_root`, by default the top-level directory shared
+    by all images.
+
+    `level` is the most thorough check to run: 'header' parses the header
+    with Pillow and 'decode' also decodes the pixels. 'structure' only walks
+    the container structure of the file bytes, without Pillow; with
+    `structure`, that walk also runs before the Pillow levels. It is
+    stricter than Pillow, e.g. about JPEGs without EOI. Each level only runs
+    on the images that passed the previous ones.
+    Returns a dict of counts with the throughput of each level.
+    """
+    if level not in VERIFY_LEVELS:
+        raise ValueError(f"unknown verification level {level!r}, expected one of {', '.join(VERIFY_LEVELS)}")
+
     # Get the number of workers
     if num_workers is None:
         num_workers = max(1, multiprocessing.cpu_count() - 1)
-    
-    # Find all image files
-    image_paths = []
-    for root, _, files in os.walk(dataset_dir):
-        for filename in files:
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')):
-                image_paths.append(os.path.join(root, filename))
-    
-    logging.info(f"Found {len(image_paths)} images to verify")
-    
-    # Verify images in parallel
-    with ProcessPoolExecutor(max_workers=num_workers) as executor:
-        results = list(executor.map(verify_image, image_paths))
-    
-    # Count valid and invalid images
-    valid_images = [path for valid, path in results if valid]
-    invalid_images = [path for valid, path in results if not valid]
-    
-    logging.info(f"Verification completed: {len(valid_images)} valid images, {len(invalid_images)} invalid images")
-    
-    # Log invalid images
-    if invalid_images:
-        logging.warning("Invalid images:")
-        for path in invalid_images:
-            logging.warning(f"  {path}")
-    
-    return valid_images, invalid_images
 
-def count_images_by_pose(dataset_dir):
+    is_archive = not os.path.isdir(dataset_dir)
+    if is_archive and quarantine_dir:
+        raise ValueError("Images inside an archive cannot be quarantined")
+
+    counts = {'checked': 0, 'valid': 0, 'invalid': 0, 'quarantined': 0}
+    level_stats = {name: {'checked': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0} for name in VERIFY_LEVELS}
+    level_stats['read'] = {'checked': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0}
+    if is_archive:
+        chunks = iter_batches(dataset_dir, chunk_size, root=archive_root)
+    else:
+        chunks = iter_chunks(iter_image_paths(dataset_dir, exclude_dir=quarantine_dir), chunk_size)
+    max_in_flight = num_workers * 2
+
+    logging.info(f"Verifying images in {dataset_dir} up to the {level} level (report: {report_path})")
+    start_time = time.time()
+
+    with open(report_path, 'w', encoding='utf-8') as report, \
+            ProcessPoolExecutor(max_workers=num_workers) as executor:
+        in_flight = set()
+        exhausted = False
+        while in_flight or not exhausted:
+            # Keep the pool busy without queueing the whole dataset
+            while not exhausted and len(in_flight) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                if is_archive:
+                    in_flight.add(executor.submit(verify_members, dataset_dir, chunk, level, structure))
+                else:
+                    in_flight.add(executor.submit(verify_images, chunk, level, structure))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                for valid, path, failed_level, reason, timings, size in future.result():
+                    counts['checked'] += 1
+                    for name, seconds in timings.items():
+                        level_stats[name]['checked'] += 1
+                        level_stats[name]['bytes'] += size
+                        level_stats[name]['seconds'] += seconds
+
+                    record = {'path': path, 'valid': valid}
+                    if valid:
+                        counts['valid'] += 1
+                    else:
+                        counts['invalid'] += 1
+                        level_stats[failed_level]['failed'] += 1
+                        record.update(level=failed_level, reason=reason)
+                        logging.debug(f"Invalid image ({failed_level}): {path}: {reason}")
+                        if quarantine_dir:
+                            try:
+                                record['quarantined'] = quarantine_image(path, dataset_dir, quarantine_dir)
+                                counts['quarantined'] += 1
+                            except OSError as e:
+                                logging.error(f"Error quarantining {path}: {e}")
+                    report.write(json.dumps(record, ensure_ascii=False) + '\n')
+            report.flush()
+
+    elapsed_time = time.time() - start_time
+    counts['seconds'] = round(elapsed_time, 2)
+    counts['images_per_sec'] = round(counts['checked'] / elapsed_time, 1) if elapsed_time else 0.0
+    counts['levels'] = {}
+    for name in level_checks(level, structure):
+        stats = level_stats[name]
+        # Worker time spent in this level, so the rate is per worker
+        rate = stats['checked'] / stats['seconds'] if stats['seconds'] else 0.0
+        bandwidth = stats['bytes'] / (1024 * 1024) / stats['seconds'] if stats['seconds'] else 0.0
+        counts['levels'][name] = {
+            'checked': stats['checked'],
+            'failed': stats['failed'],
+            'images_per_sec_per_worker': round(rate, 1),
+            'mb_per_sec_per_worker': round(bandwidth, 1),
+        }
+
+    if is_archive:
+        # Members whose bytes could not be extracted from the archive
+        counts['unreadable'] = level_stats['read']['failed']
+
+    quarantined = f", {counts['quarantined']} moved to {quarantine_dir}" if quarantine_dir else ""
+    unreadable = f", {counts['unreadable']} unreadable in the archive" if counts.get('unreadable') else ""
+    logging.info(
+        f"Verification completed: {counts['valid']} valid images, {counts['invalid']} invalid images{quarantined}{unreadable} "
+        f"({counts['images_per_sec']} images/sec, details in {report_path})"
+    )
+    for name, stats in counts['levels'].items():
+        logging.info(
+            f"  {name}: {stats['checked']} checked, {stats['failed']} failed, "
+            f"{stats['images_per_sec_per_worker']:.0f} images/sec ({stats['mb_per_sec_per_worker']:.0f} MB/s) per worker"
+        )
+    return counts
+
+def count_images_by_pose(dataset_dir, archive_root=None):
     """Count the number of images for each yoga pose."""
     pose_counts = {}
     
+    # Archives are counted from their member list, without reading the images
+    if not os.path.isdir(dataset_dir):
+        for member in list_members(dataset_dir, archive_root):
+            pose_counts[member.pose] = pose_counts.get(member.pose, 0) + 1
+        return pose_counts
+    
     for root, _, files in os.walk(dataset_dir):
         pose_dir = os.path.basename(root)
         if pose_dir not in pose_counts:
@@ -125,18 +326,32 @@ def visualize_dataset(dataset_dir, num_samples=3):
     plt.savefig('dataset_visualization.png')
     logging.info("Dataset visualization saved to dataset_visualization.png")
 
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Verify the integrity of the dataset")
+
+    parser.add_argument("dataset_dir", nargs="?", default="processed_images", help="Directory, zip or tar archive containing the images to verify")
+    parser.add_argument("--level", choices=VERIFY_LEVELS, default="header", help="Most thorough check to run; each level only runs on files that passed the previous one, 'structure' alone is a fast byte-level sweep")
+    parser.add_argument("--structure", action="store_true", help="Walk the container structure of every file before the Pillow checks; stricter than Pillow, e.g. about JPEGs without EOI")
+    parser.add_argument("--report", default="verification_report.jsonl", help="JSON lines file the result of every image is written to")
+    parser.add_argument("--quarantine-dir", default=None, help="Move invalid images into this directory, keeping their relative paths")
+    parser.add_argument("--num-workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--archive-root", default=None, help="Directory inside an archive the image paths are relative to (default: the top-level directory shared by all images, '' for none)")
+
+    return parser.parse_args()
+
 if __name__ == "__main__":
     # Parse command-line arguments
-    dataset_dir = "processed_images"
-    
-    if len(sys.argv) > 1:
-        dataset_dir = sys.argv[1]
+    args = parse_arguments()
+    dataset_dir = args.dataset_dir
     
     # Verify the dataset
-    valid_images, invalid_images = verify_dataset(dataset_dir)
+    verify_dataset(dataset_dir, num_workers=args.num_workers, level=args.level,
+                   report_path=args.report, quarantine_dir=args.quarantine_dir, archive_root=args.archive_root,
+                   structure=args.structure)
     
     # Count images by pose
-    pose_counts = count_images_by_pose(dataset_dir)
+    pose_counts = count_images_by_pose(dataset_dir, args.archive_root)
     
     # Print the counts
     print("\nImage counts by pose:")
@@ -144,4 +359,5 @@ if __name__ == "__main__":
         print(f"  {pose}: {count} images")
     
     # Visualize the dataset
-    visualize_dataset(dataset_dir) 
+    if os.path.isdir(dataset_dir):
+        visualize_dataset(dataset_dir) 
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import subprocess
+import urllib.request
+from yoga_scraper.driver_cache import find_chrome_binary
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Keep headless Chrome instances running for the Selenium spider to attach to")
+
+    parser.add_argument("--count", type=int, default=4, help="Number of browsers, one per SELENIUM_POOL_SIZE slot")
+    parser.add_argument("--port", type=int, default=9222, help="Remote debugging port of the first browser")
+    parser.add_argument("--profile-dir", default="browser_profiles", help="Directory holding the persistent profile of each browser")
+    parser.add_argument("--chrome-binary", default=None, help="Chrome executable (default: CHROME_BINARY or the installed Chrome)")
+    parser.add_argument("--state-file", default="warm_browsers.json", help="File recording the running browsers")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each browser to accept connections")
+    parser.add_argument("--stop", action="store_true", help="Stop the browsers recorded in the state file")
+
+    return parser.parse_args(argv)
+
+
+def debugger_ready(address):
+    """Check whether a browser answers on its remote debugging address."""
+    try:
+        with urllib.request.urlopen(f"http://{address}/json/version", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def load_state(state_file):
+    """Return the browsers recorded by an earlier run."""
+    try:
+        with open(state_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def start_browser(chrome_binary, port, profile_dir):
+    """Launch a headless Chrome with remote debugging and a persistent profile, detached from this process."""
+    os.makedirs(profile_dir, exist_ok=True)
+    command = [
+        chrome_binary,
+        "--headless=new",
+        f"--remote-debugging-port={port}",
+        f"--user-data-dir={os.path.abspath(profile_dir)}",
+        "--no-sandbox",
+        "--disable-dev-shm-usage",
+        "--disable-gpu",
+        "--window-size=1920,1080",
+        "--no-first-run",
+        "--no-default-browser-check",
+        "about:blank",
+    ]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def start_browsers(args):
+    """Start the browsers that are not running yet and record all of them."""
+    chrome_binary = args.chrome_binary or find_chrome_binary()
+    if not chrome_binary:
+        logging.error("Chrome not found. Install it or set CHROME_BINARY.")
+        return None
+
+    running = {entry['address']: entry for entry in load_state(args.state_file) if debugger_ready(entry['address'])}
+    browsers = []
+    for slot in range(args.count):
+        address = f"127.0.0.1:{args.port + slot}"
+        if address in running:
+            logging.info(f"Browser {slot} already running at {address}")
+            browsers.append(running[address])
+            continue
+
+        profile_dir = os.path.join(args.profile_dir, f"browser-{slot}")
+        started = time.time()
+        process = start_browser(chrome_binary, args.port + slot, profile_dir)
+        while not debugger_ready(address):
+            if process.poll() is not None or time.time() - started > args.timeout:
+                logging.error(f"Browser {slot} did not start on {address}")
+                process.kill()
+                break
+            time.sleep(0.1)
+        else:
+            logging.info(f"Browser {slot} ready at {address} in {time.time() - started:.1f}s (profile {profile_dir})")
+            browsers.append({'slot': slot, 'address': address, 'pid': process.pid, 'profile': profile_dir})
+
+    with open(args.state_file, 'w', encoding='utf-8') as f:
+        json.dump(browsers, f, indent=2)
+    return browsers
+
+
+def stop_browsers(args):
+    """Terminate the browsers recorded in the state file."""
+    for entry in load_state(args.state_file):
+        try:
+            os.kill(entry['pid'], signal.SIGTERM)
+            logging.info(f"Stopped browser {entry['slot']} at {entry['address']}")
+        except OSError as e:
+            logging.warning(f"Could not stop browser {entry['slot']} (pid {entry['pid']}): {e}")
+    if os.path.exists(args.state_file):
+        os.remove(args.state_file)
+
+
+def main():
+    """Start or stop the warm browsers."""
+    args = parse_arguments()
+    if args.stop:
+        stop_browsers(args)
+        return 0
+
+    browsers = start_browsers(args)
+    if not browsers:
+        return 1
+    addresses = [entry['address'] for entry in browsers]
+    logging.info(f"Attach the Selenium spider with: SELENIUM_DEBUGGER_ADDRESSES = {json.dumps(addresses)}")
+    logging.info(f"e.g. scrapy crawl selenium_yoga_poses -s SELENIUM_DEBUGGER_ADDRESSES={','.join(addresses)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import os
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from .imageproc import letterbox
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Subdirectory of a pose holding its reference images (yoga_dataset/<pose>/Original/)
+REFERENCE_DIR = 'Original'
+
+
+def pose_of(dataset_dir, path):
+    """Return the pose label of an image file.
+
+    Images in a subdirectory (processed_images/<pose>/<file>, or a deeper
+    layout such as original/<pose>/<file>) take the name of their directory,
+    and references in <pose>/Original/ that of the pose. Images directly in
+    the dataset directory are named <pose>_<n>.jpg.
+    """
+    parent = os.path.dirname(os.path.relpath(path, dataset_dir))
+    if os.path.basename(parent) == REFERENCE_DIR:
+        parent = os.path.dirname(parent)
+    if parent:
+        return os.path.basename(parent)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.rsplit('_', 1)[0]
+
+
+def find_samples(dataset_dir):
+    """Return the sorted image paths of a dataset directory and their pose labels."""
+    paths = []
+    for root, _, files in os.walk(dataset_dir):
+        for filename in files:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    paths.sort()
+    return paths, [pose_of(dataset_dir, path) for path in paths]
+
+
+def decode_batch(paths, image_size):
+    """Decode image files into one uint8 array of shape (N, H, W, 3).
+
+    Images that are not `image_size` (width, height) already are letterboxed
+    to it, and unreadable files are left black.
+    """
+    width, height = image_size
+    batch = np.zeros((len(paths), height, width, 3), dtype=np.uint8)
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                img = img.convert('RGB')
+                if img.size != (width, height):
+                    img = letterbox(img, (width, height))
+                batch[i] = np.asarray(img)
+        except Exception as e:
+            logger.warning(f"Error decoding image {path}: {e}")
+    return batch
+
+
+def _take_batch(images, indices):
+    """Gather rows of a packed image array in sorted order, the fastest way to read them."""
+    order = np.argsort(indices, kind='stable')
+    batch = np.empty((len(indices),) + images.shape[1:], dtype=np.uint8)
+    batch[order] = images[indices[order]]
+    return batch
+
+
+def buffered_shuffle(indices, buffer_size, rng):
+    """Shuffle a sequence through a fixed-size buffer, like a streaming input pipeline.
+
+    Each output is drawn at random from the next `buffer_size` pending items,
+    so reads stay local while the order is still randomized. A buffer at
+    least as large as the sequence gives a full permutation.
+    """
+    if buffer_size >= len(indices):
+        return rng.permutation(indices)
+
+    buffer = list(indices[:buffer_size])
+    shuffled = []
+    for index in indices[buffer_size:]:
+        slot = rng.integers(len(buffer))
+        shuffled.append(buffer[slot])
+        buffer[slot] = index
+    rng.shuffle(buffer)
+    shuffled.extend(buffer)
+    return np.asarray(shuffled, dtype=np.int64)
+
+
+class BatchLoader:
+    """Batches of (uint8 NxHxWx3 images, int64 labels) from the processed dataset.
+
+    `source` is either a directory of processed images (per-pose
+    subdirectories or flat <pose>_<n>.jpg files) or an .npz file written by
+    pack_dataset(). Directory images are decoded in the background by a
+    thread or process pool, with up to `prefetch` batches in flight, and
+    batches are always yielded in order. Packed images are already decoded
+    and are gathered in a background thread.
+
+    The order of every epoch depends only on `seed` and the epoch number.
+    With `world_size` > 1, each rank gets an equal, disjoint share of the
+    shuffled samples, so all ranks see the same number of batches.
+    """
+
+    def __init__(self, source, batch_size=64, shuffle=True, shuffle_buffer=10000, seed=0,
+                 num_workers=4, executor='thread', prefetch=4, rank=0, world_size=1,
+                 drop_last=False, image_size=(224, 224)):
+        if not 0 <= rank < world_size:
+            raise ValueError(f"rank {rank} is not in range for world size {world_size}")
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"unknown executor {executor!r}, expected 'thread' or 'process'")
+
+        self.source = source
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.num_workers = max(1, num_workers)
+        self.executor_type = executor
+        self.prefetch = max(1, prefetch)
+        self.rank = rank
+        self.world_size = world_size
+        self.drop_last = drop_last
+        self.epoch = 0
+        self._executor = None
+
+        if os.path.isdir(source):
+            self.paths, poses = find_samples(source)
+            self.images = None
+            self.image_size = tuple(image_size)
+            self.classes = sorted(set(poses))
+            class_index = {pose: i for i, pose in enumerate(self.classes)}
+            self.labels = np.array([class_index[pose] for pose in poses], dtype=np.int64)
+        else:
+            with np.load(source) as packed:
+                self.images = packed['images']
+                self.labels = packed['labels'].astype(np.int64)
+                self.classes = [str(pose) for pose in packed['classes']]
+                self.paths = [str(path) for path in packed['paths']]
+            self.image_size = (self.images.shape[2], self.images.shape[1])
+
+        logger.info(f"Batch loader over {len(self.labels)} images of {len(self.classes)} poses from {source}")
+
+    @property
+    def samples_per_rank(self):
+        """Number of samples each rank reads per epoch."""
+        return len(self.labels) // self.world_size
+
+    def __len__(self):
+        """Number of batches per epoch on this rank."""
+        if self.drop_last:
+            return self.samples_per_rank // self.batch_size
+        return -(-self.samples_per_rank // self.batch_size)
+
+    def set_epoch(self, epoch):
+        """Select the epoch whose order the next iteration uses."""
+        self.epoch = epoch
+
+    def epoch_indices(self, epoch):
+        """Return the sample indices this rank reads in an epoch, in order."""
+        indices = np.arange(len(self.labels), dtype=np.int64)
+        if self.shuffle:
+            # Every rank draws the same permutation and takes its own slice of it
+            rng = np.random.default_rng([self.seed, epoch])
+            indices = buffered_shuffle(indices, self.shuffle_buffer, rng)
+        indices = indices[:self.samples_per_rank * self.world_size]
+        return indices[self.rank::self.world_size]
+
+    def _get_executor(self):
+        """Start the decode pool on first use."""
+        if self._executor is None:
+            if self.images is not None:
+                # Gathering packed rows is a memory copy, one thread keeps up
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            elif self.executor_type == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.num_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.num_workers)
+        return self._executor
+
+    def _submit(self, executor, batch_indices):
+        """Start loading the images of one batch."""
+        if self.images is not None:
+            return executor.submit(_take_batch, self.images, batch_indices)
+        paths = [self.paths[i] for i in batch_indices]
+        return executor.submit(decode_batch, paths, self.image_size)
+
+    def __iter__(self):
+        indices = self.epoch_indices(self.epoch)
+        self.epoch += 1
+
+        batches = [indices[start:start + self.batch_size] for start in range(0, len(indices), self.batch_size)]
+        if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+            batches.pop()
+
+        executor = self._get_executor()
+        # Decoding runs ahead of the consumer by the prefetch depth (at least one batch per worker)
+        depth = max(self.prefetch, self.num_workers if self.images is None else 1)
+        pending = deque()
+        next_batch = 0
+        try:
+            while next_batch < len(batches) or pending:
+                while next_batch < len(batches) and len(pending) < depth:
+                    batch_indices = batches[next_batch]
+                    pending.append((self._submit(executor, batch_indices), batch_indices))
+                    next_batch += 1
+                future, batch_indices = pending.popleft()
+                yield future.result(), self.labels[batch_indices]
+        finally:
+            for future, _ in pending:
+                future.cancel()
+
+    def close(self):
+        """Shut down the decode pool."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def pack_dataset(dataset_dir, output_path, image_size=(224, 224), num_workers=4, batch_size=256):
+    """Decode a processed image directory once into an .npz file the BatchLoader reads directly.
+
+    The file holds `images` (uint8 NxHxWx3), `labels`, `classes` and the
+    source `paths`. It is stored uncompressed so loading it is a plain read.
+    """
+    with BatchLoader(dataset_dir, batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                     image_size=image_size) as loader:
+        images = np.empty((len(loader.labels), image_size[1], image_size[0], 3), dtype=np.uint8)
+        offset = 0
+        for batch, _ in loader:
+            images[offset:offset + len(batch)] = batch
+            offset += len(batch)
+
+        np.savez(
+            output_path,
+            images=images,
+            labels=loader.labels,
+            classes=np.array(loader.classes),
+            paths=np.array([os.path.relpath(path, dataset_dir) for path in loader.paths]),
+        )
+    logger.info(f"Packed {len(images)} images of {len(loader.classes)} poses into {output_path}")
+    return len(images)
@@ -0,0 +1,78 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+class ContentIndex:
+    """Small SQLite index of content-addressed image blobs.
+
+    `blobs` maps the hash of a downloaded body to the single file it was
+    stored in, and `sources` maps every (pose, url) pair that produced that
+    body to its blob.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " digest TEXT PRIMARY KEY,"
+            " path TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " checksum TEXT,"
+            " created REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " pose TEXT NOT NULL,"
+            " url TEXT NOT NULL,"
+            " digest TEXT NOT NULL REFERENCES blobs(digest),"
+            " PRIMARY KEY (pose, url))"
+        )
+        self.conn.commit()
+
+    def get_blob(self, digest):
+        """Return (path, checksum) of a stored blob, or None."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT path, checksum FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+
+    def path_for_source(self, pose, url):
+        """Return the blob path an earlier download of (pose, url) was stored in."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT blobs.path FROM sources JOIN blobs ON blobs.digest = sources.digest"
+                " WHERE sources.pose = ? AND sources.url = ?", (pose, url)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_blob(self, digest, path, size, checksum=None):
+        """Record a newly stored blob."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO blobs (digest, path, size, checksum, created) VALUES (?, ?, ?, ?, ?)",
+                (digest, path, size, checksum, time.time())
+            )
+            self.conn.commit()
+
+    def add_source(self, pose, url, digest):
+        """Map a (pose, url) pair to the blob its body was stored in."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources (pose, url, digest) VALUES (?, ?, ?)",
+                (pose, url, digest)
+            )
+            self.conn.commit()
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self.conn.close()
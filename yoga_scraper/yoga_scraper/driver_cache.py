@@ -0,0 +1,181 @@
+import os
+import io
+import json
+import time
+import shutil
+import logging
+import platform
+import zipfile
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+CHROMEDRIVER_NAME = "chromedriver.exe" if platform.system() == "Windows" else "chromedriver"
+
+# Default location of the driver cache, shared by every project checkout of the user
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "yoga_scraper", "chromedriver")
+
+# Chrome executables tried, in order, when CHROME_BINARY is not set
+CHROME_BINARIES = {
+    "Linux": ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser"],
+    "Darwin": ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"],
+    "Windows": [
+        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+    ],
+}
+
+
+def find_chrome_binary():
+    """Return the path of the installed Chrome executable, or None."""
+    if os.environ.get("CHROME_BINARY"):
+        return os.environ["CHROME_BINARY"]
+    for candidate in CHROME_BINARIES.get(platform.system(), []):
+        path = candidate if os.path.isabs(candidate) else shutil.which(candidate)
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def read_version(binary):
+    """Ask a Chrome or ChromeDriver executable for its version, e.g. '114.0.5735.90', or return None."""
+    try:
+        output = subprocess.run([binary, "--version"], capture_output=True, timeout=30).stdout.decode("utf-8")
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug(f"Error running {binary} --version: {e}")
+        return None
+    for token in output.split():
+        if token[:1].isdigit() and "." in token:
+            return token
+    return None
+
+
+def major_version(version):
+    """Return the major part of a Chrome or ChromeDriver version."""
+    return str(version).split(".")[0]
+
+
+def version_key(version):
+    """Return a Chrome or ChromeDriver version as a tuple of numbers, so 114.0.5735.198 sorts above 114.0.5735.90."""
+    return tuple(int(part) if part.isdigit() else 0 for part in str(version).split("."))
+
+
+class DriverCache:
+    """Versioned local cache of ChromeDriver binaries.
+
+    Drivers live in <cache_dir>/<driver version>/chromedriver, and index.json
+    maps each Chrome version to its driver. The index also remembers the
+    version of every Chrome executable by path and modification time, so a
+    repeated crawl resolves its driver without starting Chrome, querying
+    webdriver_manager or touching the network.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.environ.get("CHROMEDRIVER_CACHE_DIR") or DEFAULT_CACHE_DIR
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Create a cache at CHROMEDRIVER_CACHE_DIR, or the default location."""
+        return cls(settings.get("CHROMEDRIVER_CACHE_DIR"))
+
+    def _load(self):
+        """Read the index, tolerating a missing or damaged file."""
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("drivers", {})
+        index.setdefault("binaries", {})
+        return index
+
+    def _save(self, index):
+        """Write the index atomically so concurrent crawls never read half a file."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def chrome_version(self, binary=None):
+        """Return the version of a Chrome executable, from the index when it has not changed."""
+        binary = binary or find_chrome_binary()
+        if not binary:
+            return None
+        try:
+            mtime = os.path.getmtime(binary)
+        except OSError:
+            return None
+
+        with self._lock:
+            index = self._load()
+            entry = index["binaries"].get(binary)
+            if entry and entry["mtime"] == mtime:
+                return entry["version"]
+
+            version = read_version(binary)
+            if version:
+                index["binaries"][binary] = {"mtime": mtime, "version": version}
+                self._save(index)
+            return version
+
+    def lookup(self, chrome_version):
+        """Return the cached driver for a Chrome version, or one of the same major version, or None."""
+        if not chrome_version:
+            return None
+        drivers = self._load()["drivers"]
+        candidates = [drivers.get(chrome_version)] + [
+            entry for version, entry in sorted(drivers.items(), key=lambda item: version_key(item[0]), reverse=True)
+            if major_version(version) == major_version(chrome_version)
+        ]
+        for entry in candidates:
+            if entry:
+                path = os.path.join(self.cache_dir, entry["path"])
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def _register(self, chrome_version, driver_version, path):
+        """Record a driver binary in the index."""
+        with self._lock:
+            index = self._load()
+            index["drivers"][chrome_version] = {
+                "driver_version": driver_version,
+                "path": os.path.relpath(path, self.cache_dir),
+                "added": time.time(),
+            }
+            self._save(index)
+        logger.info(f"Cached ChromeDriver {driver_version} for Chrome {chrome_version} at {path}")
+        return path
+
+    def add(self, chrome_version, driver_version, source_path):
+        """Copy a driver binary into the cache and register it for a Chrome version."""
+        target_dir = os.path.join(self.cache_dir, driver_version)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, CHROMEDRIVER_NAME)
+        if os.path.abspath(source_path) != os.path.abspath(target):
+            shutil.copy2(source_path, target)
+        os.chmod(target, 0o755)
+        return self._register(chrome_version, driver_version, target)
+
+    def add_zip(self, chrome_version, driver_version, zip_bytes):
+        """Extract the driver from a downloaded ChromeDriver zip into the cache."""
+        target_dir = os.path.join(self.cache_dir, driver_version)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, CHROMEDRIVER_NAME)
+
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zip_file:
+            # Older zips hold the driver at the top, newer ones in a chromedriver-<platform>/ folder
+            members = [name for name in zip_file.namelist() if os.path.basename(name) == CHROMEDRIVER_NAME]
+            if not members:
+                raise ValueError("The ChromeDriver zip does not contain a chromedriver executable")
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            with zip_file.open(members[0]) as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        os.chmod(tmp_path, 0o755)
+        os.replace(tmp_path, target)
+        return self._register(chrome_version, driver_version, target)
@@ -0,0 +1,292 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from .imageproc import letterbox
+from .batch_loader import REFERENCE_DIR, IMAGE_EXTENSIONS, find_samples
+
+logger = logging.getLogger(__name__)
+
+# Side of the square every image is letterboxed to before computing features
+EMBEDDING_SIZE = 64
+
+# Side of the downsampled grayscale thumbnail
+GRAY_SIZE = 16
+
+# HOG cells of 8x8 pixels with 9 unsigned orientation bins
+HOG_CELL = 8
+HOG_BINS = 9
+
+# Color histogram with 4 levels per channel, ignoring the white letterbox padding
+COLOR_LEVELS = 4
+WHITE_THRESHOLD = 245
+
+# Weights of the feature groups in the concatenated embedding
+FEATURE_WEIGHTS = {'gray': 1.0, 'hog': 1.5, 'color': 1.0}
+
+EMBEDDING_DIM = (
+    GRAY_SIZE * GRAY_SIZE
+    + (EMBEDDING_SIZE // HOG_CELL) ** 2 * HOG_BINS
+    + COLOR_LEVELS ** 3
+)
+
+
+def _unit(vector):
+    """Scale a vector to unit length, leaving zero vectors alone."""
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _hog(gray):
+    """Histogram of oriented gradients of a square grayscale array, one histogram per cell."""
+    gx = np.zeros_like(gray)
+    gy = np.zeros_like(gray)
+    gx[:, 1:-1] = gray[:, 2:] - gray[:, :-2]
+    gy[1:-1, :] = gray[2:, :] - gray[:-2, :]
+    magnitude = np.hypot(gx, gy)
+    orientation = np.mod(np.arctan2(gy, gx), np.pi)
+    bins = np.minimum((orientation / np.pi * HOG_BINS).astype(np.int64), HOG_BINS - 1)
+
+    cells_per_side = gray.shape[0] // HOG_CELL
+    rows, cols = np.indices(gray.shape)
+    cells = (rows // HOG_CELL) * cells_per_side + cols // HOG_CELL
+    return np.bincount((cells * HOG_BINS + bins).ravel(), weights=magnitude.ravel(),
+                       minlength=cells_per_side * cells_per_side * HOG_BINS)
+
+
+def embed_image(img):
+    """Return the float32 embedding of a PIL image.
+
+    The embedding concatenates a mean-centered grayscale thumbnail, a HOG
+    descriptor and a color histogram, each scaled to unit length and
+    weighted. The whole vector has unit length, so the dot product of two
+    embeddings is their cosine similarity.
+    """
+    img = letterbox(img.convert('RGB'), (EMBEDDING_SIZE, EMBEDDING_SIZE))
+    rgb = np.asarray(img, dtype=np.uint8)
+    gray = np.asarray(img.convert('L'), dtype=np.float32)
+
+    thumbnail = np.asarray(img.convert('L').resize((GRAY_SIZE, GRAY_SIZE), Image.BILINEAR), dtype=np.float32).ravel()
+    thumbnail -= thumbnail.mean()
+
+    # Color of the subject only, the letterbox padding is pure white
+    pixels = rgb.reshape(-1, 3)
+    pixels = pixels[(pixels < WHITE_THRESHOLD).any(axis=1)]
+    levels = (pixels // (256 // COLOR_LEVELS)).astype(np.int64)
+    color = np.bincount(levels[:, 0] * COLOR_LEVELS ** 2 + levels[:, 1] * COLOR_LEVELS + levels[:, 2],
+                        minlength=COLOR_LEVELS ** 3).astype(np.float32)
+    # Square roots make the dot product of histograms their Bhattacharyya coefficient
+    color = np.sqrt(color / max(1, len(pixels)))
+
+    embedding = np.concatenate([
+        FEATURE_WEIGHTS['gray'] * _unit(thumbnail),
+        FEATURE_WEIGHTS['hog'] * _unit(_hog(gray).astype(np.float32)),
+        FEATURE_WEIGHTS['color'] * _unit(color),
+    ])
+    return _unit(embedding).astype(np.float32)
+
+
+def embed_files(paths):
+    """Return the embeddings of image files as one float32 matrix; unreadable files get zero rows."""
+    matrix = np.zeros((len(paths), EMBEDDING_DIM), dtype=np.float32)
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                matrix[i] = embed_image(img)
+        except Exception as e:
+            logger.warning(f"Error embedding image {path}: {e}")
+    return matrix
+
+
+def embed_paths(paths, num_workers=None, batch_size=64):
+    """Embed image files in parallel into one contiguous float32 matrix, in the order of `paths`."""
+    if num_workers is None:
+        num_workers = max(1, (os.cpu_count() or 2) - 1)
+    batches = [paths[start:start + batch_size] for start in range(0, len(paths), batch_size)]
+    if not batches:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    if num_workers == 1:
+        return np.ascontiguousarray(np.concatenate([embed_files(batch) for batch in batches]))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return np.ascontiguousarray(np.concatenate(list(executor.map(embed_files, batches))))
+
+
+def find_references(reference_root):
+    """Return the reference images under <reference_root>/<pose>/Original/ and their poses."""
+    paths, poses = [], []
+    if not reference_root or not os.path.isdir(reference_root):
+        return paths, poses
+    for pose in sorted(os.listdir(reference_root)):
+        reference_dir = os.path.join(reference_root, pose, REFERENCE_DIR)
+        if not os.path.isdir(reference_dir):
+            continue
+        for filename in sorted(os.listdir(reference_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(reference_dir, filename))
+                poses.append(pose)
+    return paths, poses
+
+
+def _normalize_rows(matrix):
+    """Scale every row of a matrix to unit length, leaving zero rows alone."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+class EmbeddingIndex:
+    """Embeddings of the processed images and the pose reference images.
+
+    `matrix` is a contiguous float32 array with one unit-length row per
+    image, so all similarity queries are matrix products. Similarities are
+    cosines and distances are 1 - cosine.
+    """
+
+    def __init__(self, paths, labels, classes, matrix, reference_paths=(), reference_labels=(), references=None):
+        self.paths = list(paths)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.classes = list(classes)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.reference_paths = list(reference_paths)
+        self.reference_labels = np.asarray(reference_labels, dtype=np.int64)
+        if references is None:
+            references = np.zeros((0, self.matrix.shape[1]), dtype=np.float32)
+        self.references = np.ascontiguousarray(references, dtype=np.float32)
+
+    @classmethod
+    def build(cls, dataset_dir, reference_root=None, num_workers=None, batch_size=64):
+        """Embed every processed image in `dataset_dir` and the references under `reference_root`."""
+        paths, poses = find_samples(dataset_dir)
+        # Processed copies of the references are not candidates for review
+        keep = [i for i, path in enumerate(paths) if os.path.basename(os.path.dirname(path)) != REFERENCE_DIR]
+        paths = [paths[i] for i in keep]
+        poses = [poses[i] for i in keep]
+
+        reference_paths, reference_poses = find_references(reference_root)
+        classes = sorted(set(poses) | set(reference_poses))
+        class_index = {pose: i for i, pose in enumerate(classes)}
+
+        logger.info(f"Embedding {len(paths)} images and {len(reference_paths)} references of {len(classes)} poses")
+        matrix = embed_paths(paths, num_workers=num_workers, batch_size=batch_size)
+        references = embed_paths(reference_paths, num_workers=1)
+        return cls(
+            paths, [class_index[pose] for pose in poses], classes, matrix,
+            reference_paths, [class_index[pose] for pose in reference_poses], references,
+        )
+
+    def save(self, path):
+        """Write the index to an .npz file."""
+        np.savez(
+            path,
+            paths=np.array(self.paths),
+            labels=self.labels,
+            classes=np.array(self.classes),
+            matrix=self.matrix,
+            reference_paths=np.array(self.reference_paths),
+            reference_labels=self.reference_labels,
+            references=self.references,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()."""
+        with np.load(path) as data:
+            return cls(
+                [str(p) for p in data['paths']], data['labels'], [str(c) for c in data['classes']], data['matrix'],
+                [str(p) for p in data['reference_paths']], data['reference_labels'], data['references'],
+            )
+
+    def _one_hot(self):
+        """Return the N x K matrix mapping each image to its pose."""
+        one_hot = np.zeros((len(self.labels), len(self.classes)), dtype=np.float32)
+        one_hot[np.arange(len(self.labels)), self.labels] = 1
+        return one_hot
+
+    def centroids(self):
+        """Return the unit-length mean embedding of every pose, K x D."""
+        return _normalize_rows(self._one_hot().T @ self.matrix)
+
+    def centroid_similarities(self):
+        """Return (similarity to the own pose centroid, N x K similarities to every centroid).
+
+        The own centroid leaves the image itself out, so an outlier cannot
+        pull its pose's centroid towards itself. The own pose's column of the
+        N x K matrix uses that centroid as well, so an image does not look
+        closer to its current label than to the others.
+        """
+        sums = self._one_hot().T @ self.matrix
+        own = _normalize_rows(sums[self.labels] - self.matrix)
+        own_similarity = np.einsum('ij,ij->i', self.matrix, own)
+        similarity = self.matrix @ _normalize_rows(sums).T
+        similarity[np.arange(len(self.labels)), self.labels] = own_similarity
+        return own_similarity, similarity
+
+    def reference_similarities(self):
+        """Return (best similarity to the own pose's references, N x K best similarity per pose).
+
+        Poses without references get NaN.
+        """
+        per_pose = np.full((len(self.labels), len(self.classes)), np.nan, dtype=np.float32)
+        if len(self.references):
+            similarities = self.matrix @ self.references.T
+            for pose in np.unique(self.reference_labels):
+                per_pose[:, pose] = similarities[:, self.reference_labels == pose].max(axis=1)
+        return per_pose[np.arange(len(self.labels)), self.labels], per_pose
+
+    def nearest_neighbors(self, k=10, batch_size=1024):
+        """Return the indices and similarities of the k nearest other images of every image.
+
+        Similarities are computed in batches of rows so memory stays at
+        batch_size x N.
+        """
+        k = min(k, len(self.labels) - 1)
+        indices = np.zeros((len(self.labels), k), dtype=np.int64)
+        similarities = np.zeros((len(self.labels), k), dtype=np.float32)
+        if k <= 0:
+            return indices, similarities
+
+        for start in range(0, len(self.labels), batch_size):
+            block = self.matrix[start:start + batch_size] @ self.matrix.T
+            rows = np.arange(len(block))
+            block[rows, start + rows] = -np.inf  # not its own neighbor
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_similarities = block[rows[:, None], top]
+            order = np.argsort(-top_similarities, axis=1)
+            indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+            similarities[start:start + len(block)] = np.take_along_axis(top_similarities, order, axis=1)
+        return indices, similarities
+
+    def rank_suspects(self, k=10):
+        """Rank images from most to least suspect.
+
+        An image is suspect when it is far from its pose's centroid and
+        references, and when its nearest neighbors belong to other poses. The
+        score is the mean of those distances, and `likely_pose` is the pose
+        whose centroid it is closest to, its own pose's centroid leaving it
+        out. Returns one dict per image, most suspect first.
+        """
+        own_centroid, centroid_similarity = self.centroid_similarities()
+        own_reference, _ = self.reference_similarities()
+        neighbors, _ = self.nearest_neighbors(k)
+        agreement = (self.labels[neighbors] == self.labels[:, None]).mean(axis=1) if neighbors.size else np.ones(len(self.labels))
+
+        has_reference = ~np.isnan(own_reference)
+        reference_distance = np.where(has_reference, 1 - np.nan_to_num(own_reference), 0)
+        terms = 2 + has_reference.astype(np.float32)
+        score = ((1 - own_centroid) + reference_distance + (1 - agreement)) / terms
+
+        # Centroid similarities are comparable across poses, reference ones are not (not every pose has references)
+        likely = centroid_similarity.argmax(axis=1)
+
+        suspects = []
+        for i in np.argsort(-score):
+            suspects.append({
+                'path': self.paths[i],
+                'pose': self.classes[self.labels[i]],
+                'likely_pose': self.classes[likely[i]],
+                'score': float(score[i]),
+                'centroid_distance': float(1 - own_centroid[i]),
+                'reference_distance': float(1 - own_reference[i]) if has_reference[i] else None,
+                'neighbor_agreement': float(agreement[i]),
+            })
+        return suspects
@@ -0,0 +1,152 @@
+import re
+import json
+from collections import namedtuple
+
+# Full-size image entries in the AF_initDataCallback payloads of a results
+# page look like ["https://example.com/photo.jpg",1200,800] (url, height, width)
+FULL_SIZE_IMAGE_RE = re.compile(r'\["(https?://[^"]+?)",(\d+),(\d+)\]')
+
+# JavaScript escapes used inside the embedded data, e.g. = for "="
+JS_UNICODE_ESCAPE_RE = re.compile(r'\\u([0-9a-fA-F]{4})')
+
+# Google-hosted thumbnails that appear next to every full-size entry
+THUMBNAIL_HOSTS = ('encrypted-tbn0.gstatic.com', 'encrypted-tbn1.gstatic.com',
+                   'encrypted-tbn2.gstatic.com', 'encrypted-tbn3.gstatic.com')
+THUMBNAIL_PREFIXES = tuple(f"{scheme}://{host}/" for scheme in ('https', 'http') for host in THUMBNAIL_HOSTS)
+
+
+def decode_js_string(value):
+    """Decode the \\uXXXX escapes of a JavaScript string literal."""
+    return JS_UNICODE_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), value)
+
+
+# Start of the payload of each data callback, e.g. AF_initDataCallback({key: 'ds:1', hash: '2', data:[...
+DATA_CALLBACK_RE = re.compile(r'AF_initDataCallback\(\{[^{}]*?data:')
+
+# A full-size image URL with its metadata
+ImageCandidate = namedtuple('ImageCandidate', ['url', 'width', 'height'])
+
+_json_decoder = json.JSONDecoder()
+
+
+def _is_image_entry(node):
+    """Check if a payload node is a [url, height, width] image entry."""
+    return (
+        len(node) == 3
+        and isinstance(node[0], str)
+        and type(node[1]) is int
+        and type(node[2]) is int
+        and node[0].startswith(('http://', 'https://'))
+    )
+
+
+def _walk_payload(payload):
+    """Yield the [url, height, width] entries of a decoded payload in document order."""
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if _is_image_entry(node):
+            yield node
+            continue
+        # Push children in reverse so they are visited in order
+        stack.extend(child for child in reversed(node) if isinstance(child, list))
+
+
+def _payload_entries(page_source, start, end):
+    """Return the image entries of the payload between `start` and the end of its script."""
+    try:
+        payload, _ = _json_decoder.raw_decode(page_source, start)
+    except ValueError:
+        # Not strict JSON: fall back to the precompiled pattern on this script only
+        return [
+            [decode_js_string(match.group(1)), int(match.group(2)), int(match.group(3))]
+            for match in FULL_SIZE_IMAGE_RE.finditer(page_source, start, end)
+        ]
+    if not isinstance(payload, list):
+        return []
+    return _walk_payload(payload)
+
+
+def _image_payloads(page_source):
+    """Yield the (start, end) span of every data callback payload with an image entry."""
+    for match in DATA_CALLBACK_RE.finditer(page_source):
+        start = match.end()
+        end = page_source.find('</script>', start)
+        end = len(page_source) if end == -1 else end
+        if FULL_SIZE_IMAGE_RE.search(page_source, start, end):
+            yield start, end
+
+
+def _result_keys(node):
+    """Return the thumbnail URL and ids of a result node, or None for other nodes.
+
+    A result holds its thumbnail and full-size entries side by side, e.g.
+    [0, "docid", [thumbnail, 180, 180], [url, height, width], ...].
+    """
+    thumbnail = full_size = None
+    ids = []
+    for child in node:
+        if isinstance(child, str):
+            # Empty strings are unset fields, not ids
+            if child:
+                ids.append(child)
+        elif isinstance(child, list) and _is_image_entry(child):
+            if child[0].startswith(THUMBNAIL_PREFIXES):
+                thumbnail = child[0]
+            else:
+                full_size = child[0]
+    if thumbnail and full_size:
+        return [thumbnail] + ids
+    return None
+
+
+def extract_image_candidates(page_source):
+    """Return the full-size images embedded in a results page, in page order.
+
+    Finds every AF_initDataCallback once and skips those whose script has no
+    image entry at all, which is most of them. The remaining payloads are
+    decoded as JSON and walked for [url, height, width] entries. Thumbnails
+    are skipped and each URL is returned once, as an ImageCandidate with its
+    width and height.
+    """
+    candidates = {}
+    for start, end in _image_payloads(page_source):
+        for url, height, width in _payload_entries(page_source, start, end):
+            if url in candidates or url.startswith(THUMBNAIL_PREFIXES):
+                continue
+            candidates[url] = ImageCandidate(url, width, height)
+    return list(candidates.values())
+
+
+def extract_full_size_urls(page_source):
+    """Return the full-size image URLs embedded in a results page, in page order."""
+    return [candidate.url for candidate in extract_image_candidates(page_source)]
+
+
+def extract_thumbnail_keys(page_source):
+    """Return the thumbnail URLs and result ids whose full-size URL is in the page data.
+
+    Thumbnails on the page carry the same thumbnail URL or result id (the
+    data-id of their container), which tells those covered by the page data
+    from those only a click can resolve.
+    """
+    keys = set()
+    for start, end in _image_payloads(page_source):
+        try:
+            payload, _ = _json_decoder.raw_decode(page_source, start)
+        except ValueError:
+            # Without the structure, at least the thumbnail URLs can be matched
+            keys.update(
+                decode_js_string(match.group(1)) for match in FULL_SIZE_IMAGE_RE.finditer(page_source, start, end)
+                if match.group(1).startswith(THUMBNAIL_PREFIXES)
+            )
+            continue
+        stack = [payload] if isinstance(payload, list) else []
+        while stack:
+            node = stack.pop()
+            result_keys = _result_keys(node)
+            if result_keys:
+                keys.update(result_keys)
+                continue
+            stack.extend(child for child in node if isinstance(child, list))
+    return keys
@@ -0,0 +1,113 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+def frontier_path(settings):
+    """Return the path of the URL frontier configured in the crawler settings."""
+    return settings.get('FRONTIER_PATH') or os.path.join(settings.get('IMAGES_STORE', 'yoga_dataset'), 'frontier.sqlite')
+
+
+class UrlFrontier:
+    """Persistent SQLite queue of candidate image URLs.
+
+    The harvest phase adds URLs with their pose and query metadata; the
+    download phase claims pending rows in batches and marks each one done
+    or failed. Rows claimed by a run that crashed are handed out again the
+    next time the frontier is opened for downloading.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            " id INTEGER PRIMARY KEY,"
+            " pose_name TEXT,"
+            " pose_name_hindi TEXT NOT NULL,"
+            " url TEXT NOT NULL,"
+            " image_id TEXT,"
+            " search_query TEXT,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " added REAL NOT NULL,"
+            " updated REAL NOT NULL,"
+            " UNIQUE (pose_name_hindi, url))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS frontier_status ON frontier (status, id)")
+        self.conn.commit()
+
+    def add(self, pose_name, pose_name_hindi, url, image_id='', search_query=None):
+        """Add a candidate URL; returns False if it is already in the frontier."""
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO frontier (pose_name, pose_name_hindi, url, image_id, search_query, added, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pose_name, pose_name_hindi, url, image_id, search_query, now, now)
+            )
+            self.conn.commit()
+        return cursor.rowcount > 0
+
+    def reset_in_progress(self):
+        """Return rows claimed by an interrupted run to the pending state."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE frontier SET status = 'pending', updated = ? WHERE status = 'in_progress'", (time.time(),)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def claim(self, batch_size=100):
+        """Mark a batch of pending rows as in progress and return them as dicts."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM frontier WHERE status = 'pending' ORDER BY id LIMIT ?", (batch_size,)
+            ).fetchall()
+            if rows:
+                self.conn.executemany(
+                    "UPDATE frontier SET status = 'in_progress', updated = ? WHERE id = ?",
+                    [(time.time(), row['id']) for row in rows]
+                )
+                self.conn.commit()
+        return [dict(row) for row in rows]
+
+    def mark_done(self, row_id):
+        """Mark a row as downloaded."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE frontier SET status = 'done', attempts = attempts + 1, error = NULL, updated = ? WHERE id = ?",
+                (time.time(), row_id)
+            )
+            self.conn.commit()
+
+    def mark_failed(self, row_id, error, max_attempts=3):
+        """Record a failed attempt; the row is retried until `max_attempts` is reached."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE frontier SET attempts = attempts + 1, error = ?, updated = ?,"
+                " status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END"
+                " WHERE id = ?",
+                (str(error), time.time(), max_attempts, row_id)
+            )
+            self.conn.commit()
+
+    def counts(self):
+        """Return the number of rows in each status."""
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM frontier GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self.conn.close()
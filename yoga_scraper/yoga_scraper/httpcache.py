@@ -0,0 +1,149 @@
+import os
+import time
+import zlib
+import pickle
+import logging
+import sqlite3
+from urllib.parse import urlparse
+from scrapy.extensions.httpcache import DummyPolicy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.project import data_path
+
+logger = logging.getLogger(__name__)
+
+
+class SearchPagesCachePolicy(DummyPolicy):
+    """Cache search result pages, never image bodies.
+
+    Only requests to the path of GOOGLE_SEARCH_URL are cached, and responses
+    with an image content type are refused even if a request slips through.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.search_path = urlparse(settings.get('GOOGLE_SEARCH_URL', 'https://www.google.com/search')).path
+
+    def should_cache_request(self, request):
+        if not super().should_cache_request(request):
+            return False
+        return urlparse_cached(request).path == self.search_path
+
+    def should_cache_response(self, response, request):
+        if not super().should_cache_response(response, request):
+            return False
+        content_type = response.headers.get('Content-Type', b'').decode('latin-1').lower()
+        return not content_type.startswith('image/')
+
+
+class SqliteCacheStorage:
+    """HTTP cache in a single SQLite file with compressed bodies and LRU eviction.
+
+    Unlike the filesystem storage, which writes a directory of files per
+    response, every response is one row with a zlib-compressed body. When the
+    stored bytes exceed HTTPCACHE_MAX_BYTES, the least recently used responses
+    are evicted.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES', 0)
+        self.compression_level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+        self.conn = None
+        self.total_bytes = 0
+        self.stats = None
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, f"{spider.name}.sqlite")
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " meta BLOB NOT NULL,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " raw_size INTEGER NOT NULL,"
+            " stored REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+        # Drop responses that expired since the last run
+        if self.expiration_secs > 0:
+            self.conn.execute("DELETE FROM responses WHERE stored < ?", (time.time() - self.expiration_secs,))
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        logger.debug(f"Using SQLite cache storage in {path} ({self.total_bytes / (1024 * 1024):.1f} MB)")
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+
+    def close_spider(self, spider):
+        stats = self.stats
+        stats.set_value('httpcache/bytes_stored', self.total_bytes, spider=spider)
+        hits = stats.get_value('httpcache/hit', 0, spider=spider)
+        misses = stats.get_value('httpcache/miss', 0, spider=spider)
+        if hits + misses:
+            logger.info(
+                f"HTTP cache: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit rate), "
+                f"{stats.get_value('httpcache/evictions', 0, spider=spider)} evictions, "
+                f"{self.total_bytes / (1024 * 1024):.1f} MB stored"
+            )
+        self.conn.close()
+
+    def retrieve_response(self, spider, request):
+        key = self._fingerprinter.fingerprint(request).hex()
+        row = self.conn.execute("SELECT meta, body, stored FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None  # not cached
+        meta, body, stored = row
+        if 0 < self.expiration_secs < time.time() - stored:
+            return None  # expired
+
+        # Mark the response as recently used
+        self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+
+        data = pickle.loads(meta)
+        headers = Headers(data['headers'])
+        body = zlib.decompress(body)
+        respcls = responsetypes.from_args(headers=headers, url=data['url'], body=body)
+        return respcls(url=data['url'], headers=headers, status=data['status'], body=body)
+
+    def store_response(self, spider, request, response):
+        key = self._fingerprinter.fingerprint(request).hex()
+        meta = pickle.dumps(
+            {'status': response.status, 'url': response.url, 'headers': dict(response.headers)}, protocol=4
+        )
+        body = zlib.compress(response.body, self.compression_level)
+        size = len(meta) + len(body)
+
+        previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, meta, body, size, raw_size, stored, accessed)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, meta, body, size, len(response.body), now, now)
+        )
+        self.total_bytes += size - (previous[0] if previous else 0)
+        self.stats.inc_value('httpcache/bytes_raw', len(response.body), spider=spider)
+        self.stats.inc_value('httpcache/bytes_compressed', len(body), spider=spider)
+
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self._evict(spider)
+        self.conn.commit()
+
+    def _evict(self, spider):
+        """Drop least recently used responses until the cache is 90% of its limit."""
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if self.total_bytes <= target:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_bytes -= size
+            evicted += 1
+        self.stats.inc_value('httpcache/evictions', evicted, spider=spider)
@@ -0,0 +1,161 @@
+import os
+import mmap
+import zlib
+import struct
+from .imagesniff import PNG_SIGNATURE, JPEG_STANDALONE_MARKERS
+
+# JPEG markers that may appear inside entropy-coded data: byte stuffing and restart markers
+JPEG_SCAN_MARKERS = {0x00, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+
+
+class CorruptImage(Exception):
+    """Raised when the container structure of an image file is broken."""
+
+
+def _check_jpeg(data, size):
+    """Walk the JPEG segments from SOI to EOI, skipping over entropy-coded scans."""
+    pos = 2
+    frame = False
+    while True:
+        if pos + 2 > size:
+            raise CorruptImage("JPEG truncated before EOI")
+        if data[pos] != 0xFF:
+            raise CorruptImage(f"JPEG marker expected at offset {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker == 0xD9:
+            if not frame:
+                raise CorruptImage("JPEG without a frame header")
+            return
+        if marker in JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+
+        if pos + 4 > size:
+            raise CorruptImage("JPEG truncated in a segment header")
+        length = struct.unpack_from('>H', data, pos + 2)[0]
+        if length < 2 or pos + 2 + length > size:
+            raise CorruptImage(f"JPEG segment 0x{marker:02X} at offset {pos} runs past the end of the file")
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            frame = True
+        pos += 2 + length
+
+        if marker == 0xDA:
+            # Entropy-coded data runs until the next marker that is not stuffing or a restart
+            while True:
+                pos = data.find(b'\xff', pos)
+                if pos == -1 or pos + 1 >= size:
+                    raise CorruptImage("JPEG truncated in scan data")
+                if data[pos + 1] not in JPEG_SCAN_MARKERS:
+                    break
+                pos += 2
+
+
+def _check_png(data, size):
+    """Check the length and CRC of every PNG chunk from IHDR to IEND."""
+    pos = len(PNG_SIGNATURE)
+    first = True
+    has_data = False
+    with memoryview(data) as view:
+        while True:
+            if pos + 12 > size:
+                raise CorruptImage("PNG truncated before IEND")
+            length, chunk_type = struct.unpack_from('>I4s', data, pos)
+            end = pos + 12 + length
+            if end > size:
+                raise CorruptImage(f"PNG chunk {chunk_type!r} at offset {pos} runs past the end of the file")
+            if first and chunk_type != b'IHDR':
+                raise CorruptImage("PNG does not start with IHDR")
+            first = False
+
+            crc = struct.unpack_from('>I', data, end - 4)[0]
+            if zlib.crc32(view[pos + 4:end - 4]) != crc:
+                raise CorruptImage(f"PNG chunk {chunk_type!r} at offset {pos} has a bad CRC")
+
+            if chunk_type == b'IDAT':
+                has_data = True
+            elif chunk_type == b'IEND':
+                if not has_data:
+                    raise CorruptImage("PNG without IDAT")
+                return
+            pos = end
+
+
+def _check_webp(data, size):
+    """Check that the RIFF size matches the file and the chunks tile it exactly."""
+    riff_end = 8 + struct.unpack_from('<I', data, 4)[0]
+    if riff_end > size:
+        raise CorruptImage(f"WebP RIFF size {riff_end} is larger than the file ({size} bytes)")
+
+    pos = 12
+    first = True
+    while pos < riff_end:
+        if pos + 8 > riff_end:
+            raise CorruptImage(f"WebP chunk header at offset {pos} runs past the RIFF end")
+        fourcc, length = struct.unpack_from('<4sI', data, pos)
+        if first and fourcc not in (b'VP8 ', b'VP8L', b'VP8X'):
+            raise CorruptImage(f"WebP starts with unknown chunk {fourcc!r}")
+        first = False
+        # Chunks are padded to an even size
+        pos += 8 + length + (length & 1)
+    if pos != riff_end:
+        raise CorruptImage("WebP chunk at the end runs past the RIFF end")
+    if first:
+        raise CorruptImage("WebP without chunks")
+
+
+def _check_gif(data, size):
+    """Check that a GIF ends with its trailer byte."""
+    if data[size - 1] != 0x3B:
+        raise CorruptImage("GIF truncated before its trailer")
+
+
+def _check_bmp(data, size):
+    """Check that the file is at least as large as the BMP header says."""
+    declared = struct.unpack_from('<I', data, 2)[0]
+    if declared > size:
+        raise CorruptImage(f"BMP declares {declared} bytes but the file has {size}")
+
+
+def _check_container(data, size):
+    """Dispatch on the signature of an image held in a buffer."""
+    if size < 16:
+        raise CorruptImage(f"file is too small to be an image ({size} bytes)")
+    if data[:2] == b'\xff\xd8':
+        _check_jpeg(data, size)
+    elif data[:8] == PNG_SIGNATURE:
+        _check_png(data, size)
+    elif data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        _check_webp(data, size)
+    elif data[:6] in (b'GIF87a', b'GIF89a'):
+        _check_gif(data, size)
+    elif data[:2] == b'BM':
+        _check_bmp(data, size)
+    else:
+        raise CorruptImage("unknown image signature")
+
+
+def check_image_structure(path):
+    """Check the container structure of an image file without decoding pixels.
+
+    The file is memory-mapped and walked: JPEG segments from SOI to EOI, PNG
+    chunk lengths and CRCs up to IEND, WebP RIFF and chunk sizes, the GIF
+    trailer and the BMP file size. Raises CorruptImage describing the first
+    problem found; returns the file size otherwise.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 16:
+            raise CorruptImage(f"file is too small to be an image ({size} bytes)")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            _check_container(data, size)
+    return size
+
+
+def check_image_data(data):
+    """Check the container structure of an image held in memory, e.g. read from an archive."""
+    _check_container(data, len(data))
+    return len(data)
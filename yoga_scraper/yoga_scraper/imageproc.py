@@ -0,0 +1,131 @@
+import hashlib
+from io import BytesIO
+from PIL import Image, ImageOps
+import numpy as np
+
+# Quality rules shared by the preprocessing script and the image pipeline
+MIN_SIZE = 100
+MAX_SIZE = 4000
+MIN_ASPECT_RATIO = 0.5
+MAX_ASPECT_RATIO = 2.0
+MIN_CHANNEL_STD = 10
+
+
+def check_image(img, min_size=MIN_SIZE, max_size=MAX_SIZE):
+    """Return the reason an image fails the quality rules, or None if it passes."""
+    # Check if the image is too small
+    if img.width < min_size or img.height < min_size:
+        return "too-small"
+
+    # Check if the image is too large
+    if img.width > max_size or img.height > max_size:
+        return "too-large"
+
+    # Check if the aspect ratio is too extreme
+    aspect_ratio = img.width / img.height
+    if aspect_ratio < MIN_ASPECT_RATIO or aspect_ratio > MAX_ASPECT_RATIO:
+        return "aspect-ratio"
+
+    # Check if the image is mostly a single color (likely a placeholder)
+    if img.mode == 'RGB':
+        img_array = np.asarray(img)
+        if all(np.std(img_array[:, :, channel]) < MIN_CHANNEL_STD for channel in range(3)):
+            return "single-color"
+
+    return None
+
+
+def to_rgb(img):
+    """Convert an image to RGB, flattening transparency onto white."""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGBA', img.size, (255, 255, 255))
+        background.paste(img, img)
+        return background.convert('RGB')
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def letterbox(img, target_size):
+    """Resize an image to fit `target_size` and center it on a white canvas."""
+    # Resize the image while maintaining aspect ratio
+    img = ImageOps.contain(img, target_size)
+
+    # Create a new image with the target size and paste the resized image in the center
+    new_img = Image.new('RGB', target_size, (255, 255, 255))
+    paste_x = (target_size[0] - img.width) // 2
+    paste_y = (target_size[1] - img.height) // 2
+    new_img.paste(img, (paste_x, paste_y))
+    return new_img
+
+
+def preprocess_image_bytes(body, target_size=(224, 224), quality=90,
+                           min_size=MIN_SIZE, max_size=MAX_SIZE):
+    """Validate and letterbox an encoded image in a single decode.
+
+    Returns a dict with `ok` and, for valid images, the JPEG bytes of the
+    full-size original and of the processed image. Meant to run in a worker
+    process, so it only takes and returns picklable values.
+    """
+    try:
+        with Image.open(BytesIO(body)) as img:
+            img.load()
+            source_format = img.format
+
+            # Judge the image in its own mode, like preprocess_images.py, so
+            # both accept the same images (the single-colour rule is RGB only)
+            reason = check_image(img, min_size=min_size, max_size=max_size)
+            if reason:
+                return {'ok': False, 'reason': reason}
+            rgb = img if img.mode == 'RGB' else to_rgb(img)
+
+            # Keep JPEG originals byte for byte, re-encode everything else
+            if source_format == 'JPEG' and img.mode == 'RGB':
+                original = body
+            else:
+                buf = BytesIO()
+                rgb.save(buf, 'JPEG')
+                original = buf.getvalue()
+
+            buf = BytesIO()
+            letterbox(rgb, target_size).save(buf, 'JPEG', quality=quality)
+            return {
+                'ok': True,
+                'original': original,
+                'processed': buf.getvalue(),
+                'checksum': hashlib.md5(original).hexdigest(),
+                'width': rgb.width,
+                'height': rgb.height,
+            }
+    except Exception as e:
+        return {'ok': False, 'reason': f"decode-error: {e}"}
+
+
+def convert_image_bytes(body, min_width=0, min_height=0, max_width=MAX_SIZE, max_height=MAX_SIZE):
+    """Validate and convert a downloaded image the way the image pipeline stores it.
+
+    Like Scrapy's ImagesPipeline, JPEG images are kept byte for byte and
+    everything else is flattened onto white and re-encoded as JPEG. Images
+    that do not decode or fall outside the size limits are rejected.
+    Returns a dict with `ok` and either the `reason` or the stored `image`
+    bytes with their MD5 `checksum`.
+    """
+    try:
+        with Image.open(BytesIO(body)) as img:
+            width, height = img.size
+            if width < min_width or height < min_height:
+                return {'ok': False, 'reason': 'too-small'}
+            if width > max_width or height > max_height:
+                return {'ok': False, 'reason': 'too-large'}
+            img.load()
+
+            if img.format == 'JPEG':
+                image = body
+            else:
+                buf = BytesIO()
+                to_rgb(img).save(buf, 'JPEG')
+                image = buf.getvalue()
+    except Exception as e:
+        return {'ok': False, 'reason': f"decode-error: {e}"}
+    return {'ok': True, 'image': image, 'checksum': hashlib.md5(image).hexdigest()}
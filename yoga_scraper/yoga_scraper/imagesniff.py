@@ -0,0 +1,99 @@
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# JPEG start-of-frame markers; C4 (DHT), C8 (JPG) and CC (DAC) share the range
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# JPEG markers that stand alone, without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+class UnknownImageFormat(Exception):
+    """Raised when the first bytes of a body do not start a known image format."""
+
+
+def _jpeg_size(head):
+    """Return (width, height) from the SOF segment of a JPEG, or None if it is not in `head` yet."""
+    pos = 2
+    while pos + 4 <= len(head):
+        if head[pos] != 0xFF:
+            raise UnknownImageFormat("corrupt JPEG marker")
+        marker = head[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+
+        length = struct.unpack('>H', head[pos + 2:pos + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 9 > len(head):
+                return None
+            height, width = struct.unpack('>HH', head[pos + 5:pos + 9])
+            return width, height
+        if marker == 0xD9:
+            raise UnknownImageFormat("JPEG ends before its frame header")
+        pos += 2 + length
+    return None
+
+
+def _webp_size(head):
+    """Return (width, height) from the first chunk of a WebP, or None if it is not in `head` yet."""
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        if len(head) < 30:
+            return None
+        if head[23:26] != b'\x9d\x01\x2a':
+            raise UnknownImageFormat("corrupt VP8 frame")
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        if len(head) < 25:
+            return None
+        bits = struct.unpack('<I', head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        if len(head) < 30:
+            return None
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return width, height
+    raise UnknownImageFormat(f"unknown WebP chunk {chunk!r}")
+
+
+def sniff_image_size(head):
+    """Return (format, width, height) parsed from the first bytes of an image.
+
+    Reads the JPEG SOF segment, the PNG IHDR chunk, the WebP VP8/VP8L/VP8X
+    header or the GIF screen descriptor. Returns None when `head` is too
+    short to tell yet and raises UnknownImageFormat for other data.
+    """
+    if len(head) < 12:
+        return None
+
+    if head[:2] == b'\xff\xd8':
+        size = _jpeg_size(head)
+        return ('JPEG',) + size if size else None
+
+    if head[:8] == PNG_SIGNATURE:
+        if len(head) < 24:
+            return None
+        if head[12:16] != b'IHDR':
+            raise UnknownImageFormat("PNG without IHDR")
+        width, height = struct.unpack('>II', head[16:24])
+        return 'PNG', width, height
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        if len(head) < 16:
+            return None
+        size = _webp_size(head)
+        return ('WEBP',) + size if size else None
+
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack('<HH', head[6:10])
+        return 'GIF', width, height
+
+    raise UnknownImageFormat("unknown image signature")
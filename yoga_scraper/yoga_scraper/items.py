@@ -5,4 +5,5 @@ class YogaPoseImage(scrapy.Item):
     images = scrapy.Field()
     pose_name = scrapy.Field()
     pose_name_hindi = scrapy.Field()
-    image_id = scrapy.Field() 
+    image_id = scrapy.Field()
+    search_query = scrapy.Field() 
@@ -1,11 +1,151 @@
 import os
 import hashlib
+import logging
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlparse
-from scrapy.pipelines.images import ImagesPipeline
-from scrapy.exceptions import DropItem
-from scrapy import Request
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
+from scrapy.pipelines.images import ImagesPipeline, ImageException
+from scrapy.exceptions import DropItem, StopDownload
+from scrapy.settings import Settings
+from scrapy import Request, signals
+from .content_index import ContentIndex
+from .frontier import UrlFrontier, frontier_path
+from .imageproc import preprocess_image_bytes, MIN_SIZE, MIN_ASPECT_RATIO, MAX_ASPECT_RATIO
+from .imagesniff import sniff_image_size, UnknownImageFormat
+
+logger = logging.getLogger(__name__)
+
+
+def deferred_from_future(future):
+    """Wrap a concurrent.futures Future in a Deferred fired on the reactor thread."""
+    dfd = Deferred()
+
+    def _done(future):
+        try:
+            result = future.result()
+        except Exception:
+            reactor.callFromThread(dfd.errback, Failure())
+        else:
+            reactor.callFromThread(dfd.callback, result)
+
+    future.add_done_callback(_done)
+    return dfd
+
+
+def file_extension(url):
+    """Return the file extension of an image URL, defaulting to .jpg."""
+    parsed_url = urlparse(url)
+    path = parsed_url.path
+    _, ext = os.path.splitext(path)
+    ext = ext.lower() or '.jpg'  # Default to .jpg if no extension
+
+    # Ensure extension starts with a dot
+    if not ext.startswith('.'):
+        ext = '.' + ext
+    return ext
+
+
+def image_file_path(url, pose_name_hindi, image_id=''):
+    """Return the store-relative path of an image named by its URL."""
+    # Create a directory structure based on pose name
+    directory = f"original/{pose_name_hindi}"
+
+    # Generate a unique filename
+    url_hash = hashlib.md5(url.encode()).hexdigest()
+
+    # Get file extension from URL
+    ext = file_extension(url)
+
+    # Create filename with pose name, image ID, and hash
+    if image_id:
+        filename = f"{pose_name_hindi}_{image_id}_{url_hash[:8]}{ext}"
+    else:
+        filename = f"{pose_name_hindi}_{url_hash[:8]}{ext}"
+
+    return os.path.join(directory, filename)
+
+
+def content_file_path(url, pose_name_hindi, digest):
+    """Return the store-relative path of an image named by the hash of its content."""
+    return os.path.join(f"original/{pose_name_hindi}", f"{pose_name_hindi}_{digest[:16]}{file_extension(url)}")
+
 
 class YogaImagesPipeline(ImagesPipeline):
+    def __init__(self, store_uri, download_func=None, settings=None):
+        super().__init__(store_uri, download_func=download_func, settings=settings)
+        if isinstance(settings, dict) or settings is None:
+            settings = Settings(settings)
+
+        # Store each distinct image body once, named by the hash of its content
+        self.content_addressed = settings.getbool('IMAGES_CONTENT_ADDRESSED', True)
+        self.content_index_path = settings.get('IMAGES_CONTENT_INDEX') or os.path.join(
+            store_uri, 'content_index.sqlite'
+        )
+        self.content_index = None
+
+        # Validate and letterbox images while they are in memory, in a process pool
+        self.inline_preprocess = settings.getbool('IMAGES_INLINE_PREPROCESS', False)
+        self.processed_store = settings.get('IMAGES_PROCESSED_STORE', 'processed_images')
+        self.processed_size = tuple(settings.getlist('IMAGES_PROCESSED_SIZE', [224, 224]))
+        self.processed_size = (int(self.processed_size[0]), int(self.processed_size[1]))
+        self.processed_quality = settings.getint('IMAGES_PROCESSED_QUALITY', 90)
+        self.max_width = settings.getint('IMAGES_MAX_WIDTH', 4000)
+        self.max_height = settings.getint('IMAGES_MAX_HEIGHT', 4000)
+        self.preprocess_workers = settings.getint('IMAGES_INLINE_WORKERS', 0) or max(1, multiprocessing.cpu_count() - 1)
+        self.preprocess_pool = None
+        if self.inline_preprocess:
+            # The letterboxed images replace the thumbnails
+            self.thumbs = {}
+
+        # Abort downloads that would be rejected, judging by the headers and the
+        # image dimensions parsed from the first bytes of the body
+        self.sniff_enabled = settings.getbool('IMAGES_SNIFF_ENABLED', True)
+        self.sniff_bytes = settings.getint('IMAGES_SNIFF_BYTES', 64 * 1024)
+        self.max_bytes = settings.getint('IMAGES_MAX_BYTES', 20 * 1024 * 1024)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipe = super().from_crawler(crawler)
+        if pipe.sniff_enabled:
+            crawler.signals.connect(pipe.headers_received, signal=signals.headers_received)
+            crawler.signals.connect(pipe.bytes_received, signal=signals.bytes_received)
+        return pipe
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        if self.content_addressed:
+            self.content_index = ContentIndex(self.content_index_path)
+        if self.inline_preprocess:
+            self.preprocess_pool = ProcessPoolExecutor(max_workers=self.preprocess_workers)
+
+    def close_spider(self, spider):
+        if self.preprocess_pool is not None:
+            self.preprocess_pool.shutdown(wait=True)
+            self.preprocess_pool = None
+
+        stats = spider.crawler.stats
+        aborted = stats.get_value('image_sniff/aborted', 0)
+        if aborted:
+            bytes_avoided = stats.get_value('image_sniff/bytes_avoided', 0)
+            logger.info(
+                f"Header sniffing aborted {aborted} image downloads "
+                f"({bytes_avoided / (1024 * 1024):.1f} MB not downloaded)"
+            )
+
+        if self.content_index is not None:
+            duplicates = stats.get_value('content_index/duplicates', 0)
+            bytes_saved = stats.get_value('content_index/bytes_saved', 0)
+            logger.info(
+                f"Content-addressed storage skipped {duplicates} duplicate images "
+                f"({bytes_saved / (1024 * 1024):.1f} MB saved)"
+            )
+            self.content_index.close()
+            self.content_index = None
+
     def get_media_requests(self, item, info):
         for image_url in item.get('image_urls', []):
             yield Request(
@@ -14,6 +154,7 @@ class YogaImagesPipeline(ImagesPipeline):
                     'pose_name': item['pose_name'],
                     'pose_name_hindi': item['pose_name_hindi'],
                     'image_id': item.get('image_id', ''),
+                    'sniff_image': self.sniff_enabled,
                 }
             )
 
@@ -21,35 +162,249 @@ class YogaImagesPipeline(ImagesPipeline):
         # Get metadata from request
         pose_name_hindi = request.meta.get('pose_name_hindi', 'unknown')
         image_id = request.meta.get('image_id', '')
-        
-        # Create a directory structure based on pose name
-        directory = f"original/{pose_name_hindi}"
-        
-        # Generate a unique filename
-        url = request.url
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        
-        # Get file extension from URL
-        parsed_url = urlparse(url)
-        path = parsed_url.path
-        _, ext = os.path.splitext(path)
-        ext = ext.lower() or '.jpg'  # Default to .jpg if no extension
-        
-        # Ensure extension starts with a dot
-        if not ext.startswith('.'):
-            ext = '.' + ext
-            
-        # Create filename with pose name, image ID, and hash
-        if image_id:
-            filename = f"{pose_name_hindi}_{image_id}_{url_hash[:8]}{ext}"
+
+        if self.content_index is not None:
+            # Name downloaded files by their content
+            if response is not None:
+                return self._content_file_path(request, response)
+
+            # Before downloading, point at the blob an earlier download produced
+            known_path = self.content_index.path_for_source(pose_name_hindi, request.url)
+            if known_path:
+                return known_path
+
+        return image_file_path(request.url, pose_name_hindi, image_id)
+
+    def thumb_path(self, request, thumb_id, response=None, info=None, *, item=None):
+        if self.content_index is not None and response is not None:
+            digest = self._content_digest(request, response)
+            return f"thumbs/{thumb_id}/{digest}.jpg"
+        return super().thumb_path(request, thumb_id, response=response, info=info, item=item)
+
+    def headers_received(self, headers, body_length, request, spider):
+        """Reject image downloads by their Content-Type and Content-Length."""
+        if not request.meta.get('sniff_image'):
+            return
+        state = request.meta['image_sniff'] = {
+            'length': body_length if isinstance(body_length, int) else None,
+            'received': 0,
+            'head': b'',
+            'done': False,
+        }
+
+        content_type = headers.get('Content-Type', b'').decode('latin-1').lower()
+        if content_type.startswith('text/'):
+            self._abort_download(request, spider, 'not-an-image')
+        if state['length'] is not None and state['length'] > self.max_bytes:
+            self._abort_download(request, spider, 'too-many-bytes')
+
+        # Compressed bodies cannot be sniffed while streaming
+        if headers.get('Content-Encoding'):
+            state['done'] = True
+
+    def bytes_received(self, data, request, spider):
+        """Reject image downloads by the dimensions in their first bytes."""
+        state = request.meta.get('image_sniff')
+        if state is None or state['done']:
+            return
+        state['received'] += len(data)
+        state['head'] += data[:self.sniff_bytes - len(state['head'])]
+
+        try:
+            result = sniff_image_size(state['head'])
+        except UnknownImageFormat:
+            # Leave formats we cannot parse to the decoder
+            result = None
+            state['done'] = True
+        if result is None:
+            if len(state['head']) >= self.sniff_bytes:
+                state['done'] = True
+            return
+
+        state['done'] = True
+        state['head'] = b''
+        _, width, height = result
+        reason = self._size_rejection(width, height)
+        if reason:
+            self._abort_download(request, spider, reason)
+
+    def _size_rejection(self, width, height):
+        """Return why an image of this size would be rejected, or None."""
+        if width < self.min_width or height < self.min_height:
+            return 'too-small'
+        if width > self.max_width or height > self.max_height:
+            return 'too-large'
+        if self.inline_preprocess:
+            if min(width, height) < MIN_SIZE:
+                return 'too-small'
+            if height and not MIN_ASPECT_RATIO <= width / height <= MAX_ASPECT_RATIO:
+                return 'aspect-ratio'
+        return None
+
+    def _abort_download(self, request, spider, reason):
+        """Stop a download and count the bytes it would have cost."""
+        state = request.meta['image_sniff']
+        state['rejected'] = reason
+        state['head'] = b''
+
+        stats = spider.crawler.stats
+        stats.inc_value('image_sniff/aborted', spider=spider)
+        stats.inc_value(f'image_sniff/aborted/{reason}', spider=spider)
+        if state['length'] is not None:
+            stats.inc_value('image_sniff/bytes_avoided', state['length'] - state['received'], spider=spider)
         else:
-            filename = f"{pose_name_hindi}_{url_hash[:8]}{ext}"
-            
-        return os.path.join(directory, filename)
+            stats.inc_value('image_sniff/aborted_unknown_length', spider=spider)
+        raise StopDownload(fail=False)
+
+    def media_downloaded(self, response, request, info, *, item=None):
+        # Downloads stopped by header sniffing carry no body
+        state = request.meta.get('image_sniff')
+        if state and state.get('rejected'):
+            raise ImageException(f"Image rejected while downloading: {state['rejected']}")
+
+        # Let the parent reject failed and empty downloads
+        if not self.inline_preprocess or response.status != 200 or not response.body:
+            return super().media_downloaded(response, request, info, item=item)
+
+        status = "cached" if "cached" in response.flags else "downloaded"
+        self.inc_stats(info.spider, status)
+
+        # Bodies that are already stored cost no preprocessing
+        if self.content_index is not None:
+            digest = self._content_digest(request, response)
+            existing = self.content_index.get_blob(digest)
+            if existing:
+                self._record_duplicate(response, request, info, digest)
+                return {"url": request.url, "path": existing[0], "checksum": existing[1], "status": status}
+
+        # Decode, validate and letterbox off the reactor thread
+        future = self.preprocess_pool.submit(
+            preprocess_image_bytes,
+            response.body,
+            target_size=self.processed_size,
+            quality=self.processed_quality,
+            min_size=max(MIN_SIZE, min(self.min_width, self.min_height)),
+            max_size=max(self.max_width, self.max_height),
+        )
+        dfd = deferred_from_future(future)
+        dfd.addCallback(self._store_preprocessed, response, request, info, status)
+        return dfd
+
+    def _store_preprocessed(self, result, response, request, info, status):
+        """Write a preprocessed image and its original, or reject it."""
+        stats = info.spider.crawler.stats
+        if not result['ok']:
+            # Junk images never touch the disk
+            stats.inc_value('inline_preprocess/rejected', spider=info.spider)
+            stats.inc_value(f"inline_preprocess/rejected/{result['reason'].split(':')[0]}", spider=info.spider)
+            raise ImageException(f"Image rejected: {result['reason']}")
+
+        # Store the full-size original
+        path = self.file_path(request, response=response, info=info)
+        self.store.persist_file(
+            path,
+            BytesIO(result['original']),
+            info,
+            meta={"width": result['width'], "height": result['height']},
+            headers={"Content-Type": "image/jpeg"},
+        )
+
+        # Store the processed image where the preprocessing pass would have put it
+        processed_path = os.path.join(self.processed_store, os.path.splitext(path)[0] + '.jpg')
+        os.makedirs(os.path.dirname(processed_path), exist_ok=True)
+        with open(processed_path, 'wb') as f:
+            f.write(result['processed'])
+        stats.inc_value('inline_preprocess/processed', spider=info.spider)
+
+        if self.content_index is not None:
+            digest = self._content_digest(request, response)
+            self.content_index.add_blob(digest, path, len(response.body), result['checksum'])
+            self.content_index.add_source(request.meta.get('pose_name_hindi', 'unknown'), request.url, digest)
+
+        return {"url": request.url, "path": path, "checksum": result['checksum'], "status": status}
+
+    def image_downloaded(self, response, request, info, *, item=None):
+        if self.content_index is None:
+            return super().image_downloaded(response, request, info, item=item)
+
+        pose_name_hindi = request.meta.get('pose_name_hindi', 'unknown')
+        digest = self._content_digest(request, response)
+
+        # The same bytes were already stored from another URL: just record the mapping
+        existing = self.content_index.get_blob(digest)
+        if existing:
+            self._record_duplicate(response, request, info, digest)
+            return existing[1]
+
+        # Store the new blob and index it
+        checksum = super().image_downloaded(response, request, info, item=item)
+        path = self._content_file_path(request, response)
+        self.content_index.add_blob(digest, path, len(response.body), checksum)
+        self.content_index.add_source(pose_name_hindi, request.url, digest)
+        return checksum
 
     def item_completed(self, results, item, info):
         image_paths = [x['path'] for ok, x in results if ok]
         if not image_paths:
             raise DropItem("Item contains no images")
         item['images'] = image_paths
-        return item 
+        return item
+
+    def _record_duplicate(self, response, request, info, digest):
+        """Map a (pose, url) to an already stored blob and count the bytes saved."""
+        self.content_index.add_source(request.meta.get('pose_name_hindi', 'unknown'), request.url, digest)
+        stats = info.spider.crawler.stats
+        stats.inc_value('content_index/duplicates', spider=info.spider)
+        stats.inc_value('content_index/bytes_saved', len(response.body), spider=info.spider)
+
+    def _content_digest(self, request, response):
+        """Return the SHA-1 of the downloaded body, computed once per request."""
+        if 'content_digest' not in request.meta:
+            request.meta['content_digest'] = hashlib.sha1(response.body).hexdigest()
+        return request.meta['content_digest']
+
+    def _content_file_path(self, request, response):
+        """Return the path of the blob holding a downloaded body."""
+        digest = self._content_digest(request, response)
+        existing = self.content_index.get_blob(digest)
+        if existing:
+            return existing[0]
+
+        pose_name_hindi = request.meta.get('pose_name_hindi', 'unknown')
+        return content_file_path(request.url, pose_name_hindi, digest)
+
+
+class FrontierPipeline:
+    """Write harvested image URLs to the persistent URL frontier.
+
+    Used in the harvest phase of a two-phase crawl, in place of the image
+    pipeline; the images are downloaded later by draining the frontier.
+    """
+
+    def __init__(self, frontier_path):
+        self.frontier_path = frontier_path
+        self.frontier = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(frontier_path(crawler.settings))
+
+    def open_spider(self, spider):
+        self.frontier = UrlFrontier(self.frontier_path)
+
+    def close_spider(self, spider):
+        counts = self.frontier.counts()
+        logger.info(f"URL frontier at {self.frontier_path}: {counts.get('pending', 0)} pending of {sum(counts.values())} URLs")
+        self.frontier.close()
+
+    def process_item(self, item, spider):
+        for image_url in item.get('image_urls', []):
+            added = self.frontier.add(
+                item['pose_name'],
+                item['pose_name_hindi'],
+                image_url,
+                image_id=item.get('image_id', ''),
+                search_query=item.get('search_query'),
+            )
+            spider.crawler.stats.inc_value('frontier/added' if added else 'frontier/already_queued', spider=spider)
+        return item
@@ -0,0 +1,135 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryYield:
+    """Pages fetched and new unique images found by one search query."""
+
+    def __init__(self, pose):
+        self.pose = pose
+        self.pages = 0
+        self.candidates = 0
+        self.new_images = 0
+        self.history = []
+        self.borrowed = 0
+        self.status = 'active'
+
+    @property
+    def yield_per_page(self):
+        """Average number of new unique images per page."""
+        return self.new_images / self.pages if self.pages else 0.0
+
+
+class QueryBudget:
+    """Page budget of the search queries of each pose, driven by their yield.
+
+    Every query may fetch `base_pages` pages. A query is retired once the new
+    unique images of its last `window` pages average below `min_new_images`,
+    and the pages it did not use go to a spare pool of its pose. Queries that
+    are still productive draw from that pool to page beyond their base
+    budget, up to `max_pages`.
+    """
+
+    def __init__(self, base_pages=5, max_pages=10, min_new_images=3, window=2):
+        self.base_pages = base_pages
+        self.max_pages = max_pages
+        self.min_new_images = min_new_images
+        self.window = window
+        self.queries = {}
+        self.spare_pages = {}
+
+    @classmethod
+    def from_settings(cls, settings, max_pages=10):
+        """Create a budget configured from the crawler settings."""
+        return cls(
+            base_pages=settings.getint('QUERY_BUDGET_PAGES', 5),
+            max_pages=settings.getint('QUERY_MAX_PAGES', max_pages),
+            min_new_images=settings.getfloat('QUERY_MIN_NEW_IMAGES', 3),
+            window=settings.getint('QUERY_YIELD_WINDOW', 2),
+        )
+
+    def add_query(self, pose, query):
+        """Register a query before its first page is requested."""
+        return self.queries.setdefault(query, QueryYield(pose))
+
+    def record_page(self, pose, query, candidates, new_images):
+        """Record the yield of one page and retire the query if it stopped paying off."""
+        entry = self.add_query(pose, query)
+        entry.pages += 1
+        entry.candidates += candidates
+        entry.new_images += new_images
+        entry.history.append(new_images)
+
+        recent = entry.history[-self.window:]
+        if entry.status == 'active' and sum(recent) / len(recent) < self.min_new_images:
+            self._stop(query, 'retired')
+
+    def should_continue(self, query):
+        """Decide whether the next page of a query is worth fetching."""
+        entry = self.queries[query]
+        if entry.status != 'active':
+            return False
+        if entry.pages >= self.max_pages:
+            self._stop(query, 'exhausted')
+            return False
+        if entry.pages < self.base_pages:
+            return True
+
+        # Beyond its own budget, a query lives on pages freed by other queries
+        if self.spare_pages.get(entry.pose, 0) > 0:
+            self.spare_pages[entry.pose] -= 1
+            entry.borrowed += 1
+            return True
+        self._stop(query, 'exhausted')
+        return False
+
+    def may_continue(self, query, page):
+        """Check whether a query may still fetch the page after `page`, without drawing on the spare pool.
+
+        Read-only counterpart of should_continue() for a page that is still
+        being fetched and not recorded yet.
+        """
+        entry = self.queries.get(query)
+        if entry is None or entry.status != 'active' or page >= self.max_pages:
+            return False
+        return page < self.base_pages or self.spare_pages.get(entry.pose, 0) > 0
+
+    def finish(self, query):
+        """Mark a query without further result pages as done."""
+        if self.queries[query].status == 'active':
+            self._stop(query, 'exhausted')
+
+    def next_query(self, pose, candidates):
+        """Return the first candidate query of a pose that has not been tried, or None."""
+        for query in candidates:
+            if query not in self.queries:
+                self.add_query(pose, query)
+                return query
+        return None
+
+    def _stop(self, query, status):
+        """Stop a query and free the unused part of its base budget."""
+        entry = self.queries[query]
+        entry.status = status
+        unused = max(0, self.base_pages - entry.pages)
+        self.spare_pages[entry.pose] = self.spare_pages.get(entry.pose, 0) + unused
+
+    def report(self, stats=None):
+        """Log the yield of every query and record totals in the crawl stats."""
+        retired = [entry for entry in self.queries.values() if entry.status == 'retired']
+        if stats is not None:
+            stats.set_value('query_budget/queries', len(self.queries))
+            stats.set_value('query_budget/retired', len(retired))
+            stats.set_value('query_budget/pages', sum(entry.pages for entry in self.queries.values()))
+            stats.set_value('query_budget/borrowed_pages', sum(entry.borrowed for entry in self.queries.values()))
+
+        if not self.queries:
+            return
+        logger.info("Yield per query (new unique images):")
+        for query, entry in sorted(self.queries.items(), key=lambda item: (item[1].pose, -item[1].new_images)):
+            logger.info(
+                f"  [{entry.status}] {query}: {entry.new_images} new of {entry.candidates} found "
+                f"in {entry.pages} pages ({entry.yield_per_page:.1f}/page"
+                f"{f', {entry.borrowed} borrowed pages' if entry.borrowed else ''})"
+            )
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+
+
+class PoseQuota:
+    """Per-pose image counts shared safely between crawler processes.
+
+    Replaces the `counts/<pose>.count` files, whose read-then-write updates
+    lose increments when several spiders run at once. Counts are reserved
+    atomically in SQLite, so parallel workers never push a pose past its
+    maximum. Count files left by earlier runs are imported on first use.
+    """
+
+    def __init__(self, path, counts_dir=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Wait for other processes holding the write lock instead of failing
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pose_counts (pose TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        self.conn.commit()
+
+        if counts_dir:
+            self._import_count_files(counts_dir)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Create a quota store configured from the crawler settings."""
+        images_store = settings.get('IMAGES_STORE', 'yoga_dataset')
+        path = settings.get('POSE_QUOTA_PATH') or os.path.join(images_store, 'pose_quota.sqlite')
+        return cls(path, counts_dir=os.path.join(images_store, 'counts'))
+
+    def _import_count_files(self, counts_dir):
+        """Import the counts written by earlier versions of the spider."""
+        if not os.path.isdir(counts_dir):
+            return
+        rows = []
+        for filename in os.listdir(counts_dir):
+            if not filename.endswith('.count'):
+                continue
+            try:
+                with open(os.path.join(counts_dir, filename), 'r') as f:
+                    rows.append((filename[:-len('.count')], int(f.read().strip())))
+            except (OSError, ValueError):
+                continue
+        with self._lock:
+            self.conn.executemany("INSERT OR IGNORE INTO pose_counts (pose, count) VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def get(self, pose):
+        """Return the number of images counted for a pose."""
+        with self._lock:
+            row = self.conn.execute("SELECT count FROM pose_counts WHERE pose = ?", (pose,)).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, pose, limit):
+        """Count one more image for a pose unless it already reached `limit`.
+
+        Returns True if the image was counted.
+        """
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO pose_counts (pose, count) VALUES (?, 0)", (pose,))
+            cursor = self.conn.execute(
+                "UPDATE pose_counts SET count = count + 1 WHERE pose = ? AND count < ?", (pose, limit)
+            )
+            self.conn.commit()
+        return cursor.rowcount > 0
+
+    def counts(self):
+        """Return the counts of all poses."""
+        with self._lock:
+            return dict(self.conn.execute("SELECT pose, count FROM pose_counts").fetchall())
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,99 @@
+import time
+import logging
+from scrapy.core.downloader.handlers.http import HTTPDownloadHandler
+from scrapy.http import HtmlResponse
+from .webdriver_pool import WebDriverPool
+
+logger = logging.getLogger(__name__)
+
+# Bytes the page transferred so far, from the Resource Timing entries of the
+# document and its subresources. Cross-origin resources without
+# Timing-Allow-Origin report 0, so this is a lower bound.
+PAGE_BYTES_JS = """
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+var bytes = 0;
+for (var i = 0; i < entries.length; i++) { bytes += entries[i].transferSize || 0; }
+return {bytes: bytes, requests: entries.length};
+"""
+
+
+class SeleniumDownloadHandler:
+    """HTTP(S) download handler that renders marked requests in a browser pool.
+
+    Requests with ``meta['selenium']`` are loaded by a pooled Chrome instead
+    of being fetched over HTTP, and the rendered DOM becomes their response.
+    Each result page is therefore fetched once, by the browser, while the
+    downloader still applies its per-slot delay and concurrency, and
+    HttpCacheMiddleware stores and replays rendered pages like any other
+    response. All other requests go to Scrapy's HTTPDownloadHandler.
+
+    After loading a page, the spider's ``render_page(driver, request)`` runs
+    in the same worker thread to interact with the page (scroll, click). It
+    may return the page source to use, e.g. captured before a click that
+    navigates away; otherwise the DOM is captured afterwards. The browser pool is started with the first
+    rendered request, so spiders that never render do not launch Chrome.
+    """
+
+    lazy = False
+
+    def __init__(self, settings, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self._http = HTTPDownloadHandler.from_crawler(crawler)
+        self.pool = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
+    def download_request(self, request, spider):
+        if not request.meta.get('selenium'):
+            return self._http.download_request(request, spider)
+
+        if self.pool is None:
+            self.pool = WebDriverPool.from_crawler(self.crawler)
+        dfd = self.pool.run(self._render, request, spider)
+        dfd.addCallback(self._build_response, request)
+        return dfd
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        return self._http.close()
+
+    def _render(self, driver, request, spider):
+        """Load and prepare a page in a WebDriverPool worker thread and return its DOM."""
+        load_start = time.time()
+        driver.get(request.url)
+        load_time = time.time() - load_start
+
+        page_source = None
+        render_page = getattr(spider, 'render_page', None)
+        if render_page is not None:
+            page_source = render_page(driver, request)
+
+        # Measure after the spider's interactions, so scrolls and clicks are included
+        page_stats = driver.execute_script(PAGE_BYTES_JS)
+        page_stats['load_time'] = load_time
+        return page_source or driver.page_source, page_stats
+
+    def _build_response(self, rendered, request):
+        """Wrap a rendered DOM in a response and record the cost of loading the page."""
+        html, page_stats = rendered
+        logger.debug(
+            f"Rendered {request.url} in {page_stats['load_time']:.2f}s, "
+            f"{page_stats['bytes'] / 1024:.0f} KB in {page_stats['requests']} requests"
+        )
+        self.stats.inc_value('selenium/pages_loaded')
+        self.stats.inc_value('selenium/page_load_time', page_stats['load_time'])
+        self.stats.inc_value('selenium/page_bytes', page_stats['bytes'])
+        self.stats.inc_value('selenium/page_requests', page_stats['requests'])
+
+        return HtmlResponse(
+            url=request.url,
+            status=200,
+            headers={'Content-Type': 'text/html; charset=utf-8'},
+            body=html.encode('utf-8'),
+            encoding='utf-8',
+            request=request,
+        )
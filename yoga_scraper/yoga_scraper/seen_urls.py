@@ -0,0 +1,238 @@
+import os
+import math
+import sqlite3
+import hashlib
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from scrapy import signals
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track where a visitor came from and never
+# change the image that is served
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    'ref', 'ref_src', 'referrer', 'source', 'spm', '_ga', '_gl',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """Return a canonical form of an image URL for duplicate detection."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+
+    # Drop default ports
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    # Drop tracking parameters and sort the rest so their order does not matter
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+
+    # The fragment is never sent to the server
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+def url_key(url):
+    """Return the compact 8-byte key stored for a URL."""
+    return hashlib.blake2b(normalize_url(url).encode('utf-8'), digest_size=8).digest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over byte keys."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        # Standard sizing: m = -n ln(p) / (ln 2)^2 bits, k = m/n ln 2 hashes
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        """Yield the bit positions of a key using double hashing."""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        """Add a key to the filter."""
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class ScalableBloomFilter:
+    """Bloom filter that grows by adding larger slices as it fills up.
+
+    Each new slice has twice the capacity and a tighter error rate than the
+    previous one, so the overall false positive rate stays bounded no matter
+    how many keys are added.
+    """
+
+    def __init__(self, initial_capacity=100000, error_rate=0.001, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+
+    def add(self, key):
+        """Add a key to the filter."""
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            capacity = self.initial_capacity * self.growth ** len(self.filters)
+            error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** len(self.filters)
+            self.filters.append(BloomFilter(capacity, error_rate))
+        self.filters[-1].add(key)
+
+    def __contains__(self, key):
+        return any(key in bloom for bloom in self.filters)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+
+class SeenUrlStore:
+    """Persistent set of image URLs seen across queries, poses and runs.
+
+    Lookups are answered from an in-memory scalable Bloom filter; only
+    possible hits are confirmed against the exact on-disk SQLite table, so
+    unseen URLs never touch the disk until the next batched flush.
+
+    A URL is first claimed, which keeps it from being yielded twice in the
+    same crawl, and only stored once its image was downloaded. Images that
+    time out, fail or are rejected are therefore tried again by later runs.
+
+    With `shared=True`, for spiders running in parallel processes, stored
+    URLs are written through to SQLite at once and claims are checked
+    against it, so the other processes see every downloaded URL.
+    """
+
+    def __init__(self, path, flush_every=500, shared=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.shared = shared
+        self.checked = 0
+        self.duplicates = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen_urls (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.conn.commit()
+
+        # Rebuild the Bloom filter from the keys stored by previous runs
+        self.bloom = ScalableBloomFilter()
+        for (key,) in self.conn.execute("SELECT key FROM seen_urls"):
+            self.bloom.add(key)
+        self.pending = set()
+        self.claimed = set()
+        logger.info(f"Loaded {len(self.bloom)} seen image URLs from {path}")
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Create a store configured from the crawler settings."""
+        path = settings.get('SEEN_URLS_PATH') or os.path.join(
+            settings.get('IMAGES_STORE', 'yoga_dataset'), 'seen_urls.sqlite'
+        )
+        return cls(
+            path,
+            flush_every=settings.getint('SEEN_URLS_FLUSH_EVERY', 500),
+            shared=settings.getbool('SEEN_URLS_SHARED', False),
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Create a store that stores the URLs of every item that made it through the pipelines."""
+        store = cls.from_settings(crawler.settings)
+        crawler.signals.connect(store.item_scraped, signal=signals.item_scraped)
+        return store
+
+    def claim(self, url):
+        """Claim a URL for this crawl and return True if it was neither stored nor claimed before."""
+        key = url_key(url)
+        self.checked += 1
+        if key in self.claimed or self._seen(key):
+            self.duplicates += 1
+            return False
+        self.claimed.add(key)
+        return True
+
+    def release(self, url):
+        """Give up the claim on a URL that was not yielded after all."""
+        self.claimed.discard(url_key(url))
+
+    def add(self, url):
+        """Store a URL as seen, e.g. once its image was downloaded."""
+        key = url_key(url)
+        self.claimed.discard(key)
+        self.bloom.add(key)
+        if self.shared:
+            self.conn.execute("INSERT OR IGNORE INTO seen_urls (key) VALUES (?)", (key,))
+            self.conn.commit()
+            return
+
+        self.pending.add(key)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def item_scraped(self, item, response, spider):
+        """Store the image URLs of an item the image pipeline downloaded."""
+        for url in item.get('image_urls', []):
+            self.add(url)
+
+    def _seen(self, key):
+        """Check whether a key was stored, by this or, when shared, another process."""
+        # Other processes may have stored the key since our filter was built
+        if self.shared:
+            return self._stored(key)
+        # A Bloom filter miss is definitive, a hit has to be confirmed
+        return key in self.bloom and (key in self.pending or self._stored(key))
+
+    def _stored(self, key):
+        """Check the exact on-disk set for a key."""
+        return self.conn.execute("SELECT 1 FROM seen_urls WHERE key = ?", (key,)).fetchone() is not None
+
+    def flush(self):
+        """Write pending keys to disk."""
+        if not self.pending:
+            return
+        self.conn.executemany("INSERT OR IGNORE INTO seen_urls (key) VALUES (?)", [(key,) for key in self.pending])
+        self.conn.commit()
+        self.pending.clear()
+
+    @property
+    def hit_rate(self):
+        """Fraction of checked URLs that were duplicates."""
+        return self.duplicates / self.checked if self.checked else 0.0
+
+    def report(self, stats):
+        """Log the duplicate hit rate and record it in the crawl stats."""
+        stats.set_value('seen_urls/checked', self.checked)
+        stats.set_value('seen_urls/duplicates', self.duplicates)
+        stats.set_value('seen_urls/not_downloaded', len(self.claimed))
+        logger.info(
+            f"Seen-URL filter: {self.duplicates} of {self.checked} image URLs were duplicates "
+            f"({self.hit_rate:.1%} hit rate), {len(self.claimed)} were not downloaded and stay unseen"
+        )
+
+    def close(self):
+        """Flush pending keys and close the database."""
+        self.flush()
+        self.conn.close()
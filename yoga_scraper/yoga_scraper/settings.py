@@ -6,16 +6,92 @@ NEWSPIDER_MODULE = "yoga_scraper.spiders"
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
 
-# Configure maximum concurrent requests
-CONCURRENT_REQUESTS = 16
+# Configure maximum concurrent requests; the limit per host is adapted by
+# DomainAdaptiveThrottleMiddleware
+CONCURRENT_REQUESTS = 32
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
 
 # Configure a delay for requests for the same website
 DOWNLOAD_DELAY = 1.5
 RANDOMIZE_DOWNLOAD_DELAY = True
 
+# Adapt concurrency and delay per domain from observed latency, errors and
+# 429s. Search result pages keep DOWNLOAD_DELAY; image hosts start without a
+# delay, get a short timeout and are blocklisted for a while if they keep failing.
+# The throttle sits above RetryMiddleware (550), so it sees every 429, 5xx and
+# connection error before the request is retried. The image timeout is set
+# below DownloadTimeoutMiddleware (350), which would otherwise set DOWNLOAD_TIMEOUT.
+DOWNLOADER_MIDDLEWARES = {
+    "yoga_scraper.throttle.DomainTimeoutMiddleware": 340,
+    "yoga_scraper.throttle.DomainAdaptiveThrottleMiddleware": 560,
+}
+DOMAIN_THROTTLE_ENABLED = True
+DOMAIN_THROTTLE_SEARCH_DOMAINS = ["google.com"]
+DOMAIN_THROTTLE_IMAGE_TIMEOUT = 20  # Seconds, instead of DOWNLOAD_TIMEOUT
+DOMAIN_THROTTLE_START_CONCURRENCY = 2  # Concurrency of a newly seen image host
+DOMAIN_THROTTLE_MAX_CONCURRENCY = 8  # Upper bound for fast image hosts
+DOMAIN_THROTTLE_MAX_DELAY = 30  # Upper bound on the delay of throttling hosts
+DOMAIN_THROTTLE_TARGET_LATENCY = 2.0  # Hosts answering faster than this get more concurrency
+DOMAIN_THROTTLE_BLOCK_AFTER = 5  # Consecutive failures before a host is blocklisted
+DOMAIN_THROTTLE_BLOCK_SECONDS = 600  # How long a failing host stays blocklisted
+
 # Disable cookies
 COOKIES_ENABLED = False
 
+# Search endpoint queried by both spiders; point it at mock_server.py to
+# benchmark or test the scraper offline
+GOOGLE_SEARCH_URL = "https://www.google.com/search"
+
+# Budget result pages by query yield: every query may fetch QUERY_BUDGET_PAGES
+# pages and is retired once its last QUERY_YIELD_WINDOW pages average fewer
+# than QUERY_MIN_NEW_IMAGES new unique images. Unused pages go to the pose's
+# productive queries, up to QUERY_MAX_PAGES (default: 10 for the Selenium
+# spider, 20 for the basic spider).
+QUERY_BUDGET_PAGES = 5
+QUERY_MIN_NEW_IMAGES = 3
+QUERY_YIELD_WINDOW = 2
+
+# Configure the pool of headless Chrome instances used by the Selenium spider
+SELENIUM_POOL_SIZE = 4  # Number of browsers rendering result pages in parallel
+SELENIUM_POOL_MAX_PAGES = 50  # Restart a browser after this many pages
+SELENIUM_POOL_MAX_MEMORY_MB = 1024  # Restart a browser when it grows beyond this
+
+# Start-up of the browsers: ChromeDriver binaries are cached per Chrome version
+# (default ~/.cache/yoga_scraper/chromedriver). Browsers either keep a
+# persistent profile per pool slot, or the pool attaches to warm browsers
+# started by warm_browsers.py, one "host:port" per slot.
+CHROMEDRIVER_CACHE_DIR = None
+SELENIUM_PROFILE_DIR = None  # e.g. "browser_profiles"
+SELENIUM_DEBUGGER_ADDRESSES = []  # e.g. ["127.0.0.1:9222", "127.0.0.1:9223"]
+
+# Lean browsing profile: eager page loads, no images, fonts, media or trackers
+SELENIUM_LEAN_PROFILE = True
+SELENIUM_BLOCKED_URLS = []  # Extra URL patterns to block, e.g. ["*.css"]
+
+# Configure adaptive scrolling of result pages
+SELENIUM_SCROLL_MAX = 10  # Maximum number of scrolls per page
+SELENIUM_SCROLL_QUIET_MS = 500  # A scroll is done once the page is quiet for this long
+SELENIUM_SCROLL_TIMEOUT_MS = 3000  # Upper bound on the wait after each scroll
+
+# How the Selenium spider extracts full-size image URLs:
+# "bulk" reads them from the embedded page data and only clicks thumbnails it
+# missed, "click" opens every thumbnail
+SELENIUM_EXTRACTION_MODE = "bulk"
+
+# Configure the persistent filter of image URLs seen by earlier queries and runs
+SEEN_URLS_ENABLED = True
+SEEN_URLS_PATH = None  # Default: <IMAGES_STORE>/seen_urls.sqlite
+SEEN_URLS_SHARED = False  # Write new URLs through at once; set by parallel_scraper.py
+
+# Per-pose image counts, shared safely by parallel crawler processes
+POSE_QUOTA_PATH = None  # Default: <IMAGES_STORE>/pose_quota.sqlite
+
+# Configure the persistent URL frontier used by the two-phase crawl
+# (main.py --harvest, then main.py --download)
+FRONTIER_PATH = None  # Default: <IMAGES_STORE>/frontier.sqlite
+FRONTIER_MAX_ATTEMPTS = 3  # Give up on a URL after this many failed downloads
+DOWNLOAD_MAX_FAILURE_RATE = 0.5  # The download phase fails when more downloads than this fail
+
 # Configure item pipelines
 ITEM_PIPELINES = {
     "yoga_scraper.pipelines.YogaImagesPipeline": 1,
@@ -25,12 +101,26 @@ ITEM_PIPELINES = {
 IMAGES_STORE = "yoga_dataset"
 IMAGES_EXPIRES = 90  # 90 days of delay for image expiration
 
+# Store each distinct image body once, named by the hash of its content, and
+# map every (pose, url) that produced it to that file in a small SQLite index
+IMAGES_CONTENT_ADDRESSED = True
+IMAGES_CONTENT_INDEX = None  # Default: <IMAGES_STORE>/content_index.sqlite
+
 # Configure the size and quality of downloaded images
 IMAGES_THUMBS = {
     "small": (50, 50),
     "medium": (224, 224),
 }
 
+# Validate and letterbox images inside the image pipeline while they are still
+# in memory, instead of generating thumbnails and running a separate
+# preprocessing pass. Rejected images are never written to disk.
+IMAGES_INLINE_PREPROCESS = False
+IMAGES_PROCESSED_STORE = "processed_images"
+IMAGES_PROCESSED_SIZE = [224, 224]
+IMAGES_PROCESSED_QUALITY = 90
+IMAGES_INLINE_WORKERS = 0  # 0 uses one process per CPU core minus one
+
 # Configure the minimum width and height for downloaded images
 IMAGES_MIN_WIDTH = 100
 IMAGES_MIN_HEIGHT = 100
@@ -39,6 +129,13 @@ IMAGES_MIN_HEIGHT = 100
 IMAGES_MAX_WIDTH = 4000
 IMAGES_MAX_HEIGHT = 4000
 
+# Abort image downloads that would be rejected as soon as the headers or the
+# dimensions in the first bytes of the body (JPEG SOF, PNG IHDR, WebP VP8
+# headers) show it, and count the bytes avoided
+IMAGES_SNIFF_ENABLED = True
+IMAGES_SNIFF_BYTES = 64 * 1024  # Give up sniffing after this many bytes
+IMAGES_MAX_BYTES = 20 * 1024 * 1024  # Reject larger Content-Length
+
 # Configure user agent
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
 
@@ -48,9 +145,19 @@ HTTPCACHE_EXPIRATION_SECS = 86400  # 1 day
 HTTPCACHE_DIR = "httpcache"
 HTTPCACHE_IGNORE_HTTP_CODES = [503, 504, 505, 500, 400, 401, 402, 403, 404]
 
+# Cache only search result pages, compressed in one SQLite file per spider,
+# evicting the least recently used pages beyond HTTPCACHE_MAX_BYTES
+HTTPCACHE_STORAGE = "yoga_scraper.httpcache.SqliteCacheStorage"
+HTTPCACHE_POLICY = "yoga_scraper.httpcache.SearchPagesCachePolicy"
+HTTPCACHE_MAX_BYTES = 256 * 1024 * 1024  # 0 disables eviction
+HTTPCACHE_COMPRESSION_LEVEL = 6
+
 # Configure logging
 LOG_LEVEL = "INFO"
 
+# File the crawl stats are written to after run_scraper finishes
+SCRAPY_STATS_FILE = "scrapy_stats.json"
+
 # Configure download timeout
 DOWNLOAD_TIMEOUT = 180  # 3 minutes
 
@@ -59,10 +166,12 @@ RETRY_ENABLED = True
 RETRY_TIMES = 5
 RETRY_HTTP_CODES = [500, 502, 503, 504, 408, 429]
 
-# Configure download handlers
+# Configure download handlers: requests with meta["selenium"] are rendered by
+# the browser pool, so each result page is fetched once and can be cached;
+# all others go to Scrapy's HTTPDownloadHandler
 DOWNLOAD_HANDLERS = {
-    "http": "scrapy.core.downloader.handlers.http.HTTPDownloadHandler",
-    "https": "scrapy.core.downloader.handlers.http.HTTPDownloadHandler",
+    "http": "yoga_scraper.rendering.SeleniumDownloadHandler",
+    "https": "yoga_scraper.rendering.SeleniumDownloadHandler",
 }
 
 # Configure request headers
@@ -0,0 +1,300 @@
+import os
+import re
+import zlib
+import struct
+import tarfile
+import zipfile
+import logging
+from collections import namedtuple
+from .batch_loader import REFERENCE_DIR, pose_of
+
+logger = logging.getLogger(__name__)
+
+# Raw scrapes keep every format the spiders download
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+# Members closer than this in an archive are read together in one request
+MAX_READ_GAP = 1024 * 1024
+
+ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+ZIP_LOCAL_HEADER_SIZE = 30
+
+# Top-level directories of the image store itself, never taken for the archive root
+STORE_DIRS = ('original', 'thumbs')
+
+# Windows drive prefix of an absolute member name, e.g. C: or C:/
+DRIVE_RE = re.compile(r'^[A-Za-z]:')
+
+# An image of a source. `path` is relative to the directory or archive root.
+# `offset` and `end` delimit the member's record in the archive (the local
+# header and data of a zip member, the data of a tar member), `size` is its
+# stored size and `compression` its zip compression method. Files of a
+# directory and members of compressed tarballs have no offsets.
+SourceMember = namedtuple('SourceMember', ['pose', 'name', 'path', 'offset', 'end', 'size', 'compression'])
+
+
+def source_kind(source):
+    """Return 'dir', 'zip', 'tar' (readable at member offsets) or 'tar-stream' (compressed) for a source path."""
+    if os.path.isdir(source):
+        return 'dir'
+    if zipfile.is_zipfile(source):
+        return 'zip'
+    if tarfile.is_tarfile(source):
+        try:
+            with tarfile.open(source, 'r:'):
+                return 'tar'
+        except tarfile.ReadError:
+            return 'tar-stream'
+    raise ValueError(f"{source} is not a directory, zip or tar archive")
+
+
+def _zip_name(info):
+    """Return the name of a zip member, decoding UTF-8 names of archivers that do not flag them."""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('utf-8')
+    except UnicodeError:
+        return info.filename
+
+
+def _is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def _clean_path(name):
+    """Return an archive member name as a clean relative path, or None if it is unsafe.
+
+    Absolute names and names with a '..' component would be written outside
+    the output directory, like the paths zipfile.extract() and tarfile's
+    data filter refuse.
+    """
+    name = name.replace('\\', '/')
+    if name.startswith('/') or DRIVE_RE.match(name):
+        return None
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return '/'.join(parts)
+
+
+def _member(path, root='', offset=None, end=None, size=None, compression=None):
+    """Describe an image of a source from its path, relative to `root`.
+
+    Returns None for paths that are unsafe or outside `root`.
+    """
+    clean = _clean_path(path.replace(os.sep, '/'))
+    if clean is None:
+        logger.warning(f"Skipping archive member with an unsafe path: {path!r}")
+        return None
+    if root:
+        if not clean.startswith(root):
+            return None
+        clean = clean[len(root):]
+    return SourceMember(pose_of('.', clean), os.path.basename(clean), clean, offset, end, size, compression)
+
+
+def _archive_entries(source, kind):
+    """Yield (name, offset, end, size, compression) for the images of a zip or tar, in storage order."""
+    if kind == 'zip':
+        with zipfile.ZipFile(source) as zip_file:
+            infos = sorted(zip_file.infolist(), key=lambda info: info.header_offset)
+            # A record runs until the next one, which covers any data descriptor
+            ends = [info.header_offset for info in infos[1:]] + [zip_file.start_dir]
+            for info, end in zip(infos, ends):
+                if not info.is_dir() and _is_image(info.filename):
+                    yield _zip_name(info), info.header_offset, end, info.compress_size, info.compress_type
+    else:
+        mode = 'r:' if kind == 'tar' else 'r|*'
+        with tarfile.open(source, mode) as tar_file:
+            for info in tar_file:
+                if info.isfile() and _is_image(info.name):
+                    if kind == 'tar':
+                        yield info.name, info.offset_data, info.offset_data + info.size, info.size, None
+                    else:
+                        yield info.name, None, None, info.size, None
+
+
+def archive_root(source):
+    """Return the top-level directory shared by all images of an archive, or ''.
+
+    An archive made with `tar czf scrape.tgz yoga_dataset` or
+    `zip -r scrape.zip yoga_dataset` keeps the dataset directory in every
+    member path. Stripping it gives the paths of a run on the directory.
+    Members stored as ./<path> (`tar -C yoga_dataset -czf scrape.tgz .`)
+    are already relative to the dataset directory, and so are archives of
+    the store's own directories (original/, thumbs/) or of a single pose,
+    where stripping the directory would take the images out of their pose
+    directory. Compressed tarballs are decompressed once to find the root.
+    """
+    kind = source_kind(source)
+    if kind == 'dir':
+        return ''
+    top = None
+    for name, *_ in _archive_entries(source, kind):
+        if name.startswith('./'):
+            return ''
+        clean = _clean_path(name)
+        if clean is None:
+            continue
+        parts = clean.split('/')
+        if (len(parts) < 3 or parts[0] in STORE_DIRS or parts[1:-1] == [REFERENCE_DIR]
+                or (top is not None and parts[0] != top)):
+            return ''
+        top = parts[0]
+    return f"{top}/" if top else ''
+
+
+def _resolve_root(source, root):
+    """Return the prefix stripped from member paths: detected when `root` is None."""
+    if root is None:
+        return archive_root(source)
+    if not root.strip('/.'):
+        return ''
+    clean = _clean_path(root)
+    if clean is None:
+        raise ValueError(f"archive root {root!r} must be a relative path without '..'")
+    return f"{clean}/"
+
+
+def list_members(source, root=None):
+    """Yield the images of a directory, zip or tar in storage order, without reading their data.
+
+    Member paths are relative to `root`, a directory inside the archive;
+    by default the directory shared by all images (see archive_root()).
+    Members with absolute paths, '..' components or outside `root` are
+    skipped. Compressed tarballs have to be decompressed to be listed;
+    prefer iter_batches() for them, which reads the data in the same pass.
+    """
+    kind = source_kind(source)
+    if kind == 'dir':
+        for dirpath, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if _is_image(filename):
+                    yield _member(os.path.relpath(os.path.join(dirpath, filename), source))
+        return
+
+    root = _resolve_root(source, root)
+    for name, offset, end, size, compression in _archive_entries(source, kind):
+        member = _member(name, root, offset, end, size, compression)
+        if member is not None:
+            yield member
+
+
+def iter_batches(source, batch_size=64, select=None, root=None):
+    """Yield lists of (member, data) pairs for the images of a source, in storage order.
+
+    `data` is None where workers can read the member themselves with
+    read_batch(), which turns a batch of neighbouring members into one
+    sequential read. Compressed tarballs cannot be read at an offset, so
+    their data is read here, in a single pass over the stream. `select`
+    filters the members, e.g. to those of one shard. `root` is passed to
+    list_members().
+    """
+    batch = []
+    if source_kind(source) == 'tar-stream':
+        root = _resolve_root(source, root)
+        with tarfile.open(source, 'r|*') as tar_file:
+            for info in tar_file:
+                if not (info.isfile() and _is_image(info.name)):
+                    continue
+                member = _member(info.name, root, size=info.size)
+                if member is None or (select and not select(member)):
+                    continue
+                batch.append((member, tar_file.extractfile(info).read()))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    else:
+        for member in list_members(source, root):
+            if select and not select(member):
+                continue
+            batch.append((member, None))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _zip_member_data(member, record, open_zip):
+    """Extract the data of a zip member from its local header and data."""
+    if record[:4] != ZIP_LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"bad local header for {member.path}")
+    name_length, extra_length = struct.unpack_from('<HH', record, 26)
+    start = ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+    data = record[start:start + member.size]
+    if len(data) != member.size:
+        raise zipfile.BadZipFile(f"{member.path} is truncated")
+    if member.compression == zipfile.ZIP_STORED:
+        return bytes(data)
+    if member.compression == zipfile.ZIP_DEFLATED:
+        return zlib.decompress(data, -15)
+    # Rarer methods (bzip2, lzma) go through zipfile
+    zip_file = open_zip()
+    return zip_file.read(next(info for info in zip_file.infolist() if info.header_offset == member.offset))
+
+
+def read_batch(source, batch):
+    """Read the data of a batch from iter_batches() and return (member, data, error) triples.
+
+    Archive members close to each other are fetched with one seek and read,
+    so a worker reads its batch sequentially. A member that cannot be read
+    gets None data and the reason as `error`, the rest of the batch is kept.
+    """
+    results = []
+    pending = [member for member, data in batch if data is None]
+    records = {}
+    if pending and pending[0].offset is not None:
+        with open(source, 'rb') as f:
+            run = [pending[0]]
+            for member in pending[1:] + [None]:
+                if member is not None and member.offset - run[-1].end <= MAX_READ_GAP:
+                    run.append(member)
+                    continue
+                start = run[0].offset
+                f.seek(start)
+                span = memoryview(f.read(run[-1].end - start))
+                for run_member in run:
+                    records[run_member.path] = span[run_member.offset - start:run_member.end - start]
+                run = [member]
+
+    zip_file = None
+
+    def open_zip():
+        nonlocal zip_file
+        if zip_file is None:
+            zip_file = zipfile.ZipFile(source)
+        return zip_file
+
+    try:
+        for member, data in batch:
+            try:
+                if data is None:
+                    if member.offset is None:
+                        with open(os.path.join(source, member.path), 'rb') as f:
+                            data = f.read()
+                    elif member.compression is not None:
+                        data = _zip_member_data(member, records[member.path], open_zip)
+                    else:
+                        data = bytes(records[member.path])
+                        if len(data) != member.size:
+                            raise tarfile.ReadError(f"{member.path} is truncated")
+                results.append((member, data, None))
+            except Exception as e:
+                results.append((member, None, f"{type(e).__name__}: {e}"))
+    finally:
+        if zip_file is not None:
+            zip_file.close()
+    return results
+
+
+def iter_images(source, batch_size=64, root=None):
+    """Yield (pose, name, data) for every image of a directory, zip or tar, read sequentially."""
+    for batch in iter_batches(source, batch_size, root=root):
+        for member, data, error in read_batch(source, batch):
+            if error:
+                logger.warning(f"Could not read {member.path} from {source}: {error}")
+                continue
+            yield member.pose, member.name, data
@@ -1,24 +1,64 @@
 import scrapy
 import json
-import re
+import html
 import time
-import logging
-import os
-from urllib.parse import urlencode, quote_plus
-from scrapy.http import Request
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from urllib.parse import urlencode, urlparse
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
-try:
-    from webdriver_manager.chrome import ChromeDriverManager
-    WEBDRIVER_MANAGER_AVAILABLE = True
-except Exception:
-    WEBDRIVER_MANAGER_AVAILABLE = False
 from ..items import YogaPoseImage
+from ..extractors import extract_full_size_urls, extract_thumbnail_keys
+from ..seen_urls import SeenUrlStore
+from ..quota import PoseQuota
+from ..query_budget import QueryBudget
+
+# Scroll to the bottom of the results and wait until the page settles: no DOM
+# mutations and no new network resources for `quietMs`, or `timeoutMs` elapsed.
+SCROLL_AND_SETTLE_JS = """
+var callback = arguments[arguments.length - 1];
+var quietMs = arguments[0], timeoutMs = arguments[1];
+var start = Date.now(), lastChange = start;
+var resources = performance.getEntriesByType('resource').length;
+var observer = new MutationObserver(function() { lastChange = Date.now(); });
+observer.observe(document.body, {childList: true, subtree: true, attributes: true});
+window.scrollTo(0, document.body.scrollHeight);
+(function check() {
+    var now = Date.now();
+    var count = performance.getEntriesByType('resource').length;
+    if (count !== resources) { resources = count; lastChange = now; }
+    if (now - lastChange >= quietMs || now - start >= timeoutMs) {
+        observer.disconnect();
+        callback({
+            height: document.body.scrollHeight,
+            thumbnails: document.querySelectorAll('img.rg_i').length
+        });
+    } else {
+        setTimeout(check, 50);
+    }
+})();
+"""
+
+# Leave what render_page found in the browser on the root element, where it
+# survives in the captured DOM (and in the HTTP cache) for parse_results
+MARK_RENDERED_PAGE_JS = """
+var root = document.documentElement;
+root.setAttribute('data-clicked-urls', arguments[0]);
+root.setAttribute('data-scroll-stats', arguments[1]);
+"""
+
+# Every thumbnail with the keys it shares with the page data: its thumbnail URL
+# and the result id on its container
+THUMBNAILS_JS = """
+return Array.prototype.map.call(document.querySelectorAll('img.rg_i'), function(img) {
+    var holder = img.closest('[data-id], [data-tbnid]');
+    return [
+        img,
+        img.getAttribute('src') || img.getAttribute('data-src') || '',
+        holder ? holder.getAttribute('data-id') || holder.getAttribute('data-tbnid') || '' : ''
+    ];
+});
+"""
 
 class SeleniumYogaPoseSpider(scrapy.Spider):
     name = "selenium_yoga_poses"
@@ -46,70 +86,85 @@ class SeleniumYogaPoseSpider(scrapy.Spider):
     # Minimum number of images to download per pose
     min_images_per_pose = 200
     
-    def __init__(self, *args, **kwargs):
-        super(SeleniumYogaPoseSpider, self).__init__(*args, **kwargs)
-        # Initialize Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        
-        # Set user agent
-        chrome_options.add_argument(f"user-agent={self.settings.get('USER_AGENT')}")
-        
-        # Initialize Chrome driver
-        try:
-            if WEBDRIVER_MANAGER_AVAILABLE:
-                # Try using webdriver_manager with explicit version
-                self.driver = webdriver.Chrome(
-                    ChromeDriverManager(version="114.0.5735.90").install(),
-                    options=chrome_options
-                )
-            else:
-                # Fallback to direct ChromeDriver path
-                # Try to find ChromeDriver in common locations
-                chromedriver_paths = [
-                    "./chromedriver.exe",  # Current directory
-                    "./chromedriver",
-                    "chromedriver.exe",
-                    "chromedriver",
-                ]
-                
-                # Check if CHROMEDRIVER_PATH environment variable is set
-                if "CHROMEDRIVER_PATH" in os.environ:
-                    chromedriver_paths.insert(0, os.environ["CHROMEDRIVER_PATH"])
-                
-                # Try each path
-                for path in chromedriver_paths:
-                    if os.path.exists(path):
-                        self.logger.info(f"Using ChromeDriver at: {path}")
-                        service = Service(executable_path=path)
-                        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                        break
-                else:
-                    # If no ChromeDriver found, try without specifying path (system PATH)
-                    self.logger.warning("ChromeDriver not found in common locations. Trying system PATH.")
-                    self.driver = webdriver.Chrome(options=chrome_options)
-        except Exception as e:
-            self.logger.error(f"Error initializing Chrome driver: {e}")
-            self.logger.info("Please download ChromeDriver manually from https://chromedriver.chromium.org/downloads")
-            self.logger.info("and place it in the project directory or add it to your system PATH.")
-            raise
-        
-        # Create a directory to store pose counts
-        self.counts_dir = os.path.join(self.settings.get('IMAGES_STORE', 'yoga_dataset'), 'counts')
-        os.makedirs(self.counts_dir, exist_ok=True)
+    # Maximum number of result pages per query
+    max_pages_per_query = 10
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(SeleniumYogaPoseSpider, cls).from_crawler(crawler, *args, **kwargs)
+        
+        # Search result pages, possibly served by a local stand-in (mock_server.py)
+        spider.search_url = crawler.settings.get('GOOGLE_SEARCH_URL', 'https://www.google.com/search')
+        search_host = urlparse(spider.search_url).hostname
+        if search_host and not any(search_host == domain or search_host.endswith('.' + domain)
+                                   for domain in spider.allowed_domains):
+            spider.allowed_domains = spider.allowed_domains + [search_host]
+        
+        # Per-pose image counts, shared with spiders running in other processes
+        spider.quota = PoseQuota.from_settings(crawler.settings)
+        
+        # Page budget of the search queries, driven by their yield
+        spider.query_budget = QueryBudget.from_settings(crawler.settings, max_pages=spider.max_pages_per_query)
+        
+        # Image URLs already seen by earlier queries, poses and runs
+        spider.seen_urls = None
+        if crawler.settings.getbool('SEEN_URLS_ENABLED', True):
+            spider.seen_urls = SeenUrlStore.from_crawler(crawler)
+        return spider
     
     def closed(self, reason):
-        """Close the Selenium driver when the spider is closed."""
-        if hasattr(self, 'driver'):
-            self.driver.quit()
+        """Report the crawl statistics of the spider when it is closed."""
+        # Report the time saved by adaptive scrolling
+        stats = self.crawler.stats
+        pages = stats.get_value('selenium/scroll_pages', 0)
+        if pages:
+            saved = stats.get_value('selenium/scroll_time_saved', 0)
+            self.logger.info(f"Adaptive scrolling saved {saved:.1f}s over {pages} pages ({saved / pages:.2f}s per page)")
+        
+        # Report the cost of loading result pages, to compare browsing profiles
+        loaded = stats.get_value('selenium/pages_loaded', 0)
+        if loaded:
+            load_time = stats.get_value('selenium/page_load_time', 0)
+            page_bytes = stats.get_value('selenium/page_bytes', 0)
+            self.logger.info(
+                f"Loaded {loaded} result pages in {load_time / loaded:.2f}s and "
+                f"{page_bytes / loaded / 1024:.0f} KB per page on average"
+            )
+        
+        # Report the yield of every search query
+        self.query_budget.report(stats)
+        
+        # Report how many image URLs were duplicates of ones seen before
+        if getattr(self, 'seen_urls', None) is not None:
+            self.seen_urls.report(stats)
+            self.seen_urls.close()
+        
+        if hasattr(self, 'quota'):
+            self.quota.close()
     
     def start_requests(self):
         """Generate initial requests for each yoga pose."""
-        for pose_name, pose_name_hindi in self.yoga_poses.items():
+        # Work units of this spider: all poses, or its shard of poses or queries
+        shard_index = int(getattr(self, 'shard_index', 0))
+        shard_count = int(getattr(self, 'shard_count', 1))
+        shard_by = getattr(self, 'shard_by', 'pose')
+        poses = getattr(self, 'poses', None)
+        if isinstance(poses, str):
+            poses = [pose.strip() for pose in poses.split(',') if pose.strip()]
+        
+        # Poses furthest from their minimum are queued first and keep the highest priority
+        ordered_poses = sorted(
+            enumerate(self.yoga_poses.items()),
+            key=lambda entry: self._pose_deficit(entry[1][1]),
+            reverse=True,
+        )
+        
+        for pose_index, (pose_name, pose_name_hindi) in ordered_poses:
+            if poses and pose_name not in poses and pose_name_hindi not in poses:
+                continue
+            if shard_by == 'pose' and pose_index % shard_count != shard_index:
+                continue
+            
             # Check if we already have enough images for this pose
             if self._get_pose_image_count(pose_name_hindi) >= self.min_images_per_pose:
                 self.logger.info(f"Already have enough images for {pose_name}. Skipping.")
@@ -124,7 +179,13 @@ class SeleniumYogaPoseSpider(scrapy.Spider):
                 f"{pose_name} yoga practice",
             ]
             
-            for query in search_queries:
+            for query_index, query in enumerate(search_queries):
+                # When sharding by query, every worker takes every Nth query
+                unit = pose_index * len(search_queries) + query_index
+                if shard_by == 'query' and unit % shard_count != shard_index:
+                    continue
+                self.query_budget.add_query(pose_name_hindi, query)
+                
                 # Encode the search query
                 params = {
                     'q': query,
@@ -134,7 +195,7 @@ class SeleniumYogaPoseSpider(scrapy.Spider):
                     'tbs': 'isz:m', # Medium sized images
                 }
                 
-                url = f"https://www.google.com/search?{urlencode(params)}"
+                url = f"{self.search_url}?{urlencode(params)}"
                 
                 yield scrapy.Request(
                     url=url,
@@ -144,149 +205,302 @@ class SeleniumYogaPoseSpider(scrapy.Spider):
                         'pose_name_hindi': pose_name_hindi,
                         'search_query': query,
                         'page': 1,
+                        'selenium': True,
                     },
+                    priority=self._pose_deficit(pose_name_hindi),
                     dont_filter=True  # Don't filter duplicate requests
                 )
     
     def parse_results(self, response):
-        """Parse Google Images search results page using Selenium."""
+        """Parse a Google Images results page rendered by the browser pool."""
         pose_name = response.meta['pose_name']
         pose_name_hindi = response.meta['pose_name_hindi']
-        search_query = response.meta['search_query']
-        page = response.meta['page']
         
         # Check if we already have enough images for this pose
         current_count = self._get_pose_image_count(pose_name_hindi)
         if current_count >= self.max_images_per_pose:
             self.logger.info(f"Reached maximum image count for {pose_name}. Skipping.")
+            return []
+        max_images = self.max_images_per_pose - current_count
+        
+        image_urls = []
+        seen_urls = set()
+        
+        # Pull the full-size URLs embedded in the page data
+        if self.settings.get('SELENIUM_EXTRACTION_MODE', 'bulk') == 'bulk':
+            for src in extract_full_size_urls(response.text):
+                if len(image_urls) >= max_images:
+                    break
+                if self._is_valid_image_url(src):
+                    image_urls.append(src)
+                    seen_urls.add(src)
+        bulk_count = len(image_urls)
+        
+        # Add the URLs render_page found by clicking thumbnails
+        for src in json.loads(response.xpath('/html/@data-clicked-urls').get('[]')):
+            if len(image_urls) >= max_images:
+                break
+            if src not in seen_urls:
+                image_urls.append(src)
+                seen_urls.add(src)
+        
+        result = {
+            'image_urls': image_urls,
+            'next_page_url': response.xpath('/html/@data-next-url').get() or None,
+            'scroll_stats': json.loads(response.xpath('/html/@data-scroll-stats').get('null')),
+            'bulk_count': bulk_count,
+        }
+        return self._handle_rendered_results(result, response)
+    
+    def render_page(self, driver, request):
+        """Prepare a loaded results page before its DOM becomes the response.
+        
+        Called by SeleniumDownloadHandler in a WebDriverPool worker thread.
+        Scrolls to load more thumbnails and clicks the thumbnails missing
+        from the page data. The clicked URLs and the scroll stats are left as
+        data attributes on the root element for parse_results, and the page
+        is captured before "Show more results" is clicked, whose URL is added
+        as data-next-url. Returns the captured page.
+        """
+        pose_name_hindi = request.meta['pose_name_hindi']
+        current_count = self._get_pose_image_count(pose_name_hindi)
+        if current_count >= self.max_images_per_pose:
+            # parse_results skips the page
             return
+        max_images = self.max_images_per_pose - current_count
+        wanted_images = max(1, self.min_images_per_pose - current_count)
+        # Only open the next page if parse_results would follow it
+        load_more = (current_count < self.min_images_per_pose
+                     and self.query_budget.may_continue(request.meta['search_query'], request.meta['page']))
         
-        # Load the page with Selenium
-        try:
-            self.driver.get(response.url)
-            
-            # Wait for the images to load
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "img.rg_i"))
-            )
+        # Wait for the images to load
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "img.rg_i"))
+        )
+        
+        # Scroll down until the page stops growing or has enough candidates
+        scroll_stats = self._scroll_to_load_more_images(driver, target_count=wanted_images)
+        
+        # Thumbnails covered by the page data are extracted by parse_results
+        bulk_entries = []
+        covered_keys = set()
+        if self.settings.get('SELENIUM_EXTRACTION_MODE', 'bulk') == 'bulk':
+            page_source = driver.page_source
+            bulk_entries = extract_full_size_urls(page_source)
+            covered_keys = extract_thumbnail_keys(page_source)
+        seen_urls = set(bulk_entries)
+        found = min(max_images, sum(1 for src in bulk_entries if self._is_valid_image_url(src)))
+        
+        # Fall back to clicking the thumbnails the page data did not cover,
+        # e.g. those loaded by scrolling after the initial page load. They are
+        # matched to the page data by thumbnail URL and result id.
+        clicked_urls = []
+        for img, thumbnail_url, result_id in driver.execute_script(THUMBNAILS_JS):
+            if (thumbnail_url and thumbnail_url in covered_keys) or (result_id and result_id in covered_keys):
+                continue
             
-            # Scroll down to load more images
-            self._scroll_to_load_more_images()
+            # Check if we've reached the maximum number of images
+            if found + len(clicked_urls) >= max_images:
+                break
             
-            # Extract image URLs
-            image_elements = self.driver.find_elements(By.CSS_SELECTOR, "img.rg_i")
-            image_urls = []
+            # Try to get the full-size image URL
+            try:
+                # Click on the image to open the full-size view
+                img.click()
+                
+                # Wait for the full-size image to load
+                WebDriverWait(driver, 5).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "img.r48jcc"))
+                )
+                
+                # Get the full-size image URL
+                full_img = driver.find_element(By.CSS_SELECTOR, "img.r48jcc")
+                src = full_img.get_attribute("src")
+                
+                if src and src.startswith("http") and src not in seen_urls and self._is_valid_image_url(src):
+                    clicked_urls.append(src)
+                    seen_urls.add(src)
             
-            for img in image_elements:
-                # Try to get the full-size image URL
-                try:
-                    # Click on the image to open the full-size view
-                    img.click()
-                    
-                    # Wait for the full-size image to load
-                    WebDriverWait(self.driver, 5).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, "img.r48jcc"))
-                    )
-                    
-                    # Get the full-size image URL
-                    full_img = self.driver.find_element(By.CSS_SELECTOR, "img.r48jcc")
-                    src = full_img.get_attribute("src")
-                    
-                    if src and src.startswith("http") and self._is_valid_image_url(src):
-                        image_urls.append(src)
-                        
-                        # Yield the image item
-                        yield YogaPoseImage(
-                            image_urls=[src],
-                            pose_name=pose_name,
-                            pose_name_hindi=pose_name_hindi,
-                            image_id=f"p{page}_i{len(image_urls)}"
-                        )
-                        
-                        # Update the pose image count
-                        self._increment_pose_image_count(pose_name_hindi)
-                        
-                        # Check if we've reached the maximum number of images
-                        if len(image_urls) >= self.max_images_per_pose - current_count:
-                            break
+            except (TimeoutException, WebDriverException) as e:
+                self.logger.warning(f"Error clicking image: {e}")
+                continue
+        
+        # Capture the page before "Show more results", which may navigate away
+        driver.execute_script(MARK_RENDERED_PAGE_JS, json.dumps(clicked_urls), json.dumps(scroll_stats))
+        page_source = driver.page_source
+        
+        # Try to find and click the "Show more results" button
+        if load_more:
+            try:
+                show_more_button = WebDriverWait(driver, 5).until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, ".mye4qd"))
+                )
+                show_more_button.click()
+                time.sleep(2)  # Wait for more images to load
                 
-                except (TimeoutException, WebDriverException) as e:
-                    self.logger.warning(f"Error clicking image: {e}")
-                    continue
+                # Get the updated URL
+                next_page_url = html.escape(driver.current_url, quote=True)
+                page_source = page_source.replace('<html', f'<html data-next-url="{next_page_url}"', 1)
+            except (TimeoutException, WebDriverException) as e:
+                self.logger.warning(f"Error clicking 'Show more results' button: {e}")
+        
+        return page_source
+    
+    def _handle_rendered_results(self, result, response):
+        """Turn the rendered page data into items and follow-up requests."""
+        pose_name = response.meta['pose_name']
+        pose_name_hindi = response.meta['pose_name_hindi']
+        search_query = response.meta['search_query']
+        page = response.meta['page']
+        
+        output = []
+        new_images = 0
+        for i, src in enumerate(result['image_urls']):
+            # Other pages of this pose may have rendered in parallel
+            if self._get_pose_image_count(pose_name_hindi) >= self.max_images_per_pose:
+                break
             
-            # Log progress
-            self.logger.info(f"Found {len(image_urls)} images for {pose_name} (page {page})")
+            # Skip images already found by another query, pose or run
+            if not self._is_new_image_url(src):
+                continue
+            
+            # Count the image, unless another worker filled the quota meanwhile.
+            # The URL was not yielded then, so other poses and runs may still use it.
+            if not self._reserve_pose_image(pose_name_hindi):
+                if self.seen_urls is not None:
+                    self.seen_urls.release(src)
+                break
+            new_images += 1
+            
+            # Yield the image item
+            output.append(YogaPoseImage(
+                image_urls=[src],
+                pose_name=pose_name,
+                pose_name_hindi=pose_name_hindi,
+                image_id=f"p{page}_i{i+1}",
+                search_query=search_query,
+            ))
+        
+        # Log progress
+        self.logger.info(f"Found {new_images} new images for {pose_name} (page {page})")
+        if result['scroll_stats'] and 'cached' not in response.flags:
+            # Pages replayed from the HTTP cache were scrolled by an earlier crawl
+            self._record_scroll_stats(result['scroll_stats'], response.url)
+        self.crawler.stats.inc_value('selenium/bulk_image_urls', result['bulk_count'])
+        self.crawler.stats.inc_value('selenium/clicked_image_urls', len(result['image_urls']) - result['bulk_count'])
+        
+        # Track how many new unique images this query still turns up
+        self.query_budget.record_page(pose_name_hindi, search_query, len(result['image_urls']), new_images)
+        
+        # Check if we need to go to the next page
+        current_count = self._get_pose_image_count(pose_name_hindi)
+        if current_count < self.min_images_per_pose:
+            next_page_url = result['next_page_url']
+            if not next_page_url:
+                self.query_budget.finish(search_query)
             
-            # Check if we need to go to the next page
-            current_count = self._get_pose_image_count(pose_name_hindi)
-            if current_count < self.min_images_per_pose and page < 10:  # Limit to 10 pages max
-                # Try to find and click the "Show more results" button
-                try:
-                    show_more_button = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, ".mye4qd"))
-                    )
-                    show_more_button.click()
-                    time.sleep(2)  # Wait for more images to load
+            # Follow the next page while the query is productive and within its budget
+            if next_page_url and self.query_budget.should_continue(search_query):
+                output.append(scrapy.Request(
+                    url=next_page_url,
+                    callback=self.parse_results,
+                    meta={
+                        'pose_name': pose_name,
+                        'pose_name_hindi': pose_name_hindi,
+                        'search_query': search_query,
+                        'page': page + 1,
+                        'selenium': True,
+                    },
+                    priority=self._pose_deficit(pose_name_hindi),
+                    dont_filter=True  # Don't filter duplicate requests
+                ))
+            else:
+                # The query is done but we still need more images: try a different query
+                alternative_queries = [
+                    f"{pose_name} yoga demonstration",
+                    f"{pose_name} yoga tutorial",
+                    f"{pose_name_hindi} yoga",
+                    f"{pose_name} yoga home practice",
+                ]
+                
+                alt_query = self.query_budget.next_query(pose_name_hindi, alternative_queries)
+                if alt_query:
+                    params = {
+                        'q': alt_query,
+                        'tbm': 'isch',
+                        'hl': 'en',
+                        'gl': 'us',
+                        'tbs': 'isz:m',
+                    }
                     
-                    # Get the updated URL
-                    next_page_url = self.driver.current_url
+                    alt_url = f"{self.search_url}?{urlencode(params)}"
                     
-                    yield scrapy.Request(
-                        url=next_page_url,
+                    output.append(scrapy.Request(
+                        url=alt_url,
                         callback=self.parse_results,
                         meta={
                             'pose_name': pose_name,
                             'pose_name_hindi': pose_name_hindi,
-                            'search_query': search_query,
-                            'page': page + 1,
+                            'search_query': alt_query,
+                            'page': 1,
+                            'selenium': True,
                         },
+                        priority=self._pose_deficit(pose_name_hindi),
                         dont_filter=True  # Don't filter duplicate requests
-                    )
-                except (TimeoutException, WebDriverException) as e:
-                    self.logger.warning(f"Error clicking 'Show more results' button: {e}")
-                    
-                    # If we can't find the "Show more results" button, try a different query
-                    if page == 1:
-                        # Try a different search query
-                        alternative_queries = [
-                            f"{pose_name} yoga demonstration",
-                            f"{pose_name} yoga tutorial",
-                            f"{pose_name_hindi} yoga",
-                            f"{pose_name} yoga home practice",
-                        ]
-                        
-                        for alt_query in alternative_queries:
-                            if alt_query != search_query:  # Avoid duplicate queries
-                                params = {
-                                    'q': alt_query,
-                                    'tbm': 'isch',
-                                    'hl': 'en',
-                                    'gl': 'us',
-                                    'tbs': 'isz:m',
-                                }
-                                
-                                alt_url = f"https://www.google.com/search?{urlencode(params)}"
-                                
-                                yield scrapy.Request(
-                                    url=alt_url,
-                                    callback=self.parse_results,
-                                    meta={
-                                        'pose_name': pose_name,
-                                        'pose_name_hindi': pose_name_hindi,
-                                        'search_query': alt_query,
-                                        'page': 1,
-                                    },
-                                    dont_filter=True  # Don't filter duplicate requests
-                                )
-        
-        except Exception as e:
-            self.logger.error(f"Error processing {response.url}: {e}")
+                    ))
+        
+        return output
     
-    def _scroll_to_load_more_images(self, max_scrolls=10):
-        """Scroll down to load more images."""
+    def _scroll_to_load_more_images(self, driver, target_count=None):
+        """Scroll down until the page stops loading new images.
+        
+        Stops as soon as the page height and thumbnail count stop changing
+        between scrolls, or once `target_count` thumbnails are on the page.
+        """
+        max_scrolls = self.settings.getint('SELENIUM_SCROLL_MAX', 10)
+        quiet_ms = self.settings.getint('SELENIUM_SCROLL_QUIET_MS', 500)
+        timeout_ms = self.settings.getint('SELENIUM_SCROLL_TIMEOUT_MS', 3000)
+        driver.set_script_timeout(timeout_ms / 1000 + 5)
+        
+        start_time = time.time()
+        previous_state = None
+        scrolls = 0
+        thumbnails = 0
         for _ in range(max_scrolls):
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(1)  # Wait for images to load
+            state = driver.execute_async_script(SCROLL_AND_SETTLE_JS, quiet_ms, timeout_ms)
+            scrolls += 1
+            thumbnails = state['thumbnails']
+            
+            # Stop once enough candidates are loaded for the pose's quota
+            if target_count and thumbnails >= target_count:
+                break
+            
+            # Stop when the last scroll did not load anything new
+            current_state = (state['height'], state['thumbnails'])
+            if current_state == previous_state:
+                break
+            previous_state = current_state
+        
+        return {
+            'scrolls': scrolls,
+            'thumbnails': thumbnails,
+            'elapsed': time.time() - start_time,
+            # The fixed strategy scrolled `max_scrolls` times with a 1 second sleep each
+            'baseline': float(max_scrolls),
+        }
+    
+    def _record_scroll_stats(self, scroll_stats, url):
+        """Report how much time adaptive scrolling saved on a page."""
+        saved = scroll_stats['baseline'] - scroll_stats['elapsed']
+        self.logger.debug(
+            f"Scrolled {scroll_stats['scrolls']} times in {scroll_stats['elapsed']:.2f}s "
+            f"({scroll_stats['thumbnails']} thumbnails, saved {saved:.2f}s) on {url}"
+        )
+        stats = self.crawler.stats
+        stats.inc_value('selenium/scroll_count', scroll_stats['scrolls'])
+        stats.inc_value('selenium/scroll_pages')
+        stats.inc_value('selenium/scroll_time', scroll_stats['elapsed'])
+        stats.inc_value('selenium/scroll_time_saved', saved)
     
     def _is_valid_image_url(self, url):
         """Check if the URL is a valid image URL."""
@@ -303,17 +517,20 @@ class SeleniumYogaPoseSpider(scrapy.Spider):
         
         return has_valid_extension or is_image_url
     
+    def _is_new_image_url(self, url):
+        """Check the seen-URL filter and claim the URL until its image is downloaded."""
+        if self.seen_urls is None:
+            return True
+        return self.seen_urls.claim(url)
+    
     def _get_pose_image_count(self, pose_name_hindi):
         """Get the current count of images for a pose."""
-        count_file = os.path.join(self.counts_dir, f"{pose_name_hindi}.count")
-        if os.path.exists(count_file):
-            with open(count_file, 'r') as f:
-                return int(f.read().strip())
-        return 0
+        return self.quota.get(pose_name_hindi)
     
-    def _increment_pose_image_count(self, pose_name_hindi):
-        """Increment the count of images for a pose."""
-        count_file = os.path.join(self.counts_dir, f"{pose_name_hindi}.count")
-        current_count = self._get_pose_image_count(pose_name_hindi)
-        with open(count_file, 'w') as f:
-            f.write(str(current_count + 1)) 
+    def _pose_deficit(self, pose_name_hindi):
+        """Return how many images a pose still lacks, used as its request priority."""
+        return max(0, self.min_images_per_pose - self._get_pose_image_count(pose_name_hindi))
+    
+    def _reserve_pose_image(self, pose_name_hindi):
+        """Count an image for a pose if the pose is still below its maximum."""
+        return self.quota.reserve(pose_name_hindi, self.max_images_per_pose)
@@ -1,11 +1,14 @@
 import scrapy
+import os
 import json
-import re
 import time
 import logging
-from urllib.parse import urlencode, quote_plus
+from urllib.parse import urlencode, quote_plus, urlparse
 from scrapy.http import Request
 from ..items import YogaPoseImage
+from ..extractors import extract_image_candidates
+from ..seen_urls import SeenUrlStore
+from ..query_budget import QueryBudget
 
 class YogaPoseSpider(scrapy.Spider):
     name = "yoga_poses"
@@ -33,9 +36,50 @@ class YogaPoseSpider(scrapy.Spider):
     # Minimum number of images to download per pose
     min_images_per_pose = 200
     
+    # Maximum number of result pages per query
+    max_pages_per_query = 20
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(YogaPoseSpider, cls).from_crawler(crawler, *args, **kwargs)
+        
+        # Search result pages, possibly served by a local stand-in (mock_server.py)
+        spider.search_url = crawler.settings.get('GOOGLE_SEARCH_URL', 'https://www.google.com/search')
+        search_host = urlparse(spider.search_url).hostname
+        if search_host and not any(search_host == domain or search_host.endswith('.' + domain)
+                                   for domain in spider.allowed_domains):
+            spider.allowed_domains = spider.allowed_domains + [search_host]
+        
+        # Page budget of the search queries, driven by their yield
+        spider.query_budget = QueryBudget.from_settings(crawler.settings, max_pages=spider.max_pages_per_query)
+        
+        # Images earlier runs stored for each pose, so the neediest poses start first
+        spider.stored_counts = spider._count_stored_images(crawler.settings.get('IMAGES_STORE', 'yoga_dataset'))
+        
+        # Image URLs already seen by earlier queries, poses and runs
+        spider.seen_urls = None
+        if crawler.settings.getbool('SEEN_URLS_ENABLED', True):
+            spider.seen_urls = SeenUrlStore.from_crawler(crawler)
+        return spider
+    
+    def closed(self, reason):
+        """Report query yields and persist the seen-URL filter when the spider is closed."""
+        self.query_budget.report(self.crawler.stats)
+        
+        if self.seen_urls is not None:
+            self.seen_urls.report(self.crawler.stats)
+            self.seen_urls.close()
+    
     def start_requests(self):
         """Generate initial requests for each yoga pose."""
-        for pose_name, pose_name_hindi in self.yoga_poses.items():
+        # Poses furthest from their minimum are queued first and keep the highest priority
+        ordered_poses = sorted(
+            self.yoga_poses.items(),
+            key=lambda entry: self._pose_deficit(entry[1]),
+            reverse=True,
+        )
+        
+        for pose_name, pose_name_hindi in ordered_poses:
             # Create search queries with variations to get diverse images
             search_queries = [
                 f"{pose_name} yoga pose person",
@@ -46,6 +90,8 @@ class YogaPoseSpider(scrapy.Spider):
             ]
             
             for query in search_queries:
+                self.query_budget.add_query(pose_name_hindi, query)
+                
                 # Encode the search query
                 params = {
                     'q': query,
@@ -55,7 +101,7 @@ class YogaPoseSpider(scrapy.Spider):
                     'tbs': 'isz:m', # Medium sized images
                 }
                 
-                url = f"https://www.google.com/search?{urlencode(params)}"
+                url = f"{self.search_url}?{urlencode(params)}"
                 
                 yield Request(
                     url=url,
@@ -66,6 +112,7 @@ class YogaPoseSpider(scrapy.Spider):
                         'search_query': query,
                         'page': 1,
                     },
+                    priority=self._pose_deficit(pose_name_hindi),
                     headers={
                         'User-Agent': self.settings.get('USER_AGENT'),
                     }
@@ -78,46 +125,51 @@ class YogaPoseSpider(scrapy.Spider):
         search_query = response.meta['search_query']
         page = response.meta['page']
         
-        # Extract image data from the page
-        # Look for JSON data in the page that contains image information
-        script_data = response.xpath('//script[contains(text(), "AF_initDataCallback")]/text()').getall()
-        
-        image_urls = []
-        for script in script_data:
-            # Try to extract image URLs from the script data
-            image_matches = re.findall(r'\"(https://[^\"]+\.(jpg|jpeg|png))\"', script)
-            for url, _ in image_matches:
-                if url not in image_urls and self._is_valid_image_url(url):
-                    image_urls.append(url)
+        # Extract the full-size images from the page data, each URL once
+        image_urls = [
+            candidate.url for candidate in extract_image_candidates(response.text)
+            if self._is_valid_image_url(candidate.url)
+        ]
         
         # Process found image URLs
+        new_images = 0
         for i, image_url in enumerate(image_urls):
+            # Skip images already found by another query, pose or run
+            if not self._is_new_image_url(image_url):
+                continue
+            new_images += 1
+            
             yield YogaPoseImage(
                 image_urls=[image_url],
                 pose_name=pose_name,
                 pose_name_hindi=pose_name_hindi,
-                image_id=f"p{page}_i{i+1}"
+                image_id=f"p{page}_i{i+1}",
+                search_query=search_query,
             )
         
         # Log progress
-        self.logger.info(f"Found {len(image_urls)} images for {pose_name} (page {page})")
+        self.logger.info(f"Found {new_images} new images for {pose_name} (page {page})")
         
         # Check if we need to go to the next page
         # Count how many images we've already scraped for this pose
-        stats = self.crawler.stats
-        pose_image_count = stats.get_value(f'pose_image_count/{pose_name_hindi}', 0) + len(image_urls)
-        stats.set_value(f'pose_image_count/{pose_name_hindi}', pose_image_count)
+        pose_image_count = self._get_pose_image_count(pose_name_hindi) + new_images
+        self.crawler.stats.set_value(f'pose_image_count/{pose_name_hindi}', pose_image_count)
+        
+        # Track how many new unique images this query still turns up
+        self.query_budget.record_page(pose_name_hindi, search_query, len(image_urls), new_images)
         
         # If we haven't reached the minimum number of images, try to get more
-        if pose_image_count < self.min_images_per_pose and page < 20:  # Limit to 20 pages max
+        if pose_image_count < self.min_images_per_pose:
             # Extract the "next page" URL if available
             next_page_url = None
             next_page_links = response.css('a.frGj1b::attr(href)').getall()
             if next_page_links:
                 next_page_url = response.urljoin(next_page_links[0])
+            else:
+                self.query_budget.finish(search_query)
             
-            # If next page URL is found, follow it
-            if next_page_url:
+            # Follow the next page while the query is productive and within its budget
+            if next_page_url and self.query_budget.should_continue(search_query):
                 yield Request(
                     url=next_page_url,
                     callback=self.parse_results,
@@ -127,13 +179,13 @@ class YogaPoseSpider(scrapy.Spider):
                         'search_query': search_query,
                         'page': page + 1,
                     },
+                    priority=self._pose_deficit(pose_name_hindi),
                     headers={
                         'User-Agent': self.settings.get('USER_AGENT'),
                     }
                 )
-            # If no next page URL is found but we still need more images, try a different query
-            elif page == 1:
-                # Try a different search query
+            else:
+                # The query is done but we still need more images: try a different query
                 alternative_queries = [
                     f"{pose_name} yoga demonstration",
                     f"{pose_name} yoga tutorial",
@@ -141,31 +193,59 @@ class YogaPoseSpider(scrapy.Spider):
                     f"{pose_name} yoga home practice",
                 ]
                 
-                for alt_query in alternative_queries:
-                    if alt_query != search_query:  # Avoid duplicate queries
-                        params = {
-                            'q': alt_query,
-                            'tbm': 'isch',
-                            'hl': 'en',
-                            'gl': 'us',
-                            'tbs': 'isz:m',
+                alt_query = self.query_budget.next_query(pose_name_hindi, alternative_queries)
+                if alt_query:
+                    params = {
+                        'q': alt_query,
+                        'tbm': 'isch',
+                        'hl': 'en',
+                        'gl': 'us',
+                        'tbs': 'isz:m',
+                    }
+                    
+                    alt_url = f"{self.search_url}?{urlencode(params)}"
+                    
+                    yield Request(
+                        url=alt_url,
+                        callback=self.parse_results,
+                        meta={
+                            'pose_name': pose_name,
+                            'pose_name_hindi': pose_name_hindi,
+                            'search_query': alt_query,
+                            'page': 1,
+                        },
+                        priority=self._pose_deficit(pose_name_hindi),
+                        headers={
+                            'User-Agent': self.settings.get('USER_AGENT'),
                         }
-                        
-                        alt_url = f"https://www.google.com/search?{urlencode(params)}"
-                        
-                        yield Request(
-                            url=alt_url,
-                            callback=self.parse_results,
-                            meta={
-                                'pose_name': pose_name,
-                                'pose_name_hindi': pose_name_hindi,
-                                'search_query': alt_query,
-                                'page': 1,
-                            },
-                            headers={
-                                'User-Agent': self.settings.get('USER_AGENT'),
-                            }
-                        )
+                    )
+    
+    def _get_pose_image_count(self, pose_name_hindi):
+        """Get the number of images found for a pose in this crawl."""
+        return self.crawler.stats.get_value(f'pose_image_count/{pose_name_hindi}', 0)
+    
+    def _count_stored_images(self, images_store):
+        """Count the images stored under original/<pose> of the image store."""
+        counts = {}
+        original_dir = os.path.join(images_store, 'original')
+        if not os.path.isdir(original_dir):
+            return counts
+        for pose_name_hindi in self.yoga_poses.values():
+            pose_dir = os.path.join(original_dir, pose_name_hindi)
+            if os.path.isdir(pose_dir):
+                counts[pose_name_hindi] = sum(1 for entry in os.scandir(pose_dir) if entry.is_file())
+        return counts
+    
+    def _pose_deficit(self, pose_name_hindi):
+        """Return how many images a pose still lacks, counting earlier runs, used as its request priority."""
+        found = self.stored_counts.get(pose_name_hindi, 0) + self._get_pose_image_count(pose_name_hindi)
+        return max(0, self.min_images_per_pose - found)
+    
+    def _is_new_image_url(self, url):
+        """Check the seen-URL filter and claim the URL until its image is downloaded."""
+        if self.seen_urls is None:
+            return True
+        return self.seen_urls.claim(url)
     
     def _is_valid_image_url(self, url):
         """Check if the URL is a valid image URL."""
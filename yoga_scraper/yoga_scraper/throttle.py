@@ -0,0 +1,229 @@
+import time
+import logging
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean the host wants us to slow down
+THROTTLE_HTTP_CODES = {429, 503}
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.3
+
+
+def is_search_host(host, search_domains):
+    """Check if a host serves search result pages."""
+    return any(host == domain or host.endswith('.' + domain) for domain in search_domains)
+
+
+class DomainTimeoutMiddleware:
+    """Short download timeout for image hosts.
+
+    Registered below DownloadTimeoutMiddleware (350), which sets
+    DOWNLOAD_TIMEOUT on every request that has no timeout yet, so requests
+    to image hosts get DOMAIN_THROTTLE_IMAGE_TIMEOUT first. Timeouts set on
+    a request explicitly are kept.
+    """
+
+    def __init__(self, settings):
+        if not settings.getbool('DOMAIN_THROTTLE_ENABLED', True):
+            raise NotConfigured
+        self.search_domains = settings.getlist('DOMAIN_THROTTLE_SEARCH_DOMAINS', ['google.com'])
+        self.image_timeout = settings.getfloat('DOMAIN_THROTTLE_IMAGE_TIMEOUT', 20)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings)
+
+    def process_request(self, request, spider):
+        if not is_search_host(urlparse_cached(request).hostname or '', self.search_domains):
+            request.meta.setdefault('download_timeout', self.image_timeout)
+
+
+class DomainState:
+    """Observed behaviour and current limits of one host."""
+
+    def __init__(self, search, concurrency, delay, min_delay):
+        self.search = search
+        self.concurrency = concurrency
+        self.delay = delay
+        self.min_delay = min_delay
+
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.successes_since_increase = 0
+        self.blocked_until = 0.0
+
+        self.responses = 0
+        self.errors = 0
+        self.throttled = 0
+        self.bytes = 0
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+
+
+class DomainAdaptiveThrottleMiddleware:
+    """Per-domain adaptive concurrency, delay and blocklisting.
+
+    Search result pages keep the polite project-wide DOWNLOAD_DELAY, while
+    every image host gets its own downloader slot whose concurrency and delay
+    follow the host's observed latency, errors and 429/503 responses
+    (additive increase, multiplicative decrease). Hosts that keep failing are
+    blocklisted for a while. The short timeout of image hosts is set by
+    DomainTimeoutMiddleware.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('DOMAIN_THROTTLE_ENABLED', True):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.search_domains = settings.getlist('DOMAIN_THROTTLE_SEARCH_DOMAINS', ['google.com'])
+        self.search_delay = settings.getfloat('DOWNLOAD_DELAY', 1.5)
+        self.search_concurrency = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN', 8)
+        self.start_concurrency = settings.getint('DOMAIN_THROTTLE_START_CONCURRENCY', 2)
+        self.max_concurrency = settings.getint('DOMAIN_THROTTLE_MAX_CONCURRENCY', 8)
+        self.max_delay = settings.getfloat('DOMAIN_THROTTLE_MAX_DELAY', 30)
+        self.target_latency = settings.getfloat('DOMAIN_THROTTLE_TARGET_LATENCY', 2.0)
+        self.block_after = settings.getint('DOMAIN_THROTTLE_BLOCK_AFTER', 5)
+        self.block_seconds = settings.getfloat('DOMAIN_THROTTLE_BLOCK_SECONDS', 600)
+        self.report_size = settings.getint('DOMAIN_THROTTLE_REPORT_SIZE', 20)
+        self.domains = {}
+
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        host = urlparse_cached(request).hostname or ''
+        state = self._get_state(host)
+
+        # Drop requests to hosts that keep failing until their block expires
+        if state.blocked_until > time.time():
+            self.stats.inc_value('domain_throttle/blocked_requests', spider=spider)
+            raise IgnoreRequest(f"Host {host} is temporarily blocklisted")
+
+        # Give every host its own slot
+        request.meta.setdefault('download_slot', host)
+        self._apply_limits(request.meta['download_slot'], state)
+
+    def process_response(self, request, response, spider):
+        state = self._get_state(urlparse_cached(request).hostname or '')
+        state.last_seen = time.time()
+
+        if response.status in THROTTLE_HTTP_CODES:
+            retry_after = response.headers.get('Retry-After', b'').decode('latin-1')
+            self._back_off(state, float(retry_after) if retry_after.isdigit() else None)
+        elif response.status >= 500:
+            self._record_failure(state, urlparse_cached(request).hostname, spider)
+        else:
+            self._record_success(state, request.meta.get('download_latency'), len(response.body))
+
+        self._apply_limits(request.meta.get('download_slot'), state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, IgnoreRequest):
+            return None
+
+        host = urlparse_cached(request).hostname or ''
+        state = self._get_state(host)
+        state.last_seen = time.time()
+        self._record_failure(state, host, spider)
+        self._apply_limits(request.meta.get('download_slot'), state)
+        return None
+
+    def _get_state(self, host):
+        """Return the state of a host, creating it on first sight."""
+        state = self.domains.get(host)
+        if state is None:
+            if is_search_host(host, self.search_domains):
+                state = DomainState(True, self.search_concurrency, self.search_delay, self.search_delay)
+            else:
+                state = DomainState(False, self.start_concurrency, 0.0, 0.0)
+            self.domains[host] = state
+        return state
+
+    def _record_success(self, state, latency, size):
+        """Speed a host up while it answers quickly."""
+        state.responses += 1
+        state.bytes += size
+        state.consecutive_failures = 0
+        state.error_rate *= 1 - EWMA_ALPHA
+
+        # Cached responses carry no latency
+        if latency is None:
+            return
+        state.latency = latency if state.latency is None else (1 - EWMA_ALPHA) * state.latency + EWMA_ALPHA * latency
+
+        if state.latency > 2 * self.target_latency:
+            # The host is struggling: take a request slot away
+            state.concurrency = max(1, state.concurrency - 1)
+            state.successes_since_increase = 0
+        elif state.latency <= self.target_latency and state.error_rate < 0.1:
+            # Add a slot after a full window of fast answers, and shorten the delay
+            state.successes_since_increase += 1
+            if state.successes_since_increase >= state.concurrency:
+                state.concurrency = min(self.search_concurrency if state.search else self.max_concurrency,
+                                        state.concurrency + 1)
+                state.successes_since_increase = 0
+            state.delay = max(state.min_delay, state.delay * 0.8)
+
+    def _back_off(self, state, retry_after=None):
+        """Halve concurrency and double the delay of a host that throttles us."""
+        state.throttled += 1
+        state.concurrency = max(1, state.concurrency // 2)
+        state.delay = min(self.max_delay, max(state.delay * 2, retry_after or 1.0))
+        state.successes_since_increase = 0
+        self.stats.inc_value('domain_throttle/throttled_responses')
+
+    def _record_failure(self, state, host, spider):
+        """Slow a failing host down and blocklist it when it keeps failing."""
+        state.errors += 1
+        state.consecutive_failures += 1
+        state.error_rate = (1 - EWMA_ALPHA) * state.error_rate + EWMA_ALPHA
+        state.concurrency = max(1, state.concurrency // 2)
+        state.successes_since_increase = 0
+
+        if not state.search and state.consecutive_failures >= self.block_after:
+            state.blocked_until = time.time() + self.block_seconds
+            state.consecutive_failures = 0
+            logger.info(f"Blocklisting {host} for {self.block_seconds:.0f}s after {self.block_after} consecutive failures")
+            self.stats.inc_value('domain_throttle/blocklisted_hosts', spider=spider)
+
+    def _apply_limits(self, slot_key, state):
+        """Push a host's concurrency and delay to its downloader slot."""
+        if slot_key is None:
+            return
+        downloader = self.crawler.engine.downloader
+
+        # Used when the slot is created, then updated on the live slot
+        downloader.per_slot_settings[slot_key] = {'concurrency': state.concurrency, 'delay': state.delay}
+        slot = downloader.slots.get(slot_key)
+        if slot is not None:
+            slot.concurrency = state.concurrency
+            slot.delay = state.delay
+
+    def spider_closed(self, spider):
+        """Report throughput per domain."""
+        self.stats.set_value('domain_throttle/domains', len(self.domains), spider=spider)
+        busiest = sorted(self.domains.items(), key=lambda item: item[1].bytes, reverse=True)[:self.report_size]
+        if not busiest:
+            return
+
+        logger.info("Throughput per domain:")
+        for host, state in busiest:
+            elapsed = max(state.last_seen - state.first_seen, 1e-6)
+            latency = f"{state.latency:.2f}s" if state.latency is not None else "n/a"
+            logger.info(
+                f"  {host}: {state.responses} responses, {state.errors} errors, {state.throttled} throttled, "
+                f"{state.bytes / elapsed / 1024:.1f} KB/s, {state.responses / elapsed:.2f} req/s, "
+                f"latency {latency}, concurrency {state.concurrency}, delay {state.delay:.2f}s"
+            )
@@ -0,0 +1,393 @@
+import os
+import time
+import queue
+import logging
+import threading
+from twisted.internet import reactor, threads
+from twisted.python.threadpool import ThreadPool
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import WebDriverException
+from .driver_cache import DriverCache, read_version
+try:
+    from webdriver_manager.chrome import ChromeDriverManager
+    WEBDRIVER_MANAGER_AVAILABLE = True
+except Exception:
+    WEBDRIVER_MANAGER_AVAILABLE = False
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except Exception:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# URL patterns blocked by the lean profile: result pages only need the markup
+# and scripts carrying the image URLs, not thumbnails, fonts, media or trackers
+LEAN_BLOCKED_URLS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*encrypted-tbn*", "*/images?q=tbn*",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*fonts.gstatic.com*",
+    "*.mp4", "*.webm", "*.mp3", "*.m4a",
+    "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*/gen_204*", "*/client_204*", "*/log?*",
+]
+
+# Browser features a headless scraping session does not need
+LEAN_CHROME_ARGUMENTS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-notifications",
+    "--disable-features=MediaRouter,OptimizationHints,Translate,AutofillServerCommunication",
+    "--mute-audio",
+    "--no-first-run",
+    "--metrics-recording-only",
+]
+
+
+# Driver path resolved once per process and shared by every browser of the pool
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path(cache=None):
+    """Return the ChromeDriver executable to use, or None to rely on the system PATH.
+
+    Tries CHROMEDRIVER_PATH, then the versioned driver cache for the
+    installed Chrome, then webdriver_manager (whose driver is added to the
+    cache so the next crawl skips it), then the current directory. The
+    result is remembered for the rest of the process.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is not None:
+            return _driver_path or None
+
+        cache = cache or DriverCache()
+        path = os.environ.get("CHROMEDRIVER_PATH")
+        if path and not os.path.exists(path):
+            logger.warning(f"CHROMEDRIVER_PATH {path} does not exist")
+            path = None
+
+        chrome_version = None
+        if not path:
+            chrome_version = cache.chrome_version()
+            path = cache.lookup(chrome_version)
+            if path:
+                logger.info(f"Using cached ChromeDriver for Chrome {chrome_version}: {path}")
+
+        if not path and WEBDRIVER_MANAGER_AVAILABLE:
+            try:
+                path = ChromeDriverManager(driver_version=chrome_version).install()
+                driver_version = read_version(path)
+                if chrome_version and driver_version:
+                    path = cache.add(chrome_version, driver_version, path)
+            except Exception as e:
+                logger.warning(f"webdriver_manager could not install ChromeDriver: {e}")
+
+        if not path:
+            # Try to find ChromeDriver in the current directory
+            for candidate in ("./chromedriver.exe", "./chromedriver"):
+                if os.path.exists(candidate):
+                    path = candidate
+                    break
+
+        if path:
+            logger.info(f"Using ChromeDriver at: {path}")
+        else:
+            logger.warning("ChromeDriver not found in the cache or common locations. Trying system PATH.")
+        _driver_path = path or ''
+        return path
+
+
+def create_chrome_driver(user_agent=None, profile_dir=None, debugger_address=None, driver_path=None,
+                         lean=False, blocked_urls=None):
+    """Start a new headless Chrome driver, or attach to a running Chrome.
+
+    With `debugger_address` (host:port of a Chrome started with
+    --remote-debugging-port), no browser is launched: the driver attaches to
+    the warm browser and its profile, and quitting the driver leaves the
+    browser running. Otherwise `profile_dir` keeps the launched browser's
+    profile (cache, cookies) across crawls.
+
+    With `lean`, pages load with the `eager` strategy (done at
+    DOMContentLoaded), launched browsers run without images and background
+    features, and requests matching LEAN_BLOCKED_URLS plus `blocked_urls`
+    are blocked through CDP.
+    """
+    # Initialize Chrome options
+    chrome_options = Options()
+    if lean:
+        chrome_options.page_load_strategy = "eager"
+    if debugger_address:
+        chrome_options.debugger_address = debugger_address
+    else:
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--window-size=1920,1080")
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            chrome_options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+
+        # Set user agent
+        if user_agent:
+            chrome_options.add_argument(f"user-agent={user_agent}")
+
+        if lean:
+            for argument in LEAN_CHROME_ARGUMENTS:
+                chrome_options.add_argument(argument)
+
+    # Initialize Chrome driver
+    try:
+        path = driver_path or resolve_driver_path()
+        service = Service(executable_path=path) if path else Service()
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+    except Exception as e:
+        logger.error(f"Error initializing Chrome driver: {e}")
+        logger.info("Please run download_chromedriver.py, or download ChromeDriver manually from https://chromedriver.chromium.org/downloads")
+        logger.info("and place it in the project directory or add it to your system PATH.")
+        raise
+
+    if debugger_address and user_agent:
+        # Command-line flags of a running browser cannot change, set the user agent through CDP
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+    if lean:
+        block_urls(driver, LEAN_BLOCKED_URLS + list(blocked_urls or []))
+    return driver
+
+
+def block_urls(driver, patterns):
+    """Make the browser fail requests matching the URL patterns (`*` wildcards) instead of loading them."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+class PooledDriver:
+    """A WebDriver instance together with its usage bookkeeping."""
+
+    def __init__(self, driver, slot=0):
+        self.driver = driver
+        self.slot = slot
+        self.pages = 0
+        self.broken = False
+        self.created_at = time.time()
+
+
+class WebDriverPool:
+    """Pool of headless Chrome drivers driven from worker threads.
+
+    All blocking Selenium calls run on a dedicated thread pool so the
+    Twisted reactor (and with it the rest of the Scrapy engine) keeps
+    running while pages render. Work is submitted with ``run()``, which
+    returns a Deferred firing with the result of the submitted function.
+
+    Every live driver holds one of `size` slots, and ``driver_factory`` is
+    called with the slot of the driver it starts. Slots freed by recycled
+    drivers are reused, and with them their profile directory or warm
+    browser.
+    """
+
+    def __init__(self, size=4, max_pages=50, max_memory_mb=1024,
+                 driver_factory=None, stats=None):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.driver_factory = driver_factory or (lambda slot: create_chrome_driver())
+        self.stats = stats
+        self._free_slots = list(range(self.size))
+
+        # Idle drivers waiting for work. At most one driver exists per
+        # worker thread, so the pool never holds more than `size` browsers.
+        self._idle = queue.Queue()
+        self._all = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._threadpool = ThreadPool(minthreads=0, maxthreads=self.size, name="WebDriverPool")
+        self._threadpool.start()
+        self._shutdown_trigger = reactor.addSystemEventTrigger("during", "shutdown", self.close)
+
+    @classmethod
+    def from_crawler(cls, crawler, driver_factory=None):
+        """Create a pool configured from the crawler settings."""
+        settings = crawler.settings
+        user_agent = settings.get("USER_AGENT")
+        size = settings.getint("SELENIUM_POOL_SIZE", 4)
+        profile_dir = settings.get("SELENIUM_PROFILE_DIR")
+        debugger_addresses = settings.getlist("SELENIUM_DEBUGGER_ADDRESSES")
+        lean = settings.getbool("SELENIUM_LEAN_PROFILE", True)
+        blocked_urls = settings.getlist("SELENIUM_BLOCKED_URLS")
+        if debugger_addresses and len(debugger_addresses) < size:
+            logger.warning(f"Only {len(debugger_addresses)} warm browsers for a pool of {size}, shrinking the pool")
+            size = len(debugger_addresses)
+
+        # Resolve the driver once, before the worker threads start browsers
+        driver_path = None if driver_factory else resolve_driver_path(DriverCache.from_settings(settings))
+
+        def start_driver(slot):
+            return create_chrome_driver(
+                user_agent,
+                profile_dir=os.path.join(profile_dir, f"browser-{slot}") if profile_dir else None,
+                debugger_address=debugger_addresses[slot] if debugger_addresses else None,
+                driver_path=driver_path,
+                lean=lean,
+                blocked_urls=blocked_urls,
+            )
+
+        return cls(
+            size=size,
+            max_pages=settings.getint("SELENIUM_POOL_MAX_PAGES", 50),
+            max_memory_mb=settings.getint("SELENIUM_POOL_MAX_MEMORY_MB", 1024),
+            driver_factory=driver_factory or start_driver,
+            stats=crawler.stats,
+        )
+
+    def run(self, func, *args, **kwargs):
+        """Run ``func(driver, *args, **kwargs)`` on a pooled driver in a worker thread."""
+        return threads.deferToThreadPool(
+            reactor, self._threadpool, self._run_with_driver, func, *args, **kwargs
+        )
+
+    def close(self):
+        """Quit all drivers and stop the worker threads."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            drivers = list(self._all)
+            self._all.clear()
+
+        for pooled in drivers:
+            self._quit(pooled)
+
+        self._threadpool.stop()
+        try:
+            reactor.removeSystemEventTrigger(self._shutdown_trigger)
+        except (ValueError, KeyError):
+            pass
+
+    def _run_with_driver(self, func, *args, **kwargs):
+        """Check out a driver, run the job on it and hand it back."""
+        pooled = self._acquire()
+        try:
+            return func(pooled.driver, *args, **kwargs)
+        except WebDriverException:
+            # The browser may have crashed; make sure it is not reused blindly
+            pooled.broken = not self._is_healthy(pooled)
+            raise
+        finally:
+            pooled.pages += 1
+            self._release(pooled)
+
+    def _acquire(self):
+        """Return a healthy driver, starting a new one if needed."""
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start_driver()
+
+            if self._is_healthy(pooled):
+                return pooled
+
+            logger.warning("Discarding unresponsive Chrome driver")
+            self._inc_stats("selenium_pool/unhealthy")
+            self._discard(pooled)
+
+    def _release(self, pooled):
+        """Return a driver to the pool or recycle it when it is worn out."""
+        if self._closed:
+            self._discard(pooled)
+            return
+
+        if pooled.broken:
+            self._inc_stats("selenium_pool/unhealthy")
+            self._discard(pooled)
+            return
+
+        if self.max_pages and pooled.pages >= self.max_pages:
+            logger.info(f"Recycling Chrome driver after {pooled.pages} pages")
+            self._inc_stats("selenium_pool/recycled_pages")
+            self._discard(pooled)
+            return
+
+        memory_mb = self._memory_mb(pooled)
+        if self.max_memory_mb and memory_mb is not None and memory_mb > self.max_memory_mb:
+            logger.info(f"Recycling Chrome driver using {memory_mb:.0f} MB")
+            self._inc_stats("selenium_pool/recycled_memory")
+            self._discard(pooled)
+            return
+
+        self._idle.put(pooled)
+
+    def _start_driver(self):
+        """Start a new driver on a free slot and register it with the pool."""
+        with self._lock:
+            slot = min(self._free_slots)
+            self._free_slots.remove(slot)
+        try:
+            pooled = PooledDriver(self.driver_factory(slot), slot)
+        except Exception:
+            with self._lock:
+                self._free_slots.append(slot)
+            raise
+        with self._lock:
+            self._all.add(pooled)
+        self._inc_stats("selenium_pool/drivers_started")
+        return pooled
+
+    def _discard(self, pooled):
+        """Remove a driver from the pool, quit it and free its slot."""
+        with self._lock:
+            self._all.discard(pooled)
+        self._quit(pooled)
+        with self._lock:
+            self._free_slots.append(pooled.slot)
+
+    def _quit(self, pooled):
+        """Quit a driver, ignoring errors from an already dead browser."""
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.debug(f"Error quitting Chrome driver: {e}")
+
+    def _is_healthy(self, pooled):
+        """Check that the browser still answers commands."""
+        try:
+            return pooled.driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _memory_mb(self, pooled):
+        """Estimate the memory used by a driver's browser in megabytes."""
+        # Prefer the resident size of the whole Chrome process tree
+        if PSUTIL_AVAILABLE:
+            try:
+                process = psutil.Process(pooled.driver.service.process.pid)
+                rss = sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+                return rss / (1024 * 1024)
+            except Exception:
+                pass
+
+        # Fall back to the JavaScript heap of the current page
+        try:
+            heap = pooled.driver.execute_script(
+                "return window.performance && performance.memory ? performance.memory.usedJSHeapSize : null;"
+            )
+            return heap / (1024 * 1024) if heap else None
+        except Exception:
+            return None
+
+    def _inc_stats(self, key):
+        """Increment a crawler stat from any thread."""
+        if self.stats is not None:
+            reactor.callFromThread(self.stats.inc_value, key)